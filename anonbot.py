@@ -1,27 +1,42 @@
 import telebot
-from enum import Enum
-from typing import Dict, List, Optional
+import asyncio
+import functools
+import random
+import signal
+import struct
+import threading
+import time
+from typing import Callable, Dict, Iterable, Optional, Set
 from dataclasses import dataclass
-from datetime import datetime
 import os
-import json
-import hashlib
-import random
-from pathlib import Path
-
-
-class UserState(Enum):
-    SETUP = "setup" 
-    WAITING = "waiting"
-    CHATTING = "chatting"
-    IDLE = "idle"
-
-
-class SetupState(Enum):
-    AGE = "age"
-    GENDER = "gender"
-    ROOM = "room"
-    COMPLETE = "complete"
+from src.models.message import MessageHistory
+from src.models.profile_file import MappedProfileTable, convert
+from src.models.profile_table import Profile
+from src.models.states import SetupState, UserState
+from src.handlers.router import UpdateRouter
+from src.services.admission import AdmissionControl
+from src.services.broadcast import Broadcaster, RecipientLog
+from src.services.forwarding import build_default_registry, reply_parameters
+from src.services.media_groups import ALBUM_CONTENT_TYPES, MediaGroupBuffer, input_media
+from src.services.moderation import LINK_ENTITIES, Moderator
+from src.services.outbound import (
+    PRIORITY_BACKGROUND,
+    PRIORITY_BULK,
+    PRIORITY_HIGH,
+    PRIORITY_NORMAL,
+    AsyncOutboundScheduler,
+    OutboundScheduler,
+    content_priority,
+)
+from src.services.session_snapshots import SessionSnapshots
+from src.services.settings_store import SettingsStore
+from src.services.state_store import InMemoryStateStore, StateStore
+from src.services.timer_wheel import TimerWheel
+from src.services.update_log import UpdateRecorder
+from src.services.wait_estimates import WaitEstimates, format_wait
+from src.utils.helpers import configure_hashing, hash_user_id
+from src.utils.metrics import BotMetrics, instrument_api
+from src.utils.profiler import CallTimings, Profiler
 
 
 @dataclass
@@ -39,23 +54,45 @@ class UserSettings:
         }
 
 
-@dataclass
-class MessageInfo:
-    message_id: int
-    chat_id: int
-    partner_message_id: int
-    timestamp: datetime
-
-
 class ChatBot:
-    def __init__(self, token: str):
-        self.bot = telebot.TeleBot(token)
-        self.user_states: Dict[int, UserState] = {}
-        self.user_settings: Dict[str, UserSettings] = {}
-        self.setup_states: Dict[int, SetupState] = {}
-        self.active_chats: Dict[int, int] = {}
-        self.waiting_users: List[int] = []
-        self.chats: Dict[int, Dict[int, List[MessageInfo]]] = {}
+    def __init__(
+        self,
+        token: str,
+        state_store: Optional[StateStore] = None,
+        clock: Callable[[], float] = time.monotonic,
+        bot: Optional[telebot.TeleBot] = None,
+        metrics: Optional[BotMetrics] = None,
+        batch_interval: float = 0.0,
+        batch_size: int = 0,
+        admin_ids: Iterable[int] = (),
+        admission: bool = True,
+    ):
+        self.bot = bot if bot is not None else self._create_bot(token)
+        self.metrics = metrics
+        self.state_store = state_store or InMemoryStateStore()
+        if isinstance(self.state_store, InMemoryStateStore):
+            self.state_store.set_clock(clock)
+        self.chats: Dict[int, Dict[int, MessageHistory]] = {}
+        self.forwarders = build_default_registry()
+        self.sender = self._create_sender()
+        self.webhook = None
+        self.recorder: Optional[UpdateRecorder] = None
+        self.ADMIN_IDS = set(admin_ids)
+        self.PROFILE_DIR = "profiles"
+        self.PROFILE_SAMPLE_SECONDS = 30.0
+        self.PROFILED_METHODS = ("_save_settings", "_try_match_users", "_start_chat", "_forward_message")
+        self.profiler = Profiler(self.PROFILE_DIR)
+        self.RECIPIENTS_FILE = "recipients.log"
+        self.BROADCAST_FILE = "broadcast.json"
+        self.BROADCAST_RATE = 20.0
+        self.recipients = RecipientLog(self.RECIPIENTS_FILE)
+        self.broadcaster = Broadcaster(
+            self.recipients,
+            self._broadcast_send,
+            self.BROADCAST_FILE,
+            rate=self.BROADCAST_RATE,
+            on_done=self._broadcast_done,
+        )
 
         self.ROOMS = [
             "general",
@@ -67,46 +104,329 @@ class ChatBot:
             "cooking",
             "politics",
         ]
+        self.MODERATION_FILE = "moderation.json"
+        self.moderator = Moderator(self.MODERATION_FILE, self.ROOMS)
+        self.moderator.load()
         self.SETTINGS_FILE = "user_settings.json"
-
-        self._load_settings()
+        self.SETTINGS_LOG = "user_settings.log"
+        self.SETTINGS_FLUSH_INTERVAL = 1.0
+        self.PROFILES_FILE = "user_settings.profiles"
+        self.PROFILE_IDLE_TTL = 10 * 60
+        self.PROFILE_EVICT_INTERVAL = 60.0
+        self.HISTORY_CAPACITY = 1000
+        self.SESSION_SNAPSHOT = "sessions.snapshot"
+        self.SESSION_JOURNAL = "sessions.journal"
+        self.SESSION_FLUSH_INTERVAL = 1.0
+        self.SESSION_SNAPSHOT_INTERVAL = 60.0
+        self.sessions = self._restore_sessions()
+        self.user_states = self.state_store.user_states
+        self.setup_states = self.state_store.setup_states
+        self.active_chats = self.state_store.active_chats
+        self.waiting_users = self.state_store.waiting_users
+        self._seed_recipients()
+        self.ALBUM_WINDOW = 0.5
+        self.albums = self._create_album_buffer()
+        self.WAITING_TTL = 10 * 60
+        self.CHAT_IDLE_TTL = 30 * 60
+        self.REAP_INTERVAL = 1.0
+        self.timeouts = TimerWheel(self.REAP_INTERVAL, clock=clock)
+        self._reaper_stop = threading.Event()
+        if self.sessions is not None:
+            for user_id in self.waiting_users:
+                self.timeouts.schedule(("wait", user_id), self.WAITING_TTL)
+        for chat_id in self.chats:
+            self.timeouts.schedule(("chat", chat_id), self.CHAT_IDLE_TTL)
+        self.timeouts.schedule(("profiles", None), self.PROFILE_EVICT_INTERVAL)
+        self.MATCH_BATCH_INTERVAL = batch_interval
+        self.MATCH_BATCH_SIZE = batch_size
+        if (batch_interval or batch_size) and not hasattr(self.waiting_users, "match_round"):
+            print("Batch matching needs the in-memory state store; matching on arrival instead.")
+            self.MATCH_BATCH_INTERVAL = self.MATCH_BATCH_SIZE = 0
+        self._match_lock = threading.Lock()
+        self._arrivals = 0
+        self.REMATCH_INTERVAL = 5.0
+        self.FALLBACK_ROOM = "general"
+        self.FALLBACK_OFFER_AFTER = 2 * 60
+        self.wait_estimates = WaitEstimates()
+        self._fallback_offered: Set[int] = set()
+        if hasattr(self.waiting_users, "rematch"):
+            self.timeouts.schedule(("rematch", None), self.REMATCH_INTERVAL)
+
+        self.settings_store: Optional[SettingsStore] = None
+        if self.state_store.profiles is None:
+            self.user_settings = self._open_profiles(clock)
+            self.settings_store = SettingsStore(
+                self.SETTINGS_LOG,
+                flush_interval=self.SETTINGS_FLUSH_INTERVAL,
+                on_flush=metrics.settings_flush_seconds.observe if metrics else None,
+            )
+            self._load_settings()
+        else:
+            self.user_settings = self._import_profiles(self.state_store.profiles, clock)
+        self.router = UpdateRouter(self.user_states, self.setup_states)
         self._setup_handlers()
+        if metrics is not None:
+            self._instrument(metrics)
+        self.admission: Optional[AdmissionControl] = None
+        if admission:
+            self.admission = AdmissionControl(
+                self._load,
+                exempt=self.ADMIN_IDS,
+                rejected=metrics.updates_rejected if metrics is not None else None,
+            )
+            receiver = self._receiver()
+            receiver.process_new_updates = self.admission.wrap(receiver.process_new_updates)
+
+    def _create_bot(self, token: str):
+        return telebot.TeleBot(token)
+
+    def _create_sender(self) -> OutboundScheduler:
+        return OutboundScheduler()
+
+    def _create_album_buffer(self) -> MediaGroupBuffer:
+        return MediaGroupBuffer(self._forward_album, self.ALBUM_WINDOW)
+
+    def _restore_sessions(self) -> Optional[SessionSnapshots]:
+        if not isinstance(self.state_store, InMemoryStateStore):
+            return None
+        sessions = SessionSnapshots(
+            self.SESSION_SNAPSHOT,
+            self.SESSION_JOURNAL,
+            self._generate_chat_id,
+            history_capacity=self.HISTORY_CAPACITY,
+            flush_interval=self.SESSION_FLUSH_INTERVAL,
+            snapshot_interval=self.SESSION_SNAPSHOT_INTERVAL,
+        )
+        started = time.perf_counter()
+        try:
+            if sessions.restore(self.state_store, self.chats):
+                print(
+                    f"Restored {len(self.chats)} chats and "
+                    f"{len(self.state_store.waiting_users)} waiting users in "
+                    f"{(time.perf_counter() - started) * 1000:.1f} ms"
+                )
+        except (OSError, ValueError, struct.error) as e:
+            print(f"Error while restoring sessions, starting empty: {e}")
+            self.state_store.clear()
+            self.chats.clear()
+        sessions.attach(self.state_store, self.chats)
+        return sessions
+
+    def _instrument(self, metrics: BotMetrics):
+        registry = metrics.registry
+        registry.gauge(
+            "anonbot_waiting_users",
+            "Users searching for a partner.",
+            self.waiting_users.room_sizes,
+            label="room",
+        )
+        registry.gauge("anonbot_active_chats", "Open chats.", lambda: len(self.chats))
+        registry.gauge(
+            "anonbot_outbound_pending",
+            "Bot API calls queued in the outbound scheduler.",
+            lambda: self.sender.pending,
+        )
+        registry.gauge(
+            "anonbot_match_wait_estimate_seconds",
+            "Moving average of the time to a match.",
+            self.wait_estimates.rooms,
+            label="room",
+        )
+        self.router.wrap(self._timed)
+        for handler in self._edited_handlers():
+            handler["function"] = self._timed(handler["function"])
+
+    def _edited_handlers(self):
+        return self.bot.edited_message_handlers
+
+    def _receiver(self):
+        return self.bot
+
+    def _load(self) -> tuple:
+        """Queued outbound calls (plus queued webhook updates) and average Bot API latency."""
+        depth = self.sender.pending
+        if self.webhook is not None:
+            depth += self.webhook.queue_depth()
+        return depth, self.sender.latency
+
+    def record_updates(self, path: str):
+        """Appends every incoming update, with pseudonymous ids, to ``path``."""
+        self.recorder = UpdateRecorder(path, self._describe_user)
+        receiver = self._receiver()
+        receiver.process_new_updates = self.recorder.wrap(receiver.process_new_updates)
+
+    def _describe_user(self, user_id: int) -> dict:
+        settings = self.user_settings.get(self._hash_id(user_id))
+        state = self.user_states.get(user_id)
+        setup_state = self.setup_states.get(user_id)
+        return {
+            "profile": settings.to_dict() if settings is not None else None,
+            "state": state.value if state is not None else None,
+            "setup": setup_state.value if setup_state is not None else None,
+            "partner": self.active_chats.get(user_id),
+            "waiting": user_id in self.waiting_users,
+        }
+
+    def _timed(self, handler):
+        observe = self.metrics.handler_seconds.observe
+        name = handler.__name__
+
+        if asyncio.iscoroutinefunction(handler):
+
+            @functools.wraps(handler)
+            async def timed(message):
+                started = time.perf_counter()
+                try:
+                    return await handler(message)
+                finally:
+                    observe(time.perf_counter() - started, name)
+
+        else:
+
+            @functools.wraps(handler)
+            def timed(message):
+                started = time.perf_counter()
+                try:
+                    return handler(message)
+                finally:
+                    observe(time.perf_counter() - started, name)
+
+        return timed
+
+    def start_profiling(self, sample_seconds: Optional[float] = None, admin_id: int = 0) -> bool:
+        """Times handlers, hot methods and Bot API calls; samples stacks when ``sample_seconds`` is set."""
+        return self.profiler.start(
+            self._install_profiling,
+            sample_seconds,
+            on_done=lambda: self._profiling_done(admin_id),
+        )
+
+    def stop_profiling(self) -> Optional[str]:
+        path = self.profiler.stop()
+        if path is not None:
+            print(f"Profile written to {path}")
+        return path
+
+    def toggle_profiling(self):
+        if self.profiler.active:
+            self.stop_profiling()
+        elif self.start_profiling(0):
+            print("Profiling until the next toggle")
+
+    def _profiling_done(self, admin_id: int):
+        path = self.stop_profiling()
+        if path is not None and admin_id:
+            self._notify(admin_id, f"Profile written to {path}", PRIORITY_BULK)
+
+    def _install_profiling(self, timings: CallTimings) -> Callable[[], None]:
+        unwrap_routes = self.router.wrap(timings.timed)
+        edited = self._edited_handlers()
+        edited_functions = [handler["function"] for handler in edited]
+        for handler in edited:
+            handler["function"] = timings.timed(handler["function"])
+        for name in self.PROFILED_METHODS:
+            setattr(self, name, timings.timed(getattr(self, name), name))
+
+        unwrap_api = self._time_api_requests(timings)
+
+        def uninstall():
+            unwrap_api()
+            for name in self.PROFILED_METHODS:
+                self.__dict__.pop(name, None)
+            for handler, function in zip(edited, edited_functions):
+                handler["function"] = function
+            unwrap_routes()
+
+        return uninstall
+
+    def _time_api_requests(self, timings: CallTimings) -> Callable[[], None]:
+        from telebot import apihelper
+
+        make_request = apihelper._make_request
+
+        def timed_request(token, method_name, *args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return make_request(token, method_name, *args, **kwargs)
+            finally:
+                timings.observe(f"api.{method_name}", time.perf_counter() - started)
+
+        apihelper._make_request = timed_request
+
+        def uninstall():
+            if apihelper._make_request is timed_request:
+                apihelper._make_request = make_request
+
+        return uninstall
+
+    def _seed_recipients(self):
+        """Lists the raw ids in the state store when the recipient log is new (profiles are hashed)."""
+        if len(self.recipients):
+            return
+        added = self.recipients.extend(
+            user_id
+            for users in (self.user_states, self.setup_states, self.active_chats)
+            for user_id in users
+        )
+        if added:
+            print(f"Listed {added} known users as broadcast recipients")
 
     def _hash_id(self, user_id: int) -> str:
-        return hashlib.sha256(str(user_id).encode()).hexdigest()
+        return hash_user_id(user_id)
+
+    def _open_profiles(self, clock: Callable[[], float]) -> MappedProfileTable:
+        if (
+            not os.path.exists(self.PROFILES_FILE)
+            and not os.path.exists(self.SETTINGS_LOG)
+            and os.path.exists(self.SETTINGS_FILE)
+        ):
+            count = convert(self.SETTINGS_FILE, self.PROFILES_FILE)
+            print(f"Converted {count} profiles from {self.SETTINGS_FILE} to {self.PROFILES_FILE}")
+        return MappedProfileTable(self.PROFILES_FILE, self.ROOMS, clock)
 
     def _load_settings(self):
-        if Path(self.SETTINGS_FILE).exists():
-            with open(self.SETTINGS_FILE, "r") as f:
-                data = json.load(f)
-                for hashed_id, settings in data.items():
-                    self.user_settings[hashed_id] = UserSettings(**settings)
-
-    def _save_settings(self):
-        data = {
-            hashed_id: settings.to_dict()
-            for hashed_id, settings in self.user_settings.items()
-        }
-        with open(self.SETTINGS_FILE, "w") as f:
-            json.dump(data, f)
+        for hashed_id, settings in self.settings_store.load().items():
+            self.user_settings[hashed_id] = UserSettings(**settings)
+        self.settings_store.bind(self.user_settings, Profile.to_dict, self.user_settings.save)
+        if self.settings_store.needs_compaction():
+            self.settings_store.compact()
+
+    def _import_profiles(self, profiles, clock: Callable[[], float]):
+        """Copies this process's profile files into an empty shared store, once."""
+        if len(profiles) or not any(
+            os.path.exists(path) for path in (self.PROFILES_FILE, self.SETTINGS_LOG, self.SETTINGS_FILE)
+        ):
+            return profiles
+        local = self._open_profiles(clock)
+        for hashed_id, settings in SettingsStore(self.SETTINGS_LOG).load().items():
+            local[hashed_id] = UserSettings(**settings)
+        added = profiles.add_missing((hashed_id, local[hashed_id]) for hashed_id in local)
+        print(f"Copied {added} profiles into the shared state store")
+        return profiles
+
+    def _save_settings(self, hashed_id: str, settings):
+        self.user_settings[hashed_id] = settings
+        if self.settings_store is not None:
+            self.settings_store.put(hashed_id, settings.to_dict())
 
     def _setup_handlers(self):
-        @self.bot.message_handler(commands=["start"])
+        @self.router.command("start")
         def start_handler(message):
             user_id = message.from_user.id
             hashed_id = self._hash_id(user_id)
+            self.recipients.add(user_id)
 
             if hashed_id not in self.user_settings:
                 self.user_states[user_id] = UserState.SETUP
                 self.setup_states[user_id] = SetupState.AGE
                 self.user_settings[hashed_id] = UserSettings()
-                self.bot.reply_to(
+                self._reply(
                     message,
                     "Welcome! Let's set up your profile.\nPlease enter your age (18-99):",
                 )
             else:
                 self.user_states[user_id] = UserState.IDLE
-                self.bot.reply_to(
+                self._reply(
                     message,
                     "Welcome back! Use /search to find someone to chat with.\n"
                     "You can update your settings with:\n"
@@ -115,79 +435,123 @@ class ChatBot:
                     "/room - Change chat room",
                 )
 
-        @self.bot.message_handler(commands=["age"])
+        @self.router.command("age")
         def age_handler(message):
             user_id = message.from_user.id
             if self.user_states.get(user_id) == UserState.CHATTING:
-                self.bot.reply_to(message, "Please finish your current chat first.")
+                self._reply(message, "Please finish your current chat first.")
                 return
             self.setup_states[user_id] = SetupState.AGE
-            self.bot.reply_to(message, "Please enter your age (18-99):")
+            self._reply(message, "Please enter your age (18-99):")
 
-        @self.bot.message_handler(commands=["gender"])
+        @self.router.command("gender")
         def gender_handler(message):
             user_id = message.from_user.id
             if self.user_states.get(user_id) == UserState.CHATTING:
-                self.bot.reply_to(message, "Please finish your current chat first.")
+                self._reply(message, "Please finish your current chat first.")
                 return
             self.setup_states[user_id] = SetupState.GENDER
-            self.bot.reply_to(message, "Please enter your gender (M/W):")
+            self._reply(message, "Please enter your gender (M/W):")
 
-        @self.bot.message_handler(commands=["room"])
+        @self.router.command("room")
         def room_handler(message):
             user_id = message.from_user.id
             if self.user_states.get(user_id) == UserState.CHATTING:
-                self.bot.reply_to(message, "Please finish your current chat first.")
+                self._reply(message, "Please finish your current chat first.")
                 return
             self.setup_states[user_id] = SetupState.ROOM
             rooms_str = ", ".join(self.ROOMS)
-            self.bot.reply_to(message, f"Please choose a room:\n{rooms_str}")
+            self._reply(message, f"Please choose a room:\n{rooms_str}")
+
+        @self.router.command("profile")
+        def profile_handler(message):
+            user_id = message.from_user.id
+            if user_id not in self.ADMIN_IDS:
+                return
+            if self.profiler.active:
+                path = self.stop_profiling()
+                self._reply(message, f"Profile written to {path}")
+                return
+            args = message.text.split()[1:]
+            try:
+                seconds = float(args[0]) if args else self.PROFILE_SAMPLE_SECONDS
+            except ValueError:
+                self._reply(message, "Usage: /profile [seconds], 0 to run until the next /profile")
+                return
+            self.start_profiling(seconds, user_id)
+            self._reply(
+                message,
+                f"Profiling for {seconds:g} s." if seconds else "Profiling until the next /profile.",
+            )
+
+        @self.router.command("broadcast")
+        def broadcast_handler(message):
+            user_id = message.from_user.id
+            if user_id not in self.ADMIN_IDS:
+                return
+            text = message.text.split(maxsplit=1)[1:]
+            if not text or self.broadcaster.running:
+                self._reply(message, self.broadcaster.progress())
+                return
+            self.broadcaster.start(text[0], user_id)
+            self._reply(
+                message, f"Broadcasting to {self.broadcaster.state['total']} users."
+            )
+
+        @self.router.command("stop_broadcast")
+        def stop_broadcast_handler(message):
+            if message.from_user.id not in self.ADMIN_IDS:
+                return
+            self.broadcaster.cancel()
+            self._reply(message, self.broadcaster.progress())
 
-        @self.bot.message_handler(
-            func=lambda message: self.user_states.get(message.from_user.id)
-            == UserState.SETUP
-            or self.setup_states.get(message.from_user.id)
-            in [SetupState.AGE, SetupState.GENDER, SetupState.ROOM]
+        @self.router.message(
+            when=lambda user_state, setup_state: user_state == UserState.SETUP
+            or setup_state in (SetupState.AGE, SetupState.GENDER, SetupState.ROOM)
         )
         def handle_setup(message):
             user_id = message.from_user.id
             hashed_id = self._hash_id(user_id)
             setup_state = self.setup_states.get(user_id)
+            settings = self.user_settings.get(hashed_id)
+            if settings is None:
+                self._reply(message, "Please use /start to set up your profile first.")
+                return
 
             if setup_state == SetupState.AGE:
                 try:
                     age = int(message.text)
                     if 18 <= age <= 99:
-                        self.user_settings[hashed_id].age = age
+                        settings.age = age
                         self.setup_states[user_id] = SetupState.GENDER
-                        self.bot.reply_to(message, "Please enter your gender (M/W):")
+                        self._reply(message, "Please enter your gender (M/W):")
                     else:
-                        self.bot.reply_to(
+                        self._reply(
                             message, "Please enter a valid age between 18 and 99:"
                         )
                 except ValueError:
-                    self.bot.reply_to(
+                    self._reply(
                         message, "Please enter a valid number between 18 and 99:"
                     )
 
             elif setup_state == SetupState.GENDER:
                 gender = message.text.upper()
                 if gender in ["M", "W"]:
-                    self.user_settings[hashed_id].gender = gender
+                    settings.gender = gender
                     self.setup_states[user_id] = SetupState.ROOM
                     rooms_str = ", ".join(self.ROOMS)
-                    self.bot.reply_to(message, f"Please choose a room:\n{rooms_str}")
+                    self._reply(message, f"Please choose a room:\n{rooms_str}")
                 else:
-                    self.bot.reply_to(message, "Please enter either M or W:")
+                    self._reply(message, "Please enter either M or W:")
 
             elif setup_state == SetupState.ROOM:
                 room = message.text.lower()
                 if room in self.ROOMS:
-                    self.user_settings[hashed_id].room = room
+                    settings.room = room
                     self.setup_states[user_id] = SetupState.COMPLETE
                     self.user_states[user_id] = UserState.IDLE
-                    self._save_settings()
-                    self.bot.reply_to(
+                    self.waiting_users.remove(user_id)
+                    self._reply(
                         message,
                         "Setup complete! Use /search to find someone to chat with.\n"
                         "You can update your settings anytime with:\n"
@@ -197,74 +561,76 @@ class ChatBot:
                     )
                 else:
                     rooms_str = ", ".join(self.ROOMS)
-                    self.bot.reply_to(
+                    self._reply(
                         message, f"Please choose a valid room:\n{rooms_str}"
                     )
-            self._save_settings()
+            self._save_settings(hashed_id, settings)
 
-        @self.bot.message_handler(commands=["search"])
+        @self.router.command("search")
         def search_handler(message):
             user_id = message.from_user.id
             hashed_id = self._hash_id(user_id)
 
             if hashed_id not in self.user_settings:
-                self.bot.reply_to(
+                self._reply(
                     message, "Please use /start to set up your profile first."
                 )
                 return
 
             if self.user_states.get(user_id) == UserState.CHATTING:
-                self.bot.reply_to(
+                self._reply(
                     message,
                     "Finish your current chat with /end before searching for a new one.",
                 )
                 return
 
             if user_id in self.waiting_users:
-                self.bot.reply_to(
+                self._reply(
                     message, "You're already searching for a chat partner."
                 )
                 return
 
             self.user_states[user_id] = UserState.WAITING
-            self.waiting_users.append(user_id)
-            self.bot.reply_to(message, "Looking for a chat partner...")
-            self._try_match_users()
+            room = self.user_settings[hashed_id].room
+            estimate = self.wait_estimates.estimate(room)
+            if estimate is None:
+                self._reply(message, "Looking for a chat partner...")
+            else:
+                self._reply(
+                    message,
+                    f"Looking for a chat partner... Matches in {room} usually take"
+                    f" {format_wait(estimate)}.",
+                )
+            self._try_match_users(user_id)
+
+        @self.router.command("general")
+        def fallback_handler(message):
+            user_id = message.from_user.id
+            if user_id not in self.waiting_users or not hasattr(self.waiting_users, "rematch"):
+                self._reply(message, "You're not searching right now. Use /search first.")
+                return
+
+            self.waiting_users.allow_fallback(user_id)
+            self._reply(
+                message, f"OK, people from the {self.FALLBACK_ROOM} room can be matched with you too."
+            )
+            self.rematch()
 
-        @self.bot.message_handler(commands=["end"])
+        @self.router.command("end")
         def end_handler(message):
             user_id = message.from_user.id
             if self.user_states.get(user_id) != UserState.CHATTING:
-                self.bot.reply_to(message, "You're not in an active chat right now.")
+                self._reply(message, "You're not in an active chat right now.")
                 return
 
             self._end_chat(user_id)
-            self.bot.send_message(
-                user_id, "Chat ended. Want to start another? Use /search."
-            )
+            self._notify(user_id, "Chat ended. Want to start another? Use /search.")
 
-        @self.bot.message_handler(
-            content_types=[
-                "text",
-                "audio",
-                "document",
-                "photo",
-                "sticker",
-                "video",
-                "video_note",
-                "voice",
-                "location",
-                "contact",
-                "venue",
-                "dice",
-                "poll",
-                "animation",
-            ]
-        )
+        @self.router.message(content_types=self.forwarders.content_types())
         def message_handler(message):
             user_id = message.from_user.id
             if self.user_states.get(user_id) != UserState.CHATTING:
-                self.bot.reply_to(
+                self._reply(
                     message,
                     "You're not in an active chat. Use /search to find someone to talk to.",
                 )
@@ -274,293 +640,672 @@ class ChatBot:
             if not partner_id:
                 return
 
-            self._forward_message(message, user_id, partner_id)
-
-    def _is_good_match(self, user1_id: int, user2_id: int) -> bool:
-        user1_hash = self._hash_id(user1_id)
-        user2_hash = self._hash_id(user2_id)
-
-        user1_settings = self.user_settings[user1_hash]
-        user2_settings = self.user_settings[user2_hash]
-
-        if user1_settings.room != user2_settings.room:
-            return False
+            self._touch_chat(user_id, partner_id)
+            if self._blocked(message, user_id):
+                return
+            if message.media_group_id and message.content_type in ALBUM_CONTENT_TYPES:
+                self.albums.add(user_id, partner_id, message)
+                return
 
-        age_diff = abs(user1_settings.age - user2_settings.age)
-        if age_diff > 10:
-            return False
+            self._forward_message(message, user_id, partner_id)
 
-        if user1_settings.gender == user2_settings.gender:
-            return random.random() < 0.3
+        @self.bot.edited_message_handler(content_types=self.forwarders.editable_types())
+        def edited_message_handler(message):
+            user_id = message.from_user.id
+            partner_id = self.active_chats.get(user_id)
+            if not partner_id:
+                return
 
-        return True
+            chat = self.chats.get(self._generate_chat_id(user_id, partner_id))
+            if chat is None:
+                return
+            self._touch_chat(user_id, partner_id)
+            partner_message_id = chat[user_id].partner_of(message.message_id)
+            if partner_message_id is None or self._blocked(message, user_id):
+                return
 
-    def _try_match_users(self):
-        if len(self.waiting_users) >= 2:
-            user1 = self.waiting_users[0]
-            best_match = None
+            self._mirror_edit(message, partner_id, partner_message_id)
 
-            for i, user2 in enumerate(self.waiting_users[1:], 1):
-                if self._is_good_match(user1, user2):
-                    best_match = i
-                    break
+        self.router.attach(self.bot)
 
-            if best_match is not None:
-                user1 = self.waiting_users.pop(0)
-                user2 = self.waiting_users.pop(
-                    best_match - 1
-                )  
+    def _try_match_users(self, user_id: int):
+        settings = self.user_settings[self._hash_id(user_id)]
+        if self.MATCH_BATCH_INTERVAL or self.MATCH_BATCH_SIZE:
+            with self._match_lock:
+                self.waiting_users.add(user_id, settings.room, settings.gender, settings.age)
+                self._arrivals += 1
+                full = self.MATCH_BATCH_SIZE and self._arrivals >= self.MATCH_BATCH_SIZE
+            self.timeouts.schedule(("wait", user_id), self.WAITING_TTL)
+            if full:
+                self.match_round()
+            return
 
-                self.active_chats[user1] = user2
-                self.active_chats[user2] = user1
+        partner_id = self.waiting_users.match(
+            user_id, settings.room, settings.gender, settings.age
+        )
+        if partner_id is None:
+            self.timeouts.schedule(("wait", user_id), self.WAITING_TTL)
+            return
+        self._start_chat(user_id, partner_id, settings.room)
+
+    def match_round(self) -> int:
+        """Pairs up the waiting pool in one batch; returns how many chats were started."""
+        with self._match_lock:
+            self._arrivals = 0
+            pairs = self.waiting_users.match_round()
+        for user_id, partner_id in pairs:
+            self._start_chat(user_id, partner_id)
+        return len(pairs)
+
+    def rematch(self) -> int:
+        """Retries long waiters with relaxed criteria; returns how many chats were started.
+
+        Anyone who has waited ``FALLBACK_OFFER_AFTER`` outside the fallback
+        room is also offered, once per search, to be matched from there.
+        """
+        with self._match_lock:
+            pairs = self.waiting_users.rematch(fallback_room=self.FALLBACK_ROOM)
+            offers = [
+                (user_id, room)
+                for user_id, room, _ in self.waiting_users.long_waiters(self.FALLBACK_OFFER_AFTER)
+                if room != self.FALLBACK_ROOM and user_id not in self._fallback_offered
+            ]
+            self._fallback_offered.update(user_id for user_id, _ in offers)
+        for user_id, partner_id in pairs:
+            self._start_chat(user_id, partner_id)
+        for user_id, room in offers:
+            estimate = self.wait_estimates.estimate(room)
+            usual = f" (usually {format_wait(estimate)})" if estimate is not None else ""
+            self._notify(
+                user_id,
+                f"Still looking for someone in {room}{usual}. Send /general to also meet"
+                f" people from the {self.FALLBACK_ROOM} room.",
+                PRIORITY_BULK,
+            )
+        return len(pairs)
+
+    def _match_forever(self):
+        while not self._reaper_stop.wait(self.MATCH_BATCH_INTERVAL):
+            try:
+                self.match_round()
+            except Exception as e:
+                print(f"Error while matching waiting users: {e}")
+
+    def _start_chat(self, user_id: int, partner_id: int, room: Optional[str] = None):
+        now = self.timeouts.clock()
+        waits = []
+        for uid in (user_id, partner_id):
+            queued_until = self.timeouts.deadline(("wait", uid))
+            waits.append((uid, 0.0 if queued_until is None else now - queued_until + self.WAITING_TTL))
+            self.timeouts.cancel(("wait", uid))
+            self._fallback_offered.discard(uid)
+        self.active_chats[user_id] = partner_id
+        self.active_chats[partner_id] = user_id
 
-                self.user_states[user1] = UserState.CHATTING
-                self.user_states[user2] = UserState.CHATTING
+        self.user_states[user_id] = UserState.CHATTING
+        self.user_states[partner_id] = UserState.CHATTING
 
-                chat_id = self._generate_chat_id(user1, user2)
-                self.chats[chat_id] = {user1: [], user2: []}
+        chat_id = self._generate_chat_id(user_id, partner_id)
+        self.chats[chat_id] = {
+            user_id: MessageHistory(self.HISTORY_CAPACITY),
+            partner_id: MessageHistory(self.HISTORY_CAPACITY),
+        }
+        self._touch_chat(user_id, partner_id)
 
-                for user in (user1, user2):
-                    self.bot.send_message(
-                        user,
-                        "Chat partner found! Start chatting now. Use /end to finish the chat.",
-                    )
+        for user in (partner_id, user_id):
+            self._notify(
+                user,
+                "Chat partner found! Start chatting now. Use /end to finish the chat.",
+                PRIORITY_HIGH,
+            )
+        for uid, waited in waits:
+            self._observe_wait(uid, waited, room)
+
+    def _observe_wait(self, user_id: int, waited: float, room: Optional[str] = None):
+        if self.metrics is not None:
+            self.metrics.match_wait_seconds.observe(waited)
+        if room is None:
+            settings = self.user_settings.get(self._hash_id(user_id))
+            if settings is None:
+                return
+            room = settings.room
+        self.wait_estimates.observe(room, waited)
 
     def _generate_chat_id(self, user1: int, user2: int) -> int:
         return user1 * 1_000_000 + user2 if user1 < user2 else user2 * 1_000_000 + user1
 
-    def _forward_message(self, message, sender_id: int, receiver_id: int):
-        try:
-            sent_message = None
-
-            if message.content_type == "text":
-                sent_message = self.bot.send_message(receiver_id, message.text)
+    def _touch_chat(self, user_id: int, partner_id: int):
+        self.timeouts.schedule(
+            ("chat", self._generate_chat_id(user_id, partner_id)), self.CHAT_IDLE_TTL
+        )
 
-            elif message.content_type == "photo":
-                sent_message = self.bot.send_photo(
-                    receiver_id,
-                    message.photo[-1].file_id,
-                    caption=message.caption,
-                    caption_entities=message.caption_entities,
+    def reap(self, now: Optional[float] = None) -> int:
+        """Drops waiters and chats that outlived their TTL; returns how many users were told."""
+        notices = []
+        for kind, key in self.timeouts.advance(now):
+            try:
+                self._expire(kind, key, notices)
+            except Exception as e:
+                print(f"Error while expiring {kind} {key}: {e}")
+
+        for user_id, text in notices:
+            self._notify(user_id, text, PRIORITY_BULK)
+        return len(notices)
+
+    def _expire(self, kind: str, key, notices: list):
+        if kind == "wait":
+            self._fallback_offered.discard(key)
+            if self.waiting_users.remove(key):
+                self.user_states[key] = UserState.IDLE
+                notices.append(
+                    (key, "No chat partner found in time. Use /search to try again.")
                 )
-
-            elif message.content_type == "video":
-                sent_message = self.bot.send_video(
-                    receiver_id,
-                    message.video.file_id,
-                    caption=message.caption,
-                    caption_entities=message.caption_entities,
-                    duration=message.video.duration,
-                    width=message.video.width,
-                    height=message.video.height,
+                settings = self.user_settings.get(self._hash_id(key))
+                if settings is not None:
+                    self.wait_estimates.observe(settings.room, self.WAITING_TTL)
+        elif kind == "chat":
+            chat = self.chats.get(key)
+            if chat is None:
+                return
+            if not isinstance(self.state_store, InMemoryStateStore):
+                # Other workers may be relaying this chat, so only forget the local history.
+                self.chats.pop(key, None)
+                return
+            users = list(chat)
+            self._end_chat(users[0], notify_partner=False)
+            notices.extend(
+                (
+                    user_id,
+                    "Chat ended after a period of inactivity. Use /search to find another.",
                 )
+                for user_id in users
+            )
+        elif kind == "rematch":
+            self.timeouts.schedule(("rematch", None), self.REMATCH_INTERVAL)
+            self.rematch()
+        else:
+            try:
+                self.user_settings.evict(self.PROFILE_IDLE_TTL)
+            finally:
+                self.timeouts.schedule(("profiles", None), self.PROFILE_EVICT_INTERVAL)
+
+    def _reap_forever(self):
+        while not self._reaper_stop.wait(self.REAP_INTERVAL):
+            try:
+                self.reap()
+            except Exception as e:
+                print(f"Error while reaping idle sessions: {e}")
+
+    def _start_reaper(self):
+        self._reaper_stop.clear()
+        threading.Thread(target=self._reap_forever, name="reaper", daemon=True).start()
+
+    def _notify(self, user_id: int, text: str, priority: int = PRIORITY_NORMAL):
+        return self.sender.submit(
+            user_id, lambda: self.bot.send_message(user_id, text), priority
+        )
 
-            elif message.content_type == "audio":
-                sent_message = self.bot.send_audio(
-                    receiver_id,
-                    message.audio.file_id,
-                    caption=message.caption,
-                    caption_entities=message.caption_entities,
-                    duration=message.audio.duration,
-                    performer=message.audio.performer,
-                    title=message.audio.title,
-                )
+    def _reply(self, message, text: str):
+        return self.sender.submit(
+            message.chat.id, lambda: self.bot.reply_to(message, text), PRIORITY_HIGH
+        )
 
-            elif message.content_type == "document":
-                sent_message = self.bot.send_document(
-                    receiver_id,
-                    message.document.file_id,
-                    caption=message.caption,
-                    caption_entities=message.caption_entities,
-                    thumb=(
-                        message.document.thumb.file_id
-                        if message.document.thumb
-                        else None
-                    ),
-                )
+    def _broadcast_send(self, user_id: int, text: str):
+        return self.sender.submit(
+            user_id, lambda: self.bot.send_message(user_id, text), PRIORITY_BACKGROUND
+        )
 
-            elif message.content_type == "voice":
-                sent_message = self.bot.send_voice(
-                    receiver_id,
-                    message.voice.file_id,
-                    caption=message.caption,
-                    caption_entities=message.caption_entities,
-                    duration=message.voice.duration,
-                )
+    def _broadcast_done(self, state: dict):
+        if state["admin"]:
+            self._notify(state["admin"], self.broadcaster.progress(), PRIORITY_BULK)
 
-            elif message.content_type == "video_note":
-                sent_message = self.bot.send_video_note(
-                    receiver_id,
-                    message.video_note.file_id,
-                    duration=message.video_note.duration,
-                    length=message.video_note.length,
-                )
+    def _blocked(self, message, sender_id: int) -> bool:
+        """Checks text and captions against the moderation rules and tells the sender when blocked."""
+        if not self.moderator.active:
+            return False
+        text = message.text if message.text is not None else message.caption
+        entities = message.entities if message.text is not None else message.caption_entities
+        room = self.user_settings[self._hash_id(sender_id)].room if self.moderator.per_room else None
+        has_link = any(entity.type in LINK_ENTITIES for entity in entities or ())
+        reason = self.moderator.check(text, room, has_link)
+        if reason is None:
+            return False
+        if self.metrics is not None:
+            self.metrics.messages_blocked.inc(reason)
+        self._notify(
+            sender_id,
+            "Links aren't allowed here, so your message wasn't delivered."
+            if reason == "link"
+            else "Your message contains a blocked phrase and wasn't delivered.",
+        )
+        return True
 
-            elif message.content_type == "sticker":
-                sent_message = self.bot.send_sticker(
-                    receiver_id, message.sticker.file_id
-                )
+    def _reply_kwargs(self, message, sender_id: int, receiver_id: int) -> dict:
+        reply = message.reply_to_message
+        if reply is None:
+            return {}
+        chat = self.chats.get(self._generate_chat_id(sender_id, receiver_id))
+        if chat is None:
+            return {}
+        target = chat[sender_id].partner_of(reply.message_id)
+        if target is None:
+            target = chat[receiver_id].origin_of(reply.message_id)
+        return reply_parameters(target) if target is not None else {}
 
-            elif message.content_type == "location":
-                sent_message = self.bot.send_location(
-                    receiver_id,
-                    latitude=message.location.latitude,
-                    longitude=message.location.longitude,
-                    horizontal_accuracy=(
-                        message.location.horizontal_accuracy
-                        if hasattr(message.location, "horizontal_accuracy")
-                        else None
-                    ),
-                    live_period=(
-                        message.location.live_period
-                        if hasattr(message.location, "live_period")
-                        else None
-                    ),
-                )
+    def _forward_message(self, message, sender_id: int, receiver_id: int):
+        kwargs = self._reply_kwargs(message, sender_id, receiver_id)
+        future = self.sender.submit(
+            receiver_id,
+            lambda: self.forwarders.forward(self.bot, message, receiver_id, **kwargs),
+            content_priority(message.content_type),
+        )
+        future.add_done_callback(
+            lambda done: self._forward_done(done, message, sender_id, receiver_id)
+        )
 
-            elif message.content_type == "contact":
-                sent_message = self.bot.send_contact(
-                    receiver_id,
-                    phone_number=message.contact.phone_number,
-                    first_name=message.contact.first_name,
-                    last_name=(
-                        message.contact.last_name if message.contact.last_name else None
-                    ),
-                )
+    def _forward_done(self, future, message, sender_id: int, receiver_id: int):
+        if future.cancelled():
+            return
+        failed = future.exception() is not None
+        if self.metrics is not None:
+            self.metrics.forwards.inc(message.content_type, "error" if failed else "ok")
+        if failed:
+            self._forward_failed(sender_id, future.exception())
+        else:
+            self._record_forward(message, sender_id, receiver_id, future.result())
+
+    def _record_forward(self, message, sender_id: int, receiver_id: int, sent_message):
+        chat = self.chats.get(self._generate_chat_id(sender_id, receiver_id))
+        if not sent_message or chat is None:
+            return
+        if self.sessions is not None:
+            self.sessions.append_message(
+                chat[sender_id], sender_id, receiver_id, message.message_id, sent_message.message_id
+            )
+        else:
+            chat[sender_id].append(message.message_id, sent_message.message_id)
 
-            elif message.content_type == "venue":
-                sent_message = self.bot.send_venue(
-                    receiver_id,
-                    latitude=message.venue.location.latitude,
-                    longitude=message.venue.location.longitude,
-                    title=message.venue.title,
-                    address=message.venue.address,
-                    foursquare_id=(
-                        message.venue.foursquare_id
-                        if hasattr(message.venue, "foursquare_id")
-                        else None
-                    ),
-                    foursquare_type=(
-                        message.venue.foursquare_type
-                        if hasattr(message.venue, "foursquare_type")
-                        else None
-                    ),
-                )
+    def _forward_album(self, sender_id: int, receiver_id: int, messages: list):
+        if self.active_chats.get(sender_id) != receiver_id:
+            return
+        kwargs = self._reply_kwargs(messages[0], sender_id, receiver_id)
+        media = [input_media(message) for message in messages]
+        future = self.sender.submit(
+            receiver_id,
+            lambda: self.bot.send_media_group(receiver_id, media, **kwargs),
+            PRIORITY_BULK,
+        )
+        future.add_done_callback(
+            lambda done: self._album_done(done, messages, sender_id, receiver_id)
+        )
 
-            elif message.content_type == "animation":
-                sent_message = self.bot.send_animation(
-                    receiver_id,
-                    message.animation.file_id,
-                    caption=message.caption,
-                    caption_entities=message.caption_entities,
-                    duration=message.animation.duration,
-                    width=message.animation.width,
-                    height=message.animation.height,
-                )
+    def _album_done(self, future, messages: list, sender_id: int, receiver_id: int):
+        if future.cancelled():
+            return
+        failed = future.exception() is not None
+        if self.metrics is not None:
+            for message in messages:
+                self.metrics.forwards.inc(message.content_type, "error" if failed else "ok")
+        if failed:
+            self._forward_failed(sender_id, future.exception())
+            return
+        for message, sent_message in zip(messages, future.result()):
+            self._record_forward(message, sender_id, receiver_id, sent_message)
+
+    def _mirror_edit(self, message, receiver_id: int, partner_message_id: int):
+        future = self.sender.submit(
+            receiver_id,
+            lambda: self.forwarders.edit(
+                self.bot, message, receiver_id, partner_message_id
+            ),
+        )
+        future.add_done_callback(self._edit_done)
 
-            elif message.content_type == "poll":
-                sent_message = self.bot.send_poll(
-                    receiver_id,
-                    question=message.poll.question,
-                    options=[opt.text for opt in message.poll.options],
-                    is_anonymous=message.poll.is_anonymous,
-                    type=message.poll.type,
-                    allows_multiple_answers=message.poll.allows_multiple_answers,
-                    correct_option_id=(
-                        message.poll.correct_option_id
-                        if hasattr(message.poll, "correct_option_id")
-                        else None
-                    ),
-                    explanation=(
-                        message.poll.explanation
-                        if hasattr(message.poll, "explanation")
-                        else None
-                    ),
-                    explanation_entities=(
-                        message.poll.explanation_entities
-                        if hasattr(message.poll, "explanation_entities")
-                        else None
-                    ),
-                    open_period=(
-                        message.poll.open_period
-                        if hasattr(message.poll, "open_period")
-                        else None
-                    ),
-                    close_date=(
-                        message.poll.close_date
-                        if hasattr(message.poll, "close_date")
-                        else None
-                    ),
-                )
+    def _edit_done(self, future):
+        if not future.cancelled() and future.exception() is not None:
+            print(f"Error while mirroring edit: {future.exception()}")
 
-            elif message.content_type == "dice":
-                sent_message = self.bot.send_dice(receiver_id, emoji=message.dice.emoji)
-
-            elif message.content_type == "media_group":
-                media = []
-                for item in message.media_group_id:
-                    if item.type == "photo":
-                        media.append(
-                            telebot.types.InputMediaPhoto(
-                                item.file_id, caption=item.caption
-                            )
-                        )
-                    elif item.type == "video":
-                        media.append(
-                            telebot.types.InputMediaVideo(
-                                item.file_id, caption=item.caption
-                            )
-                        )
-                sent_message = self.bot.send_media_group(receiver_id, media)
-
-            if sent_message:
-                chat_id = self._generate_chat_id(sender_id, receiver_id)
-                message_id = (
-                    sent_message[0].message_id
-                    if isinstance(sent_message, list)
-                    else sent_message.message_id
-                )
-                self.chats[chat_id][sender_id].append(
-                    MessageInfo(
-                        message_id=message.message_id,
-                        chat_id=message.chat.id,
-                        partner_message_id=message_id,
-                        timestamp=datetime.now(),
-                    )
-                )
- 
-        except Exception as e:
-            print(f"Error while forwarding message: {e}")
-            self.bot.send_message(
-                sender_id, "Oops! Something went wrong with sending your message."
-            )
+    def _forward_failed(self, sender_id: int, error: Exception):
+        print(f"Error while forwarding message: {error}")
+        self._notify(sender_id, "Oops! Something went wrong with sending your message.")
 
-    def _end_chat(self, user_id: int):
+    def memory_report(self) -> Dict[str, float]:
+        chats = list(self.chats.values())
+        history_bytes = sum(
+            history.nbytes() for chat in chats for history in chat.values()
+        )
+        messages = sum(len(history) for chat in chats for history in chat.values())
+        return {
+            "active_chats": len(chats),
+            "messages": messages,
+            "history_bytes": history_bytes,
+            "bytes_per_chat": history_bytes / len(chats) if chats else 0.0,
+            "profiles": len(self.user_settings),
+            "resident_profiles": self.user_settings.resident(),
+        }
+
+    def _end_chat(self, user_id: int, notify_partner: bool = True):
         partner_id = self.active_chats.pop(user_id, None)
         if not partner_id:
             return
 
         chat_id = self._generate_chat_id(user_id, partner_id)
         self.chats.pop(chat_id, None)
+        self.timeouts.cancel(("chat", chat_id))
 
         for uid in (user_id, partner_id):
             self.user_states[uid] = UserState.IDLE
             self.active_chats.pop(uid, None)
-            if uid != user_id:
-                self.bot.send_message(
+            if uid != user_id and notify_partner:
+                self._notify(
                     uid,
                     "Your chat partner has ended the conversation. Use /search to find another.",
+                    PRIORITY_HIGH,
                 )
 
+    def stop(self):
+        """Makes ``run`` or ``run_webhook`` return; they then drain and save state."""
+        if self.webhook is not None:
+            self.webhook.request_stop()
+        else:
+            self.bot.stop_polling()
+
+    def _start_background(self):
+        if self.settings_store is not None:
+            self.settings_store.start()
+        if self.sessions is not None:
+            self.sessions.start()
+        self._start_reaper()
+        self.moderator.start()
+        if self.MATCH_BATCH_INTERVAL:
+            threading.Thread(target=self._match_forever, name="matcher", daemon=True).start()
+        self.broadcaster.resume()
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, lambda signum, frame: self.stop())
+            if hasattr(signal, "SIGUSR1"):
+                signal.signal(
+                    signal.SIGUSR1,
+                    lambda signum, frame: threading.Thread(target=self.toggle_profiling).start(),
+                )
+
+    def _shutdown(self):
+        self._reaper_stop.set()
+        self.moderator.stop()
+        self.stop_profiling()
+        self.broadcaster.stop()
+        self.albums.flush_all()
+        self.sender.close()
+        self.broadcaster.checkpoint()
+        if self.settings_store is not None:
+            self.settings_store.close()
+        self.recipients.close()
+        if self.sessions is not None:
+            self.sessions.close()
+        if self.recorder is not None:
+            self.recorder.close()
+
     def run(self):
         print("Bot is up and running!")
-        self.bot.polling(none_stop=True)
+        self._start_background()
+        try:
+            self.bot.polling(none_stop=True)
+        finally:
+            self._shutdown()
+
+
+    def run_webhook(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 8443,
+        secret_token: str = "",
+        url: str = "",
+    ):
+        from src.services.webhook import WebhookServer
+
+        self.bot.threaded = False
+        self.webhook = WebhookServer(
+            self.bot.process_new_updates,
+            host=host,
+            port=port,
+            secret_token=secret_token,
+        )
+        if url:
+            self.bot.remove_webhook()
+            self.bot.set_webhook(url=url, secret_token=secret_token or None)
+
+        print(f"Bot is listening for webhooks on {host}:{port}")
+        self._start_background()
+        try:
+            self.webhook.serve_forever()
+        finally:
+            self._shutdown()
+
+
+class AsyncChatBot(ChatBot):
+    _poller: Optional[asyncio.Task] = None
+
+    def _create_bot(self, token: str):
+        from src.services.async_transport import AsyncBotFacade, OrderedAsyncTeleBot
+
+        self.async_bot = OrderedAsyncTeleBot(token)
+        return AsyncBotFacade(self.async_bot)
+
+    def _edited_handlers(self):
+        return self.async_bot.edited_message_handlers
+
+    def _create_sender(self) -> AsyncOutboundScheduler:
+        return self.bot.sends
+
+    def _receiver(self):
+        return self.async_bot
+
+    def _notify(self, user_id: int, text: str, priority: int = PRIORITY_NORMAL):
+        return self.bot.submit(user_id, lambda: self.async_bot.send_message(user_id, text), priority)
+
+    def _reply(self, message, text: str):
+        return self.bot.submit(
+            message.chat.id, lambda: self.async_bot.reply_to(message, text), PRIORITY_HIGH
+        )
+
+    def _time_api_requests(self, timings: CallTimings) -> Callable[[], None]:
+        from telebot import asyncio_helper
+
+        process_request = asyncio_helper._process_request
+
+        async def timed_request(token, url, *args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await process_request(token, url, *args, **kwargs)
+            finally:
+                timings.observe(f"api.{url}", time.perf_counter() - started)
+
+        asyncio_helper._process_request = timed_request
+
+        def uninstall():
+            if asyncio_helper._process_request is timed_request:
+                asyncio_helper._process_request = process_request
+
+        return uninstall
+
+    def _profiling_done(self, admin_id: int):
+        self._loop.call_soon_threadsafe(super()._profiling_done, admin_id)
+
+    def _broadcast_send(self, user_id: int, text: str):
+        return asyncio.run_coroutine_threadsafe(self._send_broadcast(user_id, text), self._loop)
+
+    async def _send_broadcast(self, user_id: int, text: str):
+        return await self.bot.submit(
+            user_id, lambda: self.async_bot.send_message(user_id, text), PRIORITY_BACKGROUND
+        )
+
+    def _broadcast_done(self, state: dict):
+        self._loop.call_soon_threadsafe(super()._broadcast_done, state)
+
+    def _forward_message(self, message, sender_id: int, receiver_id: int):
+        kwargs = self._reply_kwargs(message, sender_id, receiver_id)
+        task = self.bot.submit(
+            receiver_id,
+            lambda: self.forwarders.forward_async(
+                self.async_bot, message, receiver_id, **kwargs
+            ),
+            content_priority(message.content_type),
+        )
+        task.add_done_callback(
+            lambda done: self._forward_done(done, message, sender_id, receiver_id)
+        )
+
+    def _create_album_buffer(self) -> MediaGroupBuffer:
+        return MediaGroupBuffer(
+            self._forward_album,
+            self.ALBUM_WINDOW,
+            call_later=lambda delay, callback: asyncio.get_running_loop().call_later(
+                delay, callback
+            ),
+        )
+
+    def _forward_album(self, sender_id: int, receiver_id: int, messages: list):
+        if self.active_chats.get(sender_id) != receiver_id:
+            return
+        kwargs = self._reply_kwargs(messages[0], sender_id, receiver_id)
+        media = [input_media(message) for message in messages]
+        task = self.bot.submit(
+            receiver_id,
+            lambda: self.async_bot.send_media_group(receiver_id, media, **kwargs),
+            PRIORITY_BULK,
+        )
+        task.add_done_callback(
+            lambda done: self._album_done(done, messages, sender_id, receiver_id)
+        )
+
+    def _mirror_edit(self, message, receiver_id: int, partner_message_id: int):
+        task = self.bot.submit(
+            receiver_id,
+            lambda: self.forwarders.edit(
+                self.async_bot, message, receiver_id, partner_message_id
+            ),
+        )
+        task.add_done_callback(self._edit_done)
+
+    async def _reap_forever_async(self):
+        while True:
+            await asyncio.sleep(self.REAP_INTERVAL)
+            try:
+                self.reap()
+            except Exception as e:
+                print(f"Error while reaping idle sessions: {e}")
+
+    async def _match_forever_async(self):
+        while True:
+            await asyncio.sleep(self.MATCH_BATCH_INTERVAL)
+            try:
+                self.match_round()
+            except Exception as e:
+                print(f"Error while matching waiting users: {e}")
+
+    def run(self):
+        print("Bot is up and running!")
+        if self.settings_store is not None:
+            self.settings_store.start()
+        if self.sessions is not None:
+            self.sessions.start()
+        self.moderator.start()
+        try:
+            asyncio.run(self._poll())
+        finally:
+            self.moderator.stop()
+            if self.settings_store is not None:
+                self.settings_store.close()
+            if self.sessions is not None:
+                self.sessions.close()
+            if self.recorder is not None:
+                self.recorder.close()
+            self.stop_profiling()
+            self.recipients.close()
+
+    def stop(self):
+        """Makes ``run`` return; it then drains and saves state. Safe from any thread."""
+        if self._poller is not None:
+            self._loop.call_soon_threadsafe(self._poller.cancel)
+
+    async def _poll(self):
+        loop = self._loop = asyncio.get_running_loop()
+        reaper = loop.create_task(self._reap_forever_async())
+        matcher = None
+        if self.MATCH_BATCH_INTERVAL:
+            matcher = loop.create_task(self._match_forever_async())
+        poller = self._poller = loop.create_task(self.async_bot.infinity_polling())
+        try:
+            loop.add_signal_handler(signal.SIGTERM, poller.cancel)
+            loop.add_signal_handler(signal.SIGUSR1, self.toggle_profiling)
+        except NotImplementedError:
+            pass
+        self.broadcaster.resume()
+        try:
+            await poller
+        except asyncio.CancelledError:
+            pass
+        finally:
+            reaper.cancel()
+            if matcher is not None:
+                matcher.cancel()
+            await loop.run_in_executor(None, self.broadcaster.stop)
+            await self.async_bot.update_order.drain()
+            self.albums.flush_all()
+            await self.bot.sends.drain()
+            self.broadcaster.checkpoint()
+            await self.async_bot.close_session()
 
 
 if __name__ == "__main__":
     token = os.getenv("TELEGRAM_BOT_TOKEN", "")
+    hash_key = os.getenv("USER_ID_HASH_KEY", "")
+    if hash_key:
+        configure_hashing(hash_key.encode())
+    redis_url = os.getenv("REDIS_URL", "")
+    metrics_port = os.getenv("METRICS_PORT", "")
+    metrics_file = os.getenv("METRICS_FILE", "")
+    options = {
+        "batch_interval": int(os.getenv("MATCH_BATCH_MS", "0")) / 1000,
+        "batch_size": int(os.getenv("MATCH_BATCH_SIZE", "0")),
+        "admin_ids": [int(i) for i in os.getenv("ADMIN_IDS", "").split(",") if i.strip()],
+        "admission": os.getenv("ADMISSION", "on") != "off",
+    }
+    match_seed = os.getenv("MATCH_SEED", "")
+    state_store = InMemoryStateStore(
+        random.Random(int(match_seed)) if match_seed else None,
+        columnar=os.getenv("MATCH_POOL", "buckets") == "columnar",
+    )
+    metrics = None
+    if metrics_port or metrics_file:
+        metrics = BotMetrics()
+        instrument_api(metrics)
+        if metrics_port:
+            metrics.registry.serve(os.getenv("METRICS_HOST", "127.0.0.1"), int(metrics_port))
+        if metrics_file:
+            metrics.registry.start_dump(metrics_file)
+    mode = os.getenv("BOT_MODE", "polling")
     if not token:
         print("Error: TELEGRAM_BOT_TOKEN is not set.")
     else:
-        bot = ChatBot(token)
-        bot.run()
+        if redis_url:
+            from src.services.state_store import RedisStateStore
+
+            state_store = RedisStateStore.from_url(redis_url)
+            if mode != "webhook":
+                print(
+                    "Keeping state in Redis; only one process may poll a token,"
+                    " use BOT_MODE=webhook to run several."
+                )
+        bot_class = AsyncChatBot if mode == "async" else ChatBot
+        bot = bot_class(token, state_store, metrics=metrics, **options)
+        if os.getenv("RECORD_UPDATES", ""):
+            bot.record_updates(os.getenv("RECORD_UPDATES"))
+        if mode == "webhook":
+            bot.run_webhook(
+                host=os.getenv("WEBHOOK_HOST", "127.0.0.1"),
+                port=int(os.getenv("WEBHOOK_PORT", "8443")),
+                secret_token=os.getenv("WEBHOOK_SECRET", ""),
+                url=os.getenv("WEBHOOK_URL", ""),
+            )
+        else:
+            bot.run()
@@ -0,0 +1,129 @@
+"""Cost of inbound admission control, and what it keeps away from the handlers.
+
+    python -m benchmarks.admission --keys 1000000 --pairs 1000 --spam 5000
+
+``cost`` runs ``AdmissionControl.admit`` once for each of ``--keys``
+distinct users, then again for a few hot users. It reports the time per
+update and how many bucket keys are held afterwards. ``spam`` sets up
+``--pairs`` chats against the fake Bot API with the production send
+limits. One user in each of the first ten chats sends ``--spam``
+stickers, and everyone else sends a text, a sticker and a die. The run
+is done with admission off and on. It reports how many updates reached
+the handlers, the outbound queue left behind, and the rejected updates
+by reason.
+"""
+import argparse
+import os
+import random
+import resource
+import tempfile
+import time
+from typing import Dict
+import telebot
+from anonbot import ChatBot
+from benchmarks.fake_api import FakeTelegramApi
+from benchmarks.workloads import CONTENT, Workload
+from src.services.admission import AdmissionControl
+from src.services.outbound import RateLimiter
+from src.services.state_store import InMemoryStateStore
+
+
+def cost(keys: int, seed: int):
+    workload = Workload(seed)
+    clock = [0.0]
+    admission = AdmissionControl(lambda: (0, 0.0), clock=lambda: clock[0])
+    update = workload.update(0, **CONTENT["sticker"])
+    user = update.message.from_user
+    started = time.perf_counter()
+    for user_id in range(1, keys + 1):
+        clock[0] = user_id * 1e-5
+        user.id = user_id
+        admission.admit(update)
+    elapsed = time.perf_counter() - started
+    print(
+        f"{keys} users once: {elapsed / keys * 1e6:.2f} us/update,"
+        f" {len(admission.users)} buckets held,"
+        f" peak RSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB"
+    )
+
+    hot = [workload.update(user_id, **CONTENT["text"]) for user_id in range(1, 101)]
+    started = time.perf_counter()
+    rounds = 1000
+    for i in range(rounds):
+        clock[0] = 100.0 + i
+        for update in hot:
+            admission.admit(update)
+    elapsed = time.perf_counter() - started
+    print(
+        f"100 users x {rounds}: {elapsed / (100 * rounds) * 1e6:.2f} us/update,"
+        f" {len(admission.users)} buckets held after idle users aged out"
+    )
+
+
+def spam(pairs: int, spam_count: int, admitted: bool, seed: int) -> Dict[str, float]:
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir, FakeTelegramApi():
+        os.chdir(workdir)
+        try:
+            bot = telebot.TeleBot("0:bench", threaded=False)
+            chat_bot = ChatBot(
+                bot.token, InMemoryStateStore(random.Random(seed)), bot=bot, admission=admitted
+            )
+            workload = Workload(seed)
+            user_ids = range(1, 2 * pairs + 1)
+            for update in workload.setup_funnel(user_ids):
+                bot.process_new_updates([update])
+            for update in workload.search_storm(user_ids):
+                bot.process_new_updates([update])
+            chatting = [u for u in user_ids if u in chat_bot.active_chats]
+            spammers = [u for u in chatting if u < chat_bot.active_chats[u]][:10]
+
+            updates = []
+            for i in range(spam_count):
+                updates.append(workload.update(spammers[i % len(spammers)], **CONTENT["sticker"]))
+            for kind in ("text", "sticker", "dice"):
+                updates.extend(workload.update(u, **CONTENT[kind]) for u in chatting)
+            random.Random(seed).shuffle(updates)
+
+            started = time.perf_counter()
+            for update in updates:
+                bot.process_new_updates([update])
+            elapsed = time.perf_counter() - started
+            queued = chat_bot.sender.pending
+
+            sender = chat_bot.sender
+            sender.chat_limit = sender.global_limit = RateLimiter(1e9)
+            sender.close()
+            chat_bot.settings_store.close()
+            rejected = chat_bot.admission.stats() if chat_bot.admission else {}
+        finally:
+            os.chdir(cwd)
+    return {
+        "updates": len(updates),
+        "handled": len(updates) - sum(rejected.values()),
+        "queued": queued,
+        "seconds": elapsed,
+        "rejected": rejected,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--keys", type=int, default=1_000_000)
+    parser.add_argument("--pairs", type=int, default=1_000)
+    parser.add_argument("--spam", type=int, default=5_000, help="stickers from the spammers")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    for admitted in (False, True):
+        r = spam(args.pairs, args.spam, admitted, args.seed)
+        print(
+            f"admission {'on ' if admitted else 'off'}: {r['updates']} updates,"
+            f" {r['handled']} handled, {r['queued']} outbound calls queued,"
+            f" {r['seconds']:.2f} s; rejected {r['rejected']}"
+        )
+    cost(args.keys, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Match quality and cost of matching on arrival against batch rounds.
+
+    python -m benchmarks.batch_matching --arrivals 100000 --batch 1000
+
+The same stream of searches (random room, 2:1 male/female, ages 18-70,
+one arrival per ``--gap`` seconds) goes through ``MatchQueue.match`` one
+user at a time and through ``MatchQueue.match_round`` every ``--batch``
+arrivals. Quality is reported with the batch ``score`` for both.
+"""
+import argparse
+import random
+import time
+from typing import Dict, List, Tuple
+from src.services.match_queue import MatchQueue
+
+
+ROOMS = ["general", "movies", "books", "gaming", "music", "photography", "cooking", "politics"]
+
+
+def arrivals(count: int, seed: int) -> List[Tuple[int, str, str, int]]:
+    rng = random.Random(seed)
+    return [
+        (user_id, rng.choice(ROOMS), rng.choice("MMW"), rng.randint(18, 70))
+        for user_id in range(count)
+    ]
+
+
+def summarize(
+    name: str,
+    queue: MatchQueue,
+    pairs: List[Tuple[int, int]],
+    users: Dict[int, Tuple[str, str, int]],
+    since: Dict[int, float],
+    matched_at: Dict[int, float],
+    elapsed: float,
+    rounds: List[float],
+):
+    scores = [
+        queue.score(users[a], users[b], matched_at[a] - since[a] + matched_at[b] - since[b])
+        for a, b in pairs
+    ]
+    opposite = sum(users[a][1] != users[b][1] for a, b in pairs)
+    gap = sum(abs(users[a][2] - users[b][2]) for a, b in pairs)
+    waited = sum(matched_at[u] - since[u] for pair in pairs for u in pair)
+    count = len(pairs) or 1
+    rounds.sort()
+    print(
+        f"{name:>8} {len(pairs):>8} {opposite / count:>9.2f} {gap / count:>8.2f}"
+        f" {waited / (2 * count):>8.1f} {sum(scores) / count:>7.3f} {len(queue):>7}"
+        f" {elapsed * 1000:>9.0f}"
+        f" {rounds[len(rounds) // 2] * 1000 if rounds else 0.0:>9.2f}"
+        f" {rounds[-1] * 1000 if rounds else 0.0:>9.2f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--arrivals", type=int, default=100_000)
+    parser.add_argument("--batch", type=int, default=1_000, help="arrivals per batch round")
+    parser.add_argument("--gap", type=float, default=0.01, help="seconds between arrivals")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    stream = arrivals(args.arrivals, args.seed)
+    users = {user_id: (room, gender, age) for user_id, room, gender, age in stream}
+    print(
+        f"{'mode':>8} {'pairs':>8} {'opposite':>9} {'age gap':>8} {'wait s':>8}"
+        f" {'score':>7} {'left':>7} {'total ms':>9} {'p50 ms':>9} {'max ms':>9}"
+    )
+
+    clock = [0.0]
+    queue = MatchQueue(random.Random(args.seed), clock=lambda: clock[0])
+    since: Dict[int, float] = {}
+    matched_at: Dict[int, float] = {}
+    pairs = []
+    rounds = []
+    started = time.perf_counter()
+    for i, (user_id, room, gender, age) in enumerate(stream):
+        clock[0] = since[user_id] = i * args.gap
+        call = time.perf_counter()
+        partner_id = queue.match(user_id, room, gender, age)
+        rounds.append(time.perf_counter() - call)
+        if partner_id is not None:
+            pairs.append((user_id, partner_id))
+            matched_at[user_id] = matched_at[partner_id] = clock[0]
+    summarize("arrival", queue, pairs, users, since, matched_at, time.perf_counter() - started, rounds)
+
+    clock[0] = 0.0
+    queue = MatchQueue(random.Random(args.seed), clock=lambda: clock[0])
+    matched_at = {}
+    pairs = []
+    rounds = []
+    started = time.perf_counter()
+    for i, (user_id, room, gender, age) in enumerate(stream):
+        clock[0] = i * args.gap
+        queue.add(user_id, room, gender, age)
+        if (i + 1) % args.batch == 0 or i + 1 == len(stream):
+            call = time.perf_counter()
+            formed = queue.match_round()
+            rounds.append(time.perf_counter() - call)
+            pairs.extend(formed)
+            for pair in formed:
+                for member in pair:
+                    matched_at[member] = clock[0]
+    summarize("batch", queue, pairs, users, since, matched_at, time.perf_counter() - started, rounds)
+
+
+if __name__ == "__main__":
+    main()
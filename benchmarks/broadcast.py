@@ -0,0 +1,148 @@
+"""Live chat latency while a broadcast fans out through the outbound queue.
+
+    python -m benchmarks.broadcast --recipients 20000 --seconds 10
+
+Live sends (one chat message per ``1 / --live-rate`` seconds over 500
+chats) go through ``OutboundScheduler`` against the fake Bot API with
+``--latency`` per call and a ``--global-rate`` limit. They run alone, next
+to ``Broadcaster`` (background priority, its own ``--broadcast-rate``,
+bounded window), and next to a naive loop that queues every recipient at
+once. Reported: live submit-to-done latency, the share of live sends done
+within 5 s of the end, and broadcast messages delivered per second.
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional
+import telebot
+from benchmarks.fake_api import FakeTelegramApi
+from src.services.broadcast import Broadcaster, RecipientLog
+from src.services.outbound import (
+    PRIORITY_BACKGROUND,
+    PRIORITY_NORMAL,
+    OutboundScheduler,
+    RateLimiter,
+)
+
+
+LIVE_CHATS = 500
+
+
+def run(
+    mode: str,
+    recipients: RecipientLog,
+    args: argparse.Namespace,
+) -> Dict[str, float]:
+    bot = telebot.TeleBot("0:bench", threaded=False)
+    sender = OutboundScheduler(
+        per_chat_rate=1.0, global_rate=args.global_rate, global_burst=30, workers=args.workers
+    )
+    delivered = [0]
+    stopped = threading.Event()
+
+    def send(user_id: int, text: str, priority: int = PRIORITY_BACKGROUND):
+        future = sender.submit(
+            user_id,
+            lambda: None if stopped.is_set() else bot.send_message(user_id, text),
+            priority,
+        )
+        future.add_done_callback(lambda done: delivered.__setitem__(0, delivered[0] + 1))
+        return future
+
+    broadcaster: Optional[Broadcaster] = None
+    if mode == "broadcaster":
+        broadcaster = Broadcaster(
+            recipients, send, "broadcast.json", rate=args.broadcast_rate, report_interval=1e9
+        )
+        broadcaster.start("Maintenance tonight")
+    elif mode == "naive":
+        for _, user_id in recipients.records():
+            send(user_id, "Maintenance tonight", PRIORITY_NORMAL)
+
+    latencies: List[float] = []
+    lock = threading.Lock()
+
+    def observe(started: float):
+        with lock:
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    sends = int(args.seconds * args.live_rate)
+    for i in range(sends):
+        target = started + i / args.live_rate
+        time.sleep(max(0.0, target - time.perf_counter()))
+        chat_id = -1 - i % LIVE_CHATS
+        call = time.perf_counter()
+        sender.submit(
+            chat_id, lambda chat_id=chat_id: bot.send_message(chat_id, "hi")
+        ).add_done_callback(lambda done, call=call: observe(call))
+    elapsed = time.perf_counter() - started
+    broadcast_rate = delivered[0] / elapsed
+
+    if broadcaster is not None:
+        broadcaster.stop()
+    deadline = time.perf_counter() + 5
+    while len(latencies) < sends and time.perf_counter() < deadline:
+        time.sleep(0.01)
+    pending = sender.pending
+    stopped.set()
+    sender.chat_limit = sender.global_limit = RateLimiter(1e9)
+    sender.close()
+
+    latencies.sort()
+    count = len(latencies) or 1
+    return {
+        "live_p50_ms": latencies[count // 2] * 1000 if latencies else 0.0,
+        "live_p99_ms": latencies[min(len(latencies) - 1, int(0.99 * count))] * 1000 if latencies else 0.0,
+        "live_max_ms": latencies[-1] * 1000 if latencies else 0.0,
+        "live_done": len(latencies) / sends,
+        "broadcast_per_s": broadcast_rate,
+        "queued_at_end": pending,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--recipients", type=int, default=20_000)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--live-rate", type=float, default=50.0, help="live sends per second")
+    parser.add_argument("--broadcast-rate", type=float, default=200.0)
+    parser.add_argument("--global-rate", type=float, default=300.0)
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds per fake API call")
+    parser.add_argument("--workers", type=int, default=16)
+    args = parser.parse_args()
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir, FakeTelegramApi(latency=args.latency):
+        os.chdir(workdir)
+        try:
+            started = time.perf_counter()
+            recipients = RecipientLog("recipients.log")
+            for user_id in range(1, args.recipients + 1):
+                recipients.add(user_id)
+            recipients.close()
+            recipients = RecipientLog("recipients.log")
+            print(
+                f"{args.recipients} recipients listed and reopened in"
+                f" {time.perf_counter() - started:.2f} s"
+            )
+            print(
+                f"{'mode':>12} {'live p50':>9} {'live p99':>9} {'live max':>9}"
+                f" {'live done':>10} {'bcast/s':>8} {'queued':>8}"
+            )
+            for mode in ("alone", "broadcaster", "naive"):
+                r = run(mode, recipients, args)
+                print(
+                    f"{mode:>12} {r['live_p50_ms']:>9.1f} {r['live_p99_ms']:>9.1f}"
+                    f" {r['live_max_ms']:>9.1f} {r['live_done']:>10.2f}"
+                    f" {r['broadcast_per_s']:>8.1f} {r['queued_at_end']:>8}"
+                )
+            recipients.close()
+        finally:
+            os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    main()
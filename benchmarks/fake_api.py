@@ -0,0 +1,118 @@
+"""In-process stand-in for api.telegram.org.
+
+``FakeTelegramApi`` plugs into ``telebot.apihelper.CUSTOM_REQUEST_SENDER``,
+so a real ``TeleBot`` serializes every call as usual and gets back a
+plausible JSON result without touching the network. Calls are counted per
+method, and latency and 429 responses can be simulated, as can users who
+blocked the bot (403 for every ``blocked_every``-th chat id). With
+``keep_requests`` every call's method and parameters are kept in order.
+"""
+import json
+import threading
+import time
+from collections import Counter
+from itertools import count
+from typing import List, Optional, Tuple
+from telebot import apihelper
+
+
+class _Response:
+    def __init__(self, status_code: int, payload: dict):
+        self.status_code = status_code
+        self.reason = "OK" if status_code == 200 else "Too Many Requests"
+        self.text = json.dumps(payload)
+        self._payload = payload
+
+    def json(self) -> dict:
+        return self._payload
+
+
+class FakeTelegramApi:
+    def __init__(
+        self,
+        latency: float = 0.0,
+        throttle_every: int = 0,
+        retry_after: float = 1.0,
+        keep_requests: bool = False,
+        blocked_every: int = 0,
+    ):
+        self.latency = latency
+        self.throttle_every = throttle_every
+        self.retry_after = retry_after
+        self.calls: Counter = Counter()
+        self.throttled = 0
+        self.keep_requests = keep_requests
+        self.blocked_every = blocked_every
+        self.requests: List[Tuple[str, dict]] = []
+        self._message_ids = count(1)
+        self._requests = count(1)
+        self._lock = threading.Lock()
+        self._previous = None
+
+    @property
+    def total_calls(self) -> int:
+        return sum(self.calls.values())
+
+    def install(self) -> "FakeTelegramApi":
+        self._previous = apihelper.CUSTOM_REQUEST_SENDER
+        apihelper.CUSTOM_REQUEST_SENDER = self
+        return self
+
+    def uninstall(self):
+        apihelper.CUSTOM_REQUEST_SENDER = self._previous
+
+    def __enter__(self) -> "FakeTelegramApi":
+        return self.install()
+
+    def __exit__(self, *exc):
+        self.uninstall()
+
+    def __call__(self, method: str, url: str, params: Optional[dict] = None, **kwargs):
+        name = url.rsplit("/", 1)[-1]
+        params = params or {}
+        with self._lock:
+            self.calls[name] += 1
+            request = next(self._requests)
+            if self.keep_requests:
+                self.requests.append((name, dict(params)))
+        if self.latency:
+            time.sleep(self.latency)
+        if self.throttle_every and request % self.throttle_every == 0:
+            with self._lock:
+                self.throttled += 1
+            return _Response(
+                429,
+                {
+                    "ok": False,
+                    "error_code": 429,
+                    "description": f"Too Many Requests: retry after {self.retry_after}",
+                    "parameters": {"retry_after": self.retry_after},
+                },
+            )
+        if self.blocked_every and int(params.get("chat_id", 0)) % self.blocked_every == 0:
+            return _Response(
+                403,
+                {
+                    "ok": False,
+                    "error_code": 403,
+                    "description": "Forbidden: bot was blocked by the user",
+                },
+            )
+        return _Response(200, {"ok": True, "result": self._result(name, params)})
+
+    def _message(self, chat_id) -> dict:
+        return {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": int(chat_id), "type": "private"},
+        }
+
+    def _result(self, name: str, params: dict):
+        chat_id = params.get("chat_id", 0)
+        if name == "copyMessage":
+            return {"message_id": next(self._message_ids)}
+        if name == "sendMediaGroup":
+            return [self._message(chat_id) for _ in json.loads(params["media"])]
+        if name.startswith("send") or name.startswith("edit"):
+            return self._message(chat_id)
+        return True
@@ -0,0 +1,225 @@
+"""Offline load test of ChatBot against a fake Telegram Bot API.
+
+    python -m benchmarks.load_test --users 10000
+    python -m benchmarks.load_test --users 100000 --latency 0.02 --throttle-every 500
+    python -m benchmarks.load_test --save-baseline benchmarks/baseline.json
+    python -m benchmarks.load_test --compare benchmarks/baseline.json
+
+One bot goes through four phases in order: the /start setup funnel, a
+/search storm, a message flood over every supported content type between
+the matched pairs, and a mass /end. Updates are handled inline, one at a
+time, so handler latency is measured exactly. Handler replies bypass the
+outbound scheduler, so a simulated 429 on one of them fails the update and
+is counted under ``errors``. A phase's time also includes draining the
+outbound queue and, for setup, flushing the settings log.
+``--compare`` exits with status 1 when a metric is more than ``--tolerance``
+worse than the baseline.
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, Iterable, Optional
+import telebot
+from anonbot import ChatBot
+from benchmarks.fake_api import FakeTelegramApi
+from benchmarks.workloads import Workload
+from src.services.outbound import OutboundScheduler
+from src.services.state_store import InMemoryStateStore
+from src.utils.metrics import BotMetrics, instrument_api
+
+
+HIGHER_IS_BETTER = {"updates_per_s"}
+COMPARED = ("updates_per_s", "p50_ms", "p99_ms", "api_calls_per_update", "peak_rss_mb")
+
+
+def peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_phase(
+    chat_bot: ChatBot,
+    api: FakeTelegramApi,
+    updates: Iterable[telebot.types.Update],
+    finish: Optional[Callable[[], None]] = None,
+) -> Dict[str, float]:
+    latencies = []
+    errors = 0
+    calls = api.total_calls
+    for update in updates:
+        started = time.perf_counter()
+        try:
+            chat_bot.bot.process_new_updates([update])
+        except telebot.apihelper.ApiTelegramException:
+            errors += 1
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    chat_bot.sender.close()
+    if finish is not None:
+        finish()
+    elapsed = sum(latencies) + time.perf_counter() - started
+
+    latencies.sort()
+    count = len(latencies)
+
+    def percentile(p: float) -> float:
+        if not latencies:
+            return 0.0
+        return latencies[min(count - 1, int(p * count))] * 1000
+
+    return {
+        "updates": count,
+        "errors": errors,
+        "updates_per_s": count / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(0.50),
+        "p99_ms": percentile(0.99),
+        "api_calls_per_update": (api.total_calls - calls) / count if count else 0.0,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def run(
+    users: int,
+    messages_per_user: int = 10,
+    seed: int = 0,
+    latency: float = 0.0,
+    throttle_every: int = 0,
+    real_limits: bool = False,
+    metrics: Optional[BotMetrics] = None,
+    pool: str = "buckets",
+) -> Dict[str, Dict[str, float]]:
+    workload = Workload(seed)
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir, FakeTelegramApi(
+        latency, throttle_every, retry_after=0
+    ) as api:
+        os.chdir(workdir)
+        try:
+            bot = telebot.TeleBot("0:bench", threaded=False)
+            state_store = InMemoryStateStore(random.Random(seed), columnar=pool == "columnar")
+            chat_bot = ChatBot(bot.token, state_store, bot=bot, metrics=metrics)
+            if not real_limits:
+                chat_bot.sender = OutboundScheduler(
+                    per_chat_rate=1e9, global_rate=1e9, workers=16
+                )
+            user_ids = range(1, users + 1)
+
+            results = {}
+            results["setup"] = run_phase(
+                chat_bot,
+                api,
+                workload.setup_funnel(user_ids),
+                chat_bot.settings_store.flush,
+            )
+            results["search"] = run_phase(chat_bot, api, workload.search_storm(user_ids))
+            chatting = [u for u in user_ids if u in chat_bot.active_chats]
+            results["flood"] = run_phase(
+                chat_bot, api, workload.message_flood(chatting, messages_per_user)
+            )
+            ending = [u for u, p in list(chat_bot.active_chats.items()) if u < p]
+            results["end"] = run_phase(chat_bot, api, workload.mass_end(ending))
+            chat_bot.settings_store.close()
+        finally:
+            os.chdir(cwd)
+    return results
+
+
+def print_results(results: Dict[str, Dict[str, float]]):
+    print(
+        f"{'phase':>8} {'updates':>9} {'upd/s':>10} {'p50 ms':>8} {'p99 ms':>8}"
+        f" {'calls/upd':>10} {'rss MB':>8} {'errors':>7}"
+    )
+    for phase, r in results.items():
+        print(
+            f"{phase:>8} {r['updates']:>9} {r['updates_per_s']:>10.0f}"
+            f" {r['p50_ms']:>8.3f} {r['p99_ms']:>8.3f}"
+            f" {r['api_calls_per_update']:>10.2f} {r['peak_rss_mb']:>8.1f} {r['errors']:>7}"
+        )
+
+
+def compare(
+    results: Dict[str, Dict[str, float]],
+    baseline: Dict[str, Dict[str, float]],
+    tolerance: float,
+) -> int:
+    regressions = 0
+    for phase, r in results.items():
+        base = baseline.get(phase)
+        if base is None:
+            continue
+        for metric in COMPARED:
+            if not base.get(metric):
+                continue
+            change = (r[metric] - base[metric]) / base[metric]
+            worse = -change if metric in HIGHER_IS_BETTER else change
+            flag = ""
+            if worse > tolerance:
+                flag = "  REGRESSION"
+                regressions += 1
+            print(f"{phase:>8} {metric:>22} {base[metric]:>12.3f} -> {r[metric]:>12.3f} ({change:+.1%}){flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--messages-per-user", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per API call")
+    parser.add_argument("--throttle-every", type=int, default=0, help="answer every Nth call with 429")
+    parser.add_argument("--real-limits", action="store_true", help="keep the production send rate limits")
+    parser.add_argument("--pool", choices=["buckets", "columnar"], default="buckets", help="waiting pool implementation")
+    parser.add_argument("--metrics", action="store_true", help="record metrics and print them afterwards")
+    parser.add_argument("--save-baseline", metavar="PATH")
+    parser.add_argument("--compare", metavar="PATH")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    config = {
+        "users": args.users,
+        "messages_per_user": args.messages_per_user,
+        "seed": args.seed,
+        "latency": args.latency,
+        "throttle_every": args.throttle_every,
+        "real_limits": args.real_limits,
+        "pool": args.pool,
+    }
+    metrics = None
+    if args.metrics:
+        metrics = BotMetrics()
+        instrument_api(metrics)
+    results = run(
+        args.users,
+        args.messages_per_user,
+        args.seed,
+        args.latency,
+        args.throttle_every,
+        args.real_limits,
+        metrics,
+        args.pool,
+    )
+    print_results(results)
+    if metrics is not None:
+        print(metrics.registry.render(), end="")
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump({"config": config, "phases": results}, f, indent=2)
+            f.write("\n")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline.get("config") != config:
+            print(f"Warning: baseline was recorded with {baseline.get('config')}")
+        if compare(results, baseline["phases"], args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Cost of finding a partner in the bucketed and the columnar waiting pool.
+
+    python -m benchmarks.match_pool --pools 1000 10000 100000
+
+``scan`` is the original rule: walk the pool oldest first and test every
+waiter in pure Python. Half of the probes are for a room nobody waits in,
+which is the usual case for someone who ends up waiting, and makes ``scan``
+walk the whole pool. ``buckets`` is ``MatchQueue``; ``columnar`` is
+``ColumnarMatchQueue`` (needs numpy). Before timing, both queues replay the
+same seeded add/remove/match stream and must pick identical partners.
+"""
+import argparse
+import random
+import time
+from typing import Dict, List, Tuple
+from src.services.columnar_pool import ColumnarMatchQueue
+from src.services.match_queue import MatchQueue
+
+
+ROOMS = ["general", "movies", "books", "gaming", "music", "photography", "cooking", "politics"]
+
+
+def check_equivalence(steps: int, seed: int):
+    rng = random.Random(seed)
+    buckets = MatchQueue(random.Random(seed))
+    columnar = ColumnarMatchQueue(random.Random(seed))
+    for step in range(steps):
+        user_id = rng.randrange(steps // 4 + 2)
+        roll = rng.random()
+        args = (user_id, rng.choice(ROOMS), rng.choice("MW"), rng.randint(18, 70))
+        if roll < 0.2:
+            same = buckets.remove(user_id) == columnar.remove(user_id)
+        elif roll < 0.4:
+            buckets.add(*args)
+            columnar.add(*args)
+            same = True
+        else:
+            same = buckets.match(*args) == columnar.match(*args)
+        if not same:
+            raise SystemExit(f"Columnar pool diverged from MatchQueue at step {step}")
+
+
+def scan(
+    pool: List[int], profiles: Dict[int, Tuple[str, str, int]], rng: random.Random, probe
+) -> int:
+    room, gender, age = probe
+    for user_id in pool:
+        other_room, other_gender, other_age = profiles[user_id]
+        if other_room != room or abs(other_age - age) > MatchQueue.AGE_WINDOW:
+            continue
+        if other_gender != gender or rng.random() < MatchQueue.SAME_GENDER_CHANCE:
+            return user_id
+    return -1
+
+
+def run(size: int, probes: int, seed: int) -> Dict[str, float]:
+    rng = random.Random(seed)
+    profiles = {
+        user_id: (rng.choice(ROOMS), "M", rng.randint(18, 90)) for user_id in range(size)
+    }
+    queries = [
+        (rng.choice(ROOMS) if i % 2 else "empty", rng.choice("MW"), rng.randint(18, 90))
+        for i in range(probes)
+    ]
+
+    results = {}
+    pool = list(profiles)
+    scan_rng = random.Random(seed)
+    started = time.perf_counter()
+    for probe in queries:
+        scan(pool, profiles, scan_rng, probe)
+    results["scan"] = (time.perf_counter() - started) / probes * 1e6
+
+    for name, cls in (("buckets", MatchQueue), ("columnar", ColumnarMatchQueue)):
+        queue = cls(random.Random(seed))
+        for user_id, profile in profiles.items():
+            queue.add(user_id, *profile)
+        started = time.perf_counter()
+        for probe in queries:
+            queue.find_partner(*probe)
+        results[name] = (time.perf_counter() - started) / probes * 1e6
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pools", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--probes", type=int, default=2_000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    check_equivalence(20_000, args.seed)
+    print(f"{'pool':>8} {'scan us':>10} {'buckets us':>11} {'columnar us':>12}")
+    for size in args.pools:
+        r = run(size, args.probes, args.seed)
+        print(f"{size:>8} {r['scan']:>10.1f} {r['buckets']:>11.1f} {r['columnar']:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Matches per second as workers sharing one Redis matchmaking pool are added.
+
+    python -m benchmarks.matching_workers --redis-url redis://localhost:6379/0
+    python -m benchmarks.matching_workers --fake
+
+``--fake`` runs the workers as threads against one in-process fakeredis
+server; it checks the scripts offline but cannot show multi-core scaling.
+"""
+import argparse
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Tuple
+
+
+ROOMS = ["general", "movies", "books", "gaming", "music", "photography", "cooking", "politics"]
+
+
+def _search_storm(store, worker: int, searches: int) -> Tuple[int, float, float]:
+    rng = random.Random(worker)
+    began = time.time()
+    matches = 0
+    for i in range(searches):
+        user_id = worker * 10_000_000 + i
+        partner = store.waiting_users.match(
+            user_id, rng.choice(ROOMS), rng.choice("MW"), rng.randint(18, 60)
+        )
+        if partner is not None:
+            matches += 1
+    return matches, began, time.time()
+
+
+def _redis_worker(url: str, prefix: str, worker: int, searches: int):
+    from src.services.state_store import RedisStateStore
+
+    return _search_storm(RedisStateStore.from_url(url, prefix), worker, searches)
+
+
+def run(workers: int, searches: int, url: str = "", fake_server=None) -> float:
+    prefix = f"bench:{workers}:{time.time_ns()}:"
+    if fake_server is not None:
+        import fakeredis
+        from src.services.state_store import RedisStateStore
+
+        pool = ThreadPoolExecutor(workers)
+        jobs = [
+            pool.submit(
+                _search_storm,
+                RedisStateStore(fakeredis.FakeRedis(server=fake_server), prefix),
+                worker,
+                searches,
+            )
+            for worker in range(workers)
+        ]
+    else:
+        pool = ProcessPoolExecutor(workers)
+        jobs = [
+            pool.submit(_redis_worker, url, prefix, worker, searches)
+            for worker in range(workers)
+        ]
+    with pool:
+        outcomes = [job.result() for job in jobs]
+    matches = sum(m for m, _, _ in outcomes)
+    elapsed = max(end for _, _, end in outcomes) - min(start for _, start, _ in outcomes)
+    return matches / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--redis-url", default="redis://localhost:6379/0")
+    parser.add_argument("--fake", action="store_true", help="use in-process fakeredis")
+    parser.add_argument("--workers", default="1,2,4,8")
+    parser.add_argument("--searches", type=int, default=5000)
+    args = parser.parse_args()
+
+    fake_server = None
+    if args.fake:
+        import fakeredis
+
+        fake_server = fakeredis.FakeServer()
+
+    print(f"{'workers':>8} {'matches/s':>12}")
+    for workers in map(int, args.workers.split(",")):
+        rate = run(workers, args.searches, args.redis_url, fake_server)
+        print(f"{workers:>8} {rate:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""Cost of checking forwarded text against thousands of banned phrases.
+
+    python -m benchmarks.moderation --phrases 10000 --messages 20000
+
+Phrases are one to three made-up words, a third of them in Cyrillic.
+Messages are 5-40 words from a separate vocabulary, with one in a hundred
+containing a banned phrase in full-width or mixed case. For each phrase
+count the naive scan (normalize, then ``any(phrase in text)``) is timed
+against ``PhraseMatcher.search``, together with the automaton build time
+and size. Then ``Moderator.check`` runs while another thread rewrites
+and reloads a ``--phrases`` rule file, and the slowest check is reported.
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from typing import List
+from src.services.moderation import Moderator, PhraseMatcher, normalize
+
+
+LATIN = "abcdefghijklmnopqrstuvwxyz"
+CYRILLIC = "абвгдежзиклмнопрстуфхцчшыэюя"
+
+
+def vocabulary(size: int, rng: random.Random) -> List[str]:
+    words = []
+    for i in range(size):
+        letters = CYRILLIC if i % 3 == 0 else LATIN
+        words.append("".join(rng.choice(letters) for _ in range(rng.randint(3, 9))))
+    return words
+
+
+def disguise(phrase: str, rng: random.Random) -> str:
+    """Upper case or full-width letters, which ``normalize`` folds back."""
+    if rng.random() < 0.5:
+        return phrase.upper()
+    return "".join(chr(ord(c) + 0xFEE0) if "a" <= c <= "z" else c for c in phrase)
+
+
+def per_message_us(check, messages: List[str]) -> float:
+    started = time.perf_counter()
+    for text in messages:
+        check(text)
+    return (time.perf_counter() - started) / len(messages) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--phrases", type=int, default=10_000)
+    parser.add_argument("--messages", type=int, default=20_000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    words = vocabulary(50_000, rng)
+    banned = vocabulary(20_000, rng)
+    phrases = [" ".join(rng.sample(banned, rng.randint(1, 3))) for _ in range(args.phrases)]
+    messages = []
+    for i in range(args.messages):
+        text = rng.sample(words, rng.randint(5, 40))
+        if i % 100 == 0:
+            text.insert(rng.randrange(len(text) + 1), disguise(rng.choice(phrases), rng))
+        messages.append(" ".join(text))
+
+    print(
+        f"{'phrases':>8} {'build ms':>9} {'states':>8} {'naive us':>9}"
+        f" {'automaton us':>13} {'hits':>6}"
+    )
+    count = 100
+    while True:
+        subset = phrases[:count]
+        started = time.perf_counter()
+        matcher = PhraseMatcher(subset)
+        build = time.perf_counter() - started
+        normalized = [normalize(p) for p in subset]
+        naive = per_message_us(
+            lambda text: any(p in text for p in normalized), [normalize(m) for m in messages[:2000]]
+        )
+        hits = sum(matcher.search(normalize(text)) is not None for text in messages)
+        automaton = per_message_us(lambda text: matcher.search(normalize(text)), messages)
+        print(
+            f"{count:>8} {build * 1000:>9.1f} {len(matcher._goto):>8} {naive:>9.1f}"
+            f" {automaton:>13.1f} {hits:>6}"
+        )
+        if count >= args.phrases:
+            break
+        count = min(count * 10, args.phrases)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, "moderation.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"all": {"phrases": phrases}}, f)
+        moderator = Moderator(path, ["general"])
+        moderator.load()
+        stop = threading.Event()
+        reloads = [0]
+
+        def reload_forever():
+            mtime = time.time()
+            while not stop.is_set():
+                mtime += 1
+                os.utime(path, (mtime, mtime))
+                moderator.load()
+                reloads[0] += 1
+
+        reloader = threading.Thread(target=reload_forever)
+        reloader.start()
+        slowest = 0.0
+        started = time.perf_counter()
+        for text in messages:
+            call = time.perf_counter()
+            moderator.check(text, "general")
+            slowest = max(slowest, time.perf_counter() - call)
+        elapsed = time.perf_counter() - started
+        stop.set()
+        reloader.join()
+    print(
+        f"during {reloads[0]} reloads: {elapsed / len(messages) * 1e6:.1f} us/check,"
+        f" slowest check {slowest * 1000:.2f} ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""Startup time and memory of eager JSON profiles against the mapped record file.
+
+    python -m benchmarks.profile_startup --profiles 1000000 --active 10000
+
+Writes ``--profiles`` random profiles as the legacy JSON object, converts
+it to a record file, then loads each form in a fresh interpreter: ``json``
+parses the file into a ``ProfileTable`` the way the bot used to, ``mapped``
+opens a ``MappedProfileTable``. Both then read ``--active`` random
+profiles. RSS is the peak of each child process.
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+
+ROOMS = ["general", "movies", "books", "gaming", "music", "photography", "cooking", "politics"]
+
+
+def generate(path: str, profiles: int, seed: int):
+    rng = random.Random(seed)
+    with open(path, "w") as f:
+        json.dump(
+            {
+                hashlib.sha256(str(i).encode()).hexdigest(): {
+                    "age": rng.randint(18, 99),
+                    "gender": rng.choice("MW"),
+                    "room": rng.choice(ROOMS),
+                }
+                for i in range(profiles)
+            },
+            f,
+        )
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss survives exec on Linux, so a child would report the parent's peak.
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def load(variant: str, path: str, profiles: int, active: int, seed: int):
+    from src.models.profile_file import MappedProfileTable
+    from src.models.profile_table import ProfileTable
+    from src.models.user import UserSettings
+
+    started = time.perf_counter()
+    if variant == "json":
+        table = ProfileTable(ROOMS)
+        with open(path) as f:
+            for hashed_id, settings in json.load(f).items():
+                table[hashed_id] = UserSettings(**settings)
+    else:
+        table = MappedProfileTable(path, ROOMS)
+    startup = time.perf_counter() - started
+
+    rng = random.Random(seed)
+    ids = [hashlib.sha256(str(rng.randrange(profiles)).encode()).hexdigest() for _ in range(active)]
+    started = time.perf_counter()
+    for hashed_id in ids:
+        table[hashed_id].age
+    lookups = time.perf_counter() - started
+    print(
+        json.dumps(
+            {
+                "startup_s": startup,
+                "lookup_us": lookups / active * 1e6 if active else 0.0,
+                "peak_rss_mb": peak_rss_mb(),
+            }
+        )
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--profiles", type=int, default=1_000_000)
+    parser.add_argument("--active", type=int, default=10_000, help="profiles read after startup")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--variant", choices=["json", "mapped"], help=argparse.SUPPRESS)
+    parser.add_argument("--path", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.variant:
+        load(args.variant, args.path, args.profiles, args.active, args.seed)
+        return
+
+    from src.models.profile_file import convert
+
+    with tempfile.TemporaryDirectory() as workdir:
+        json_path = os.path.join(workdir, "user_settings.json")
+        profiles_path = os.path.join(workdir, "user_settings.profiles")
+        generate(json_path, args.profiles, args.seed)
+        started = time.perf_counter()
+        convert(json_path, profiles_path)
+        converted = time.perf_counter() - started
+        print(f"converted {args.profiles} profiles in {converted:.1f} s")
+        print(f"json {os.path.getsize(json_path) / 2**20:.1f} MB, records {os.path.getsize(profiles_path) / 2**20:.1f} MB")
+
+        print(f"{'variant':>8} {'startup s':>10} {'lookup us':>10} {'rss MB':>8}")
+        for variant, path in (("json", json_path), ("mapped", profiles_path)):
+            output = subprocess.run(
+                [
+                    sys.executable, "-m", "benchmarks.profile_startup",
+                    "--variant", variant, "--path", path,
+                    "--profiles", str(args.profiles),
+                    "--active", str(args.active),
+                    "--seed", str(args.seed),
+                ],
+                check=True,
+                capture_output=True,
+                text=True,
+            ).stdout
+            r = json.loads(output)
+            print(f"{variant:>8} {r['startup_s']:>10.3f} {r['lookup_us']:>10.2f} {r['peak_rss_mb']:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
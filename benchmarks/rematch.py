@@ -0,0 +1,120 @@
+"""Matched share and wait times with and without relaxing long waits.
+
+    python -m benchmarks.rematch --arrivals 20000 --gap 2
+
+A quiet bot: one search every ``--gap`` seconds, half of them in general
+and the rest spread over the other rooms, 2:1 male/female, ages 18-70.
+Every mode matches on arrival and drops waiters after ``--ttl`` seconds.
+``relaxed`` also runs ``MatchQueue.rematch`` every ``--interval``
+seconds, and ``fallback`` additionally lets everyone who has waited
+``--offer-after`` seconds outside general be matched from there, as if
+they all accepted the offer. Reported: share matched before the TTL,
+mean and p90 wait, mean age gap and opposite-gender share of the pairs,
+and how far the per-room ``WaitEstimates`` were from the waits seen.
+"""
+import argparse
+import random
+from typing import Dict, List, Tuple
+from src.services.match_queue import MatchQueue
+from src.services.wait_estimates import WaitEstimates
+
+
+ROOMS = ["general", "movies", "books", "gaming", "music", "photography", "cooking", "politics"]
+WEIGHTS = [7, 1, 1, 1, 1, 1, 1, 1]
+
+
+def arrivals(count: int, seed: int) -> List[Tuple[int, str, str, int]]:
+    rng = random.Random(seed)
+    return [
+        (user_id, rng.choices(ROOMS, WEIGHTS)[0], rng.choice("MMW"), rng.randint(18, 70))
+        for user_id in range(count)
+    ]
+
+
+def run(mode: str, users: List[Tuple[int, str, str, int]], args: argparse.Namespace) -> Dict:
+    clock = [0.0]
+    queue = MatchQueue(random.Random(args.seed), clock=lambda: clock[0])
+    estimates = WaitEstimates()
+    profiles = {user_id: (room, gender, age) for user_id, room, gender, age in users}
+    since: Dict[int, float] = {}
+    waits: List[float] = []
+    pairs: List[Tuple[int, int]] = []
+    errors: List[float] = []
+    next_rematch = args.interval
+
+    def matched(user_id: int, partner_id: int):
+        pairs.append((user_id, partner_id))
+        for uid in (user_id, partner_id):
+            room = profiles[uid][0]
+            waited = clock[0] - since.pop(uid)
+            estimate = estimates.estimate(room)
+            if estimate is not None:
+                errors.append(abs(estimate - waited))
+            estimates.observe(room, waited)
+            waits.append(waited)
+
+    def expire():
+        while since:
+            user_id, queued = next(iter(since.items()))
+            if clock[0] - queued < args.ttl:
+                break
+            del since[user_id]
+            queue.remove(user_id)
+            estimates.observe(profiles[user_id][0], args.ttl)
+
+    for user_id, room, gender, age in users:
+        clock[0] = user_id * args.gap
+        while mode != "strict" and next_rematch <= clock[0]:
+            now, clock[0] = clock[0], next_rematch
+            expire()
+            if mode == "fallback":
+                for uid, waiting_room, _ in queue.long_waiters(args.offer_after):
+                    if waiting_room != "general":
+                        queue.allow_fallback(uid)
+            for pair in queue.rematch(fallback_room="general"):
+                matched(*pair)
+            clock[0] = now
+            next_rematch += args.interval
+        expire()
+        since[user_id] = clock[0]
+        partner_id = queue.match(user_id, room, gender, age)
+        if partner_id is not None:
+            matched(user_id, partner_id)
+
+    waits.sort()
+    count = len(pairs) or 1
+    return {
+        "matched": len(waits) / len(users),
+        "mean_wait": sum(waits) / (len(waits) or 1),
+        "p90_wait": waits[int(0.9 * len(waits))] if waits else 0.0,
+        "age_gap": sum(abs(profiles[a][2] - profiles[b][2]) for a, b in pairs) / count,
+        "opposite": sum(profiles[a][1] != profiles[b][1] for a, b in pairs) / count,
+        "estimate_error": sum(errors) / (len(errors) or 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--arrivals", type=int, default=20_000)
+    parser.add_argument("--gap", type=float, default=2.0, help="seconds between searches")
+    parser.add_argument("--ttl", type=float, default=600.0)
+    parser.add_argument("--interval", type=float, default=5.0, help="seconds between rematches")
+    parser.add_argument("--offer-after", type=float, default=120.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    users = arrivals(args.arrivals, args.seed)
+    print(
+        f"{'mode':>9} {'matched':>8} {'mean s':>7} {'p90 s':>7} {'age gap':>8}"
+        f" {'opposite':>9} {'est err s':>10}"
+    )
+    for mode in ("strict", "relaxed", "fallback"):
+        r = run(mode, users, args)
+        print(
+            f"{mode:>9} {r['matched']:>8.3f} {r['mean_wait']:>7.1f} {r['p90_wait']:>7.1f}"
+            f" {r['age_gap']:>8.2f} {r['opposite']:>9.2f} {r['estimate_error']:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""Replay a recorded update stream against ChatBot and a fake Bot API.
+
+    RECORD_UPDATES=updates.jsonl.gz python anonbot.py
+    python -m benchmarks.replay updates.jsonl.gz --speed 10
+    python -m benchmarks.replay updates.jsonl.gz --settle --save-calls calls.json.gz
+    python -m benchmarks.replay updates.jsonl.gz --settle --compare-calls calls.json.gz
+
+Updates are fed to the registered handlers one at a time, at the recorded
+pace divided by ``--speed`` (0 replays as fast as possible). The user
+lines in the recording restore each user's profile, state and partner the
+first time they appear, so chats already open at capture time continue.
+
+Outbound calls are grouped by receiving chat and compared in order with a
+saved run; message ids that the fake API makes up are left out. Sends go
+through the outbound scheduler on worker threads, so ``--settle`` drains
+it after every update to make the order of calls per chat reproducible.
+``--compare-calls`` exits with status 1 when any chat diverges. Inbound
+admission control is off unless ``--admission`` is given, since a sped-up
+replay would look like a flood to it.
+"""
+import argparse
+import gzip
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+from typing import Dict, List
+import telebot
+from telebot import types
+from anonbot import ChatBot
+from benchmarks.fake_api import FakeTelegramApi
+from src.models.message import MessageHistory
+from src.models.states import SetupState, UserState
+from src.models.user import UserSettings
+from src.services.outbound import OutboundScheduler
+from src.services.state_store import InMemoryStateStore
+from src.services.update_log import read_update_log
+
+
+VOLATILE = {"reply_parameters", "reply_to_message_id"}
+
+Calls = Dict[str, List[str]]
+
+
+def apply_user(chat_bot: ChatBot, entry: dict):
+    user_id = entry["user"]
+    profile = entry.get("profile")
+    if profile is not None:
+        chat_bot.user_settings[chat_bot._hash_id(user_id)] = UserSettings(**profile)
+    if entry.get("state"):
+        chat_bot.user_states[user_id] = UserState(entry["state"])
+    if entry.get("setup"):
+        chat_bot.setup_states[user_id] = SetupState(entry["setup"])
+    partner_id = entry.get("partner")
+    if partner_id is not None:
+        chat_bot.active_chats[user_id] = partner_id
+        chat_bot.active_chats[partner_id] = user_id
+        chat_bot.user_states[partner_id] = UserState.CHATTING
+        chat_bot.chats.setdefault(
+            chat_bot._generate_chat_id(user_id, partner_id),
+            {
+                user_id: MessageHistory(chat_bot.HISTORY_CAPACITY),
+                partner_id: MessageHistory(chat_bot.HISTORY_CAPACITY),
+            },
+        )
+    elif entry.get("waiting") and profile is not None:
+        chat_bot.waiting_users.add(user_id, profile["room"], profile["gender"], profile["age"])
+
+
+def normalize(method: str, params: dict) -> str:
+    kept = {
+        key: str(value)
+        for key, value in params.items()
+        if key not in VOLATILE and not (method.startswith("edit") and key == "message_id")
+    }
+    return json.dumps([method, kept], sort_keys=True, ensure_ascii=False)
+
+
+def replay(
+    path: str, speed: float = 0.0, seed: int = 0, settle: bool = False, admission: bool = False
+) -> (Dict[str, float], Calls):
+    cwd = os.getcwd()
+    latencies = []
+    errors = 0
+    lag = 0.0
+    with tempfile.TemporaryDirectory() as workdir, FakeTelegramApi(
+        keep_requests=True, retry_after=0
+    ) as api:
+        os.chdir(workdir)
+        try:
+            bot = telebot.TeleBot("0:replay", threaded=False)
+            chat_bot = ChatBot(
+                bot.token, InMemoryStateStore(random.Random(seed)), bot=bot, admission=admission
+            )
+            chat_bot.sender = OutboundScheduler(per_chat_rate=1e9, global_rate=1e9, workers=16)
+            started = time.perf_counter()
+            for entry in read_update_log(path):
+                if "user" in entry:
+                    apply_user(chat_bot, entry)
+                    continue
+                if speed:
+                    behind = time.perf_counter() - started - entry["at"] / speed
+                    if behind < 0:
+                        time.sleep(-behind)
+                    lag = max(lag, behind)
+                update = types.Update.de_json(entry["update"])
+                call = time.perf_counter()
+                try:
+                    chat_bot.bot.process_new_updates([update])
+                except telebot.apihelper.ApiTelegramException:
+                    errors += 1
+                latencies.append(time.perf_counter() - call)
+                if settle:
+                    chat_bot.sender.close()
+            chat_bot.albums.flush_all()
+            chat_bot.sender.close()
+            elapsed = time.perf_counter() - started
+            chat_bot.settings_store.close()
+        finally:
+            os.chdir(cwd)
+
+    calls: Calls = {}
+    for method, params in api.requests:
+        calls.setdefault(str(params.get("chat_id", "")), []).append(normalize(method, params))
+
+    latencies.sort()
+    count = len(latencies)
+
+    def percentile(p: float) -> float:
+        return latencies[min(count - 1, int(p * count))] * 1000 if latencies else 0.0
+
+    return {
+        "updates": count,
+        "errors": errors,
+        "seconds": elapsed,
+        "updates_per_s": count / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(0.50),
+        "p99_ms": percentile(0.99),
+        "max_ms": latencies[-1] * 1000 if latencies else 0.0,
+        "max_lag_s": lag,
+        "api_calls": api.total_calls,
+    }, calls
+
+
+def divergence(calls: Calls, baseline: Calls, examples: int = 5) -> int:
+    chats = sorted(set(calls) | set(baseline))
+    diverged = [chat for chat in chats if calls.get(chat) != baseline.get(chat)]
+    before = Counter(json.loads(call)[0] for chat in baseline.values() for call in chat)
+    after = Counter(json.loads(call)[0] for chat in calls.values() for call in chat)
+    print(f"chats diverged: {len(diverged)} of {len(chats)}")
+    for method in sorted(set(before) | set(after)):
+        if before[method] != after[method]:
+            print(f"  {method}: {before[method]} -> {after[method]}")
+    for chat in diverged[:examples]:
+        old, new = baseline.get(chat, []), calls.get(chat, [])
+        index = next(
+            (i for i, (a, b) in enumerate(zip(old, new)) if a != b), min(len(old), len(new))
+        )
+        print(f"  chat {chat}, call {index}:")
+        print(f"    was: {old[index] if index < len(old) else '-'}")
+        print(f"    now: {new[index] if index < len(new) else '-'}")
+    return len(diverged)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("recording")
+    parser.add_argument("--speed", type=float, default=0.0, help="1 = recorded pace, 0 = as fast as possible")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the same-gender matching rule")
+    parser.add_argument("--settle", action="store_true", help="drain outbound sends after every update")
+    parser.add_argument("--admission", action="store_true", help="keep inbound flood control on")
+    parser.add_argument("--save-calls", metavar="PATH")
+    parser.add_argument("--compare-calls", metavar="PATH")
+    args = parser.parse_args()
+
+    results, calls = replay(args.recording, args.speed, args.seed, args.settle, args.admission)
+    for name, value in results.items():
+        print(f"{name:>14} {value:>12.3f}" if isinstance(value, float) else f"{name:>14} {value:>12}")
+
+    if args.save_calls:
+        with gzip.open(args.save_calls, "wt", encoding="utf-8") as f:
+            json.dump({"calls": calls}, f)
+    if args.compare_calls:
+        with gzip.open(args.compare_calls, "rt", encoding="utf-8") as f:
+            baseline = json.load(f)["calls"]
+        if divergence(calls, baseline):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
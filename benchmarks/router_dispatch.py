@@ -0,0 +1,130 @@
+"""Dispatch cost of the table router against telebot's handler chain.
+
+    python -m benchmarks.router_dispatch --updates 200000
+
+Both bots get the same no-op handlers. ``chain`` registers them as
+ChatBot used to, one telebot handler per route with the setup lambda
+filter; ``router`` registers them in an UpdateRouter. Every update is
+checked to reach the same handler on both before timing starts.
+"""
+import argparse
+import random
+import time
+from typing import Callable, Dict, List
+import telebot
+from benchmarks.workloads import CONTENT, Workload
+from src.handlers.router import UpdateRouter
+from src.models.states import SetupState, UserState
+from src.services.forwarding import build_default_registry
+
+
+COMMANDS = ["start", "age", "gender", "room", "search", "end"]
+SETUP_STATES = [SetupState.AGE, SetupState.GENDER, SetupState.ROOM]
+
+
+def _in_setup(user_state, setup_state) -> bool:
+    return user_state == UserState.SETUP or setup_state in SETUP_STATES
+
+
+def build_chain(user_states, setup_states, record: Callable[[str], Callable]) -> telebot.TeleBot:
+    bot = telebot.TeleBot("0:bench", threaded=False)
+    for command in COMMANDS[:4]:
+        bot.message_handler(commands=[command])(record(command))
+    bot.message_handler(
+        func=lambda message: user_states.get(message.from_user.id) == UserState.SETUP
+        or setup_states.get(message.from_user.id) in [SetupState.AGE, SetupState.GENDER, SetupState.ROOM]
+    )(record("setup"))
+    for command in COMMANDS[4:]:
+        bot.message_handler(commands=[command])(record(command))
+    bot.message_handler(content_types=build_default_registry().content_types())(record("forward"))
+    return bot
+
+
+def build_router(user_states, setup_states, record: Callable[[str], Callable]) -> telebot.TeleBot:
+    bot = telebot.TeleBot("0:bench", threaded=False)
+    router = UpdateRouter(user_states, setup_states)
+    for command in COMMANDS[:4]:
+        router.command(command)(record(command))
+    router.message(when=_in_setup)(record("setup"))
+    for command in COMMANDS[4:]:
+        router.command(command)(record(command))
+    router.message(content_types=build_default_registry().content_types())(record("forward"))
+    router.attach(bot)
+    return bot
+
+
+def make_updates(count: int, users: int, seed: int):
+    rng = random.Random(seed)
+    workload = Workload(seed)
+    user_states: Dict[int, UserState] = {}
+    setup_states: Dict[int, SetupState] = {}
+    for user_id in range(1, users + 1):
+        if rng.random() < 0.1:
+            user_states[user_id] = UserState.SETUP
+            setup_states[user_id] = rng.choice(SETUP_STATES)
+        else:
+            user_states[user_id] = rng.choice([UserState.CHATTING] * 8 + [UserState.IDLE, UserState.WAITING])
+            setup_states[user_id] = SetupState.COMPLETE
+
+    updates = []
+    for _ in range(count):
+        user_id = rng.randint(1, users)
+        roll = rng.random()
+        if roll < 0.05:
+            updates.append(workload.command(user_id, "/" + rng.choice(COMMANDS + ["help"])))
+        elif roll < 0.6:
+            updates.append(workload.update(user_id, text="hello"))
+        else:
+            updates.append(workload.update(user_id, **CONTENT[rng.choice(list(CONTENT))]))
+    return user_states, setup_states, updates
+
+
+def run(count: int, users: int, seed: int) -> Dict[str, float]:
+    user_states, setup_states, updates = make_updates(count, users, seed)
+    routes: Dict[str, List[str]] = {"chain": [], "router": []}
+
+    def recorder(name: str):
+        def record(route: str):
+            def handler(message):
+                routes[name].append(route)
+
+            return handler
+
+        return record
+
+    bots = {
+        "chain": build_chain(user_states, setup_states, recorder("chain")),
+        "router": build_router(user_states, setup_states, recorder("router")),
+    }
+    for bot in bots.values():
+        bot.process_new_updates(updates)
+    mismatches = sum(a != b for a, b in zip(routes["chain"], routes["router"]))
+    if mismatches or len(routes["chain"]) != len(routes["router"]):
+        raise SystemExit(f"Router disagrees with the handler chain on {mismatches} updates")
+
+    results = {}
+    for name, bot in bots.items():
+        routes[name].clear()
+        started = time.perf_counter()
+        for update in updates:
+            bot.process_new_updates([update])
+        results[name] = (time.perf_counter() - started) / count * 1e6
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--updates", type=int, default=200_000)
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    results = run(args.updates, args.users, args.seed)
+    print(f"{'dispatch':>8} {'us/update':>10}")
+    for name, micros in results.items():
+        print(f"{name:>8} {micros:>10.2f}")
+    print(f"speedup  {results['chain'] / results['router']:>10.2f}x")
+
+
+if __name__ == "__main__":
+    main()
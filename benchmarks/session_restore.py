@@ -0,0 +1,86 @@
+"""Snapshot size and restore time for many live sessions.
+
+    python -m benchmarks.session_restore --sessions 100000 --messages 20
+
+Half of the users are paired into chats with ``--messages`` history
+entries per side; the rest wait in the match queue. The state is written
+as one snapshot, ``--journal`` more changes are journaled on top of it,
+and a fresh store is restored from both.
+"""
+import argparse
+import functools
+import os
+import random
+import tempfile
+import time
+from anonbot import ChatBot
+from src.models.message import MessageHistory
+from src.models.states import SetupState, UserState
+from src.services.session_snapshots import SessionSnapshots
+from src.services.state_store import InMemoryStateStore
+
+
+ROOMS = ["general", "movies", "books", "gaming", "music", "photography", "cooking", "politics"]
+
+
+def populate(snapshots: SessionSnapshots, sessions: int, messages: int, seed: int):
+    rng = random.Random(seed)
+    store, chats = InMemoryStateStore(), {}
+    snapshots.attach(store, chats)
+    for user_id in range(1, sessions + 1):
+        store.setup_states[user_id] = SetupState.COMPLETE
+        if user_id % 2 == 0:
+            partner_id = user_id - 1
+            store.active_chats[user_id] = partner_id
+            store.active_chats[partner_id] = user_id
+            store.user_states[user_id] = store.user_states[partner_id] = UserState.CHATTING
+            sides = chats[snapshots.chat_id(user_id, partner_id)] = {
+                side: MessageHistory(snapshots.history_capacity) for side in (user_id, partner_id)
+            }
+            for i in range(messages):
+                sender, receiver = (user_id, partner_id) if i % 2 else (partner_id, user_id)
+                snapshots.append_message(sides[sender], sender, receiver, i, i + 1)
+        elif user_id % 4 == 1:
+            store.user_states[user_id] = UserState.WAITING
+            store.waiting_users.add(user_id, rng.choice(ROOMS), rng.choice("MW"), rng.randint(18, 60))
+        else:
+            store.user_states[user_id] = UserState.IDLE
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=100_000)
+    parser.add_argument("--messages", type=int, default=20, help="history entries per chat side")
+    parser.add_argument("--journal", type=int, default=10_000, help="changes journaled after the snapshot")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, "sessions.snapshot")
+        journal = os.path.join(workdir, "sessions.journal")
+        chat_id = functools.partial(ChatBot._generate_chat_id, None)
+
+        snapshots = SessionSnapshots(path, journal, chat_id)
+        populate(snapshots, args.sessions, args.messages, args.seed)
+        started = time.perf_counter()
+        snapshots.snapshot()
+        written = time.perf_counter() - started
+        store = snapshots._store
+        for user_id in range(1, args.journal + 1):
+            store.user_states[user_id] = UserState.IDLE
+        snapshots.flush()
+
+        restored = SessionSnapshots(path, journal, chat_id)
+        started = time.perf_counter()
+        restored.restore(InMemoryStateStore(), {})
+        loaded = time.perf_counter() - started
+
+        print(f"sessions        {args.sessions}")
+        print(f"snapshot MB     {os.path.getsize(path) / 2**20:.1f}")
+        print(f"journal KB      {os.path.getsize(f'{journal}.{restored.generation}') / 2**10:.1f}")
+        print(f"snapshot ms     {written * 1000:.0f}")
+        print(f"restore ms      {loaded * 1000:.0f}")
+
+
+if __name__ == "__main__":
+    main()
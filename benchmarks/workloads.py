@@ -0,0 +1,110 @@
+"""Synthetic update streams for the load test."""
+import random
+from itertools import count
+from typing import Iterable, Iterator, List, Optional
+from telebot import types
+
+
+ROOMS = ["general", "movies", "books", "gaming", "music", "photography", "cooking", "politics"]
+
+_FILE = {"file_id": "f", "file_unique_id": "u"}
+
+CONTENT = {
+    "text": {"text": "hello there"},
+    "audio": {"audio": {**_FILE, "duration": 3}, "caption": "song"},
+    "document": {"document": _FILE, "caption": "doc"},
+    "photo": {"photo": [{**_FILE, "width": 90, "height": 90}], "caption": "pic"},
+    "sticker": {
+        "sticker": {
+            **_FILE,
+            "type": "regular",
+            "width": 512,
+            "height": 512,
+            "is_animated": False,
+            "is_video": False,
+        }
+    },
+    "video": {"video": {**_FILE, "width": 640, "height": 360, "duration": 5}},
+    "video_note": {"video_note": {**_FILE, "length": 240, "duration": 5}},
+    "voice": {"voice": {**_FILE, "duration": 2}},
+    "location": {"location": {"latitude": 55.75, "longitude": 37.62}},
+    "contact": {"contact": {"phone_number": "+10000000000", "first_name": "Anon"}},
+    "venue": {
+        "venue": {
+            "location": {"latitude": 55.75, "longitude": 37.62},
+            "title": "Cafe",
+            "address": "Main st. 1",
+        }
+    },
+    "dice": {"dice": {"emoji": "🎲", "value": 4}},
+    "poll": {
+        "poll": {
+            "id": "1",
+            "question": "Tea or coffee?",
+            "options": [
+                {"persistent_id": "0", "text": "Tea", "voter_count": 0},
+                {"persistent_id": "1", "text": "Coffee", "voter_count": 0},
+            ],
+            "total_voter_count": 0,
+            "is_closed": False,
+            "is_anonymous": True,
+            "type": "regular",
+            "allows_multiple_answers": False,
+        }
+    },
+    "animation": {"animation": {**_FILE, "width": 320, "height": 240, "duration": 2}},
+}
+
+
+class Workload:
+    """Yields ready-to-process ``Update`` objects for groups of users."""
+
+    def __init__(self, seed: int = 0):
+        self.rng = random.Random(seed)
+        self._ids = count(1)
+
+    def update(self, user_id: int, **fields) -> types.Update:
+        update_id = next(self._ids)
+        message = {
+            "message_id": update_id,
+            "date": 0,
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "user"},
+            **fields,
+        }
+        return types.Update.de_json({"update_id": update_id, "message": message})
+
+    def command(self, user_id: int, text: str) -> types.Update:
+        return self.update(
+            user_id,
+            text=text,
+            entities=[{"type": "bot_command", "offset": 0, "length": len(text)}],
+        )
+
+    def setup_funnel(self, users: Iterable[int]) -> Iterator[types.Update]:
+        for user_id in users:
+            yield self.command(user_id, "/start")
+            yield self.update(user_id, text=str(self.rng.randint(18, 60)))
+            yield self.update(user_id, text=self.rng.choice("MW"))
+            yield self.update(user_id, text=self.rng.choice(ROOMS))
+
+    def search_storm(self, users: Iterable[int]) -> Iterator[types.Update]:
+        for user_id in users:
+            yield self.command(user_id, "/search")
+
+    def message_flood(
+        self,
+        users: Iterable[int],
+        per_user: int,
+        content_types: Optional[List[str]] = None,
+    ) -> Iterator[types.Update]:
+        content_types = content_types or list(CONTENT)
+        users = list(users)
+        for _ in range(per_user):
+            for user_id in users:
+                content = CONTENT[self.rng.choice(content_types)]
+                yield self.update(user_id, **content)
+
+    def mass_end(self, users: Iterable[int]) -> Iterator[types.Update]:
+        for user_id in users:
+            yield self.command(user_id, "/end")
@@ -1,9 +1,9 @@
-from telebot import TeleBot
+from src.handlers.router import UpdateRouter
 from src.services.message_service import MessageService
 
 
-def register_message_handlers(bot: TeleBot, service: MessageService):
-    @bot.message_handler(content_types=["text", "photo", "video", "voice"])
+def register_message_handlers(router: UpdateRouter, service: MessageService):
+    @router.message(content_types=service.forwarders.content_types())
     def message_handler(message):
         user_id = message.from_user.id
         service.forward_message(user_id, message)
@@ -0,0 +1,121 @@
+from itertools import product
+from typing import Callable, Dict, Iterable, List, MutableMapping, Optional, Tuple
+from telebot import TeleBot
+from telebot.util import extract_command
+from src.models.states import SetupState, UserState
+
+
+Handler = Callable[..., None]
+Condition = Callable[[Optional[UserState], Optional[SetupState]], bool]
+
+
+class _Route:
+    __slots__ = ("handler", "commands", "content_types", "when")
+
+    def __init__(
+        self,
+        handler: Handler,
+        commands: Tuple[str, ...],
+        content_types: Tuple[str, ...],
+        when: Optional[Condition],
+    ):
+        self.handler = handler
+        self.commands = commands
+        self.content_types = content_types
+        self.when = when
+
+    def matches(self, user_state, setup_state, key: str) -> bool:
+        if self.when is not None and not self.when(user_state, setup_state):
+            return False
+        if key.startswith("/"):
+            return key[1:] in self.commands or "text" in self.content_types
+        return key in self.content_types
+
+
+class UpdateRouter:
+    """Single entry point for messages, dispatched through a precomputed table."""
+
+    def __init__(
+        self,
+        user_states: MutableMapping[int, UserState],
+        setup_states: MutableMapping[int, SetupState],
+    ):
+        self.user_states = user_states
+        self.setup_states = setup_states
+        self._routes: List[_Route] = []
+        self._commands: set = set()
+        self._table: Dict[Tuple[Optional[UserState], Optional[SetupState], str], Handler] = {}
+
+    def command(self, *commands: str, when: Optional[Condition] = None):
+        def decorator(handler: Handler) -> Handler:
+            self._add(_Route(handler, commands, (), when))
+            return handler
+
+        return decorator
+
+    def message(
+        self, content_types: Iterable[str] = ("text",), when: Optional[Condition] = None
+    ):
+        def decorator(handler: Handler) -> Handler:
+            self._add(_Route(handler, (), tuple(content_types), when))
+            return handler
+
+        return decorator
+
+    def _add(self, route: _Route):
+        self._routes.append(route)
+        self._commands.update(route.commands)
+        self._compile()
+
+    def content_types(self) -> List[str]:
+        types = {"text"} if self._commands else set()
+        for route in self._routes:
+            types.update(route.content_types)
+        return sorted(types)
+
+    def wrap(self, wrapper: Callable[[Handler], Handler]) -> Callable[[], None]:
+        """Wraps every route's handler; the returned function puts the previous ones back."""
+        previous = [route.handler for route in self._routes]
+        for route in self._routes:
+            route.handler = wrapper(route.handler)
+        self._compile()
+
+        def unwrap():
+            for route, handler in zip(self._routes, previous):
+                route.handler = handler
+            self._compile()
+
+        return unwrap
+
+    def _compile(self):
+        keys = {"/" + command for command in self._commands}
+        for route in self._routes:
+            keys.update(route.content_types)
+        table = {}
+        for user_state, setup_state, key in product(
+            [None, *UserState], [None, *SetupState], keys
+        ):
+            for route in self._routes:
+                if route.matches(user_state, setup_state, key):
+                    table[user_state, setup_state, key] = route.handler
+                    break
+        self._table = table
+
+    def resolve(self, message) -> Optional[Handler]:
+        key = message.content_type
+        if key == "text":
+            command = extract_command(message.text)
+            if command in self._commands:
+                key = "/" + command
+        user_id = message.from_user.id
+        return self._table.get(
+            (self.user_states.get(user_id), self.setup_states.get(user_id), key)
+        )
+
+    def dispatch(self, message):
+        handler = self.resolve(message)
+        if handler is not None:
+            handler(message)
+
+    def attach(self, bot: TeleBot):
+        bot.message_handler(content_types=self.content_types())(self.dispatch)
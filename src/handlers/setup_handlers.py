@@ -1,10 +1,10 @@
-from telebot import TeleBot
+from src.handlers.router import UpdateRouter
 from src.models.states import SetupState, UserState
 from src.services.matching_service import MatchingService
 
 
-def register_setup_handlers(bot: TeleBot, service: MatchingService):
-    @bot.message_handler(commands=["start"])
+def register_setup_handlers(router: UpdateRouter, service: MatchingService):
+    @router.command("start")
     def start_handler(message):
         user_id = message.from_user.id
         service.start_setup(user_id, message)
@@ -1,5 +1,9 @@
+import sys
+import time
+from array import array
 from dataclasses import dataclass
 from datetime import datetime
+from typing import Dict, Iterator, Optional, Tuple
 
 
 @dataclass
@@ -8,3 +12,105 @@ class MessageInfo:
     chat_id: int
     partner_message_id: int
     timestamp: datetime
+
+
+class MessageHistory:
+    """Ring buffer of the last ``capacity`` forwarded message id pairs of one chat side."""
+
+    __slots__ = (
+        "capacity",
+        "_message_ids",
+        "_partner_ids",
+        "_timestamps",
+        "_head",
+        "_index",
+        "_partner_index",
+    )
+
+    def __init__(self, capacity: int = 1000):
+        self.capacity = capacity
+        self._message_ids = array("q")
+        self._partner_ids = array("q")
+        self._timestamps = array("q")
+        self._head = 0
+        self._index: Dict[int, int] = {}
+        self._partner_index: Dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._message_ids)
+
+    def append(self, message_id: int, partner_message_id: int, timestamp: Optional[int] = None):
+        if timestamp is None:
+            timestamp = time.time_ns()
+        if len(self._message_ids) < self.capacity:
+            pos = len(self._message_ids)
+            self._message_ids.append(message_id)
+            self._partner_ids.append(partner_message_id)
+            self._timestamps.append(timestamp)
+        else:
+            pos = self._head
+            evicted = self._message_ids[pos]
+            if self._index.get(evicted) == pos:
+                del self._index[evicted]
+            evicted = self._partner_ids[pos]
+            if self._partner_index.get(evicted) == pos:
+                del self._partner_index[evicted]
+            self._message_ids[pos] = message_id
+            self._partner_ids[pos] = partner_message_id
+            self._timestamps[pos] = timestamp
+            self._head = (pos + 1) % self.capacity
+        self._index[message_id] = pos
+        self._partner_index[partner_message_id] = pos
+
+    def partner_of(self, message_id: int) -> Optional[int]:
+        pos = self._index.get(message_id)
+        return self._partner_ids[pos] if pos is not None else None
+
+    def origin_of(self, partner_message_id: int) -> Optional[int]:
+        pos = self._partner_index.get(partner_message_id)
+        return self._message_ids[pos] if pos is not None else None
+
+    def last_timestamp(self) -> Optional[int]:
+        if not self._message_ids:
+            return None
+        return self._timestamps[self._head - 1]
+
+    def __iter__(self) -> Iterator[Tuple[int, int, int]]:
+        size = len(self._message_ids)
+        start = self._head if size == self.capacity else 0
+        for i in range(size):
+            pos = (start + i) % size
+            yield self._message_ids[pos], self._partner_ids[pos], self._timestamps[pos]
+
+    def columns(self) -> Tuple[array, array, array]:
+        """Copies of the three columns, oldest entry first."""
+        if len(self._message_ids) < self.capacity or self._head == 0:
+            return array("q", self._message_ids), array("q", self._partner_ids), array("q", self._timestamps)
+        head = self._head
+        return tuple(
+            column[head:] + column[:head]
+            for column in (self._message_ids, self._partner_ids, self._timestamps)
+        )
+
+    @classmethod
+    def from_columns(
+        cls, capacity: int, message_ids: array, partner_ids: array, timestamps: array
+    ) -> "MessageHistory":
+        history = cls.__new__(cls)
+        history.capacity = capacity
+        history._message_ids = message_ids
+        history._partner_ids = partner_ids
+        history._timestamps = timestamps
+        history._head = 0
+        positions = range(len(message_ids))
+        history._index = dict(zip(message_ids, positions))
+        history._partner_index = dict(zip(partner_ids, positions))
+        return history
+
+    def nbytes(self) -> int:
+        columns = (self._message_ids, self._partner_ids, self._timestamps)
+        return (
+            sum(sys.getsizeof(column) for column in columns)
+            + sys.getsizeof(self._index)
+            + sys.getsizeof(self._partner_index)
+        )
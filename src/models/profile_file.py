@@ -0,0 +1,279 @@
+"""Fixed-width profile record file, memory-mapped and searched in place.
+
+    python -m src.models.profile_file user_settings.json user_settings.profiles
+
+The converter accepts the legacy ``user_settings.json`` object as well as
+the JSON-lines settings log, whose torn last line is skipped.
+"""
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from src.models.profile_table import Profile, ProfileTable
+from src.models.user import UserSettings
+
+
+MAGIC = b"ANPF"
+VERSION = 1
+_HEADER = struct.Struct("<4sHIQ")
+_RECORD = struct.Struct("<32sBBB")
+DIGEST_SIZE = 32
+
+Fields = Tuple[int, str, str]
+
+
+class ProfileFile:
+    """Read-only, memory-mapped view of a record file sorted by digest."""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, names_size, self.count = _HEADER.unpack_from(self._map)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} profile file")
+        names = json.loads(self._map[_HEADER.size : _HEADER.size + names_size])
+        self.genders: List[str] = names["genders"]
+        self.rooms: List[str] = names["rooms"]
+        self._start = _HEADER.size + names_size
+
+    def _digest(self, index: int) -> bytes:
+        offset = self._start + index * _RECORD.size
+        return self._map[offset : offset + DIGEST_SIZE]
+
+    def bisect(self, key: bytes) -> int:
+        """Index of the first record whose digest is not below ``key``."""
+        low, high = 0, self.count
+        while low < high:
+            mid = (low + high) // 2
+            if self._digest(mid) < key:
+                low = mid + 1
+            else:
+                high = mid
+        return low
+
+    def find(self, key: bytes) -> Optional[Fields]:
+        index = self.bisect(key)
+        if index == self.count or self._digest(index) != key:
+            return None
+        _, age, gender, room = _RECORD.unpack_from(self._map, self._start + index * _RECORD.size)
+        return age, self.genders[gender], self.rooms[room]
+
+    def records(self, start: int, end: int) -> bytes:
+        return self._map[self._start + start * _RECORD.size : self._start + end * _RECORD.size]
+
+    def __iter__(self) -> Iterator[bytes]:
+        for index in range(self.count):
+            yield self._digest(index)
+
+    def __len__(self) -> int:
+        return self.count
+
+
+def write_profile_file(
+    path: str, genders: List[str], rooms: List[str], chunks: Iterable[bytes]
+) -> int:
+    """Writes packed records (already sorted) atomically; returns how many there were."""
+    names = json.dumps({"genders": genders, "rooms": rooms}).encode()
+    tmp_path = path + ".tmp"
+    count = 0
+    with open(tmp_path, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, VERSION, len(names), 0))
+        f.write(names)
+        for chunk in chunks:
+            f.write(chunk)
+            count += len(chunk) // _RECORD.size
+        f.seek(0)
+        f.write(_HEADER.pack(MAGIC, VERSION, len(names), count))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return count
+
+
+def _code(names: List[str], name: str) -> int:
+    try:
+        return names.index(name)
+    except ValueError:
+        names.append(name)
+        return len(names) - 1
+
+
+def _read_records(data: bytes) -> Dict[str, dict]:
+    # Log lines are written as {"id": ..., ...}; the legacy object is keyed by hex digests.
+    if not data.lstrip().startswith(b'{"id":'):
+        return json.loads(data) if data.strip() else {}
+    records = {}
+    end = data.rfind(b"\n") + 1
+    for line in data[:end].splitlines():
+        if line.strip():
+            record = json.loads(line)
+            records[record.pop("id")] = record
+    return records
+
+
+def convert(source: str, path: str) -> int:
+    """Builds a record file from a JSON object or JSON-lines log of profiles."""
+    with open(source, "rb") as f:
+        records = _read_records(f.read())
+    genders, rooms = ["", "M", "W"], ["general"]
+    packed = [
+        _RECORD.pack(
+            bytes.fromhex(hashed_id),
+            record.get("age", 0),
+            _code(genders, record.get("gender", "")),
+            _code(rooms, record.get("room", "general")),
+        )
+        for hashed_id, record in sorted(records.items())
+    ]
+    return write_profile_file(path, genders, rooms, packed)
+
+
+class MappedProfileTable(ProfileTable):
+    """Profiles backed by a record file, materialized on first access and evicted when idle."""
+
+    def __init__(
+        self,
+        path: str,
+        rooms: Optional[List[str]] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        super().__init__(rooms)
+        self.path = path
+        self.clock = clock
+        self._file = ProfileFile(path) if Path(path).exists() else None
+        self._removed: set = set()
+        self._touched = array("d")
+        self._total = len(self._file) if self._file is not None else 0
+
+    def _stored(self, key: bytes) -> Optional[Fields]:
+        if self._file is None or key in self._removed:
+            return None
+        return self._file.find(key)
+
+    def _touch(self, slot: int):
+        touched = self._touched
+        if slot >= len(touched):
+            touched.extend([0.0] * (slot + 1 - len(touched)))
+        touched[slot] = self.clock()
+
+    def _resident(self, key: bytes) -> int:
+        return self._probe(key)[1]
+
+    def __getitem__(self, hashed_id: str) -> Profile:
+        key = bytes.fromhex(hashed_id)
+        with self._lock:
+            slot = self._resident(key)
+            if slot < 0:
+                fields = self._stored(key)
+                if fields is None:
+                    raise KeyError(hashed_id)
+                ProfileTable.__setitem__(self, hashed_id, UserSettings(*fields))
+                slot = self._resident(key)
+            self._touch(slot)
+        return Profile(self, slot)
+
+    def __setitem__(self, hashed_id: str, settings):
+        key = bytes.fromhex(hashed_id)
+        with self._lock:
+            if self._resident(key) < 0 and self._stored(key) is None:
+                self._total += 1
+            self._removed.discard(key)
+            ProfileTable.__setitem__(self, hashed_id, settings)
+            self._touch(self._resident(key))
+
+    def __delitem__(self, hashed_id: str):
+        key = bytes.fromhex(hashed_id)
+        with self._lock:
+            resident = self._resident(key) >= 0
+            stored = self._stored(key) is not None
+            if not resident and not stored:
+                raise KeyError(hashed_id)
+            if resident:
+                ProfileTable.__delitem__(self, hashed_id)
+            if stored:
+                self._removed.add(key)
+            self._total -= 1
+
+    def __contains__(self, hashed_id) -> bool:
+        key = bytes.fromhex(hashed_id)
+        with self._lock:
+            return self._resident(key) >= 0 or self._stored(key) is not None
+
+    def __iter__(self) -> Iterator[str]:
+        if self._file is not None:
+            for key in self._file:
+                if key not in self._removed:
+                    yield key.hex()
+        for hashed_id in list(ProfileTable.__iter__(self)):
+            if self._stored(bytes.fromhex(hashed_id)) is None:
+                yield hashed_id
+
+    def __len__(self) -> int:
+        return self._total
+
+    def resident(self) -> int:
+        return self._size
+
+    def evict(self, idle: float) -> int:
+        """Drops resident profiles untouched for ``idle`` seconds that match the file."""
+        cutoff = self.clock() - idle
+        evicted = 0
+        with self._lock:
+            for hashed_id in list(ProfileTable.__iter__(self)):
+                key = bytes.fromhex(hashed_id)
+                slot = self._resident(key)
+                if self._touched[slot] > cutoff:
+                    continue
+                profile = Profile(self, slot)
+                if self._stored(key) == (profile.age, profile.gender, profile.room):
+                    ProfileTable.__delitem__(self, hashed_id)
+                    evicted += 1
+        return evicted
+
+    def save(self):
+        """Writes the file plus resident changes to a new file and maps that one."""
+        with self._lock:
+            base = self._file
+            genders = list(base.genders) if base is not None else ["", "M", "W"]
+            rooms = list(base.rooms) if base is not None else list(self._room_names)
+            changes: Dict[bytes, Optional[bytes]] = {key: None for key in self._removed}
+            for hashed_id in ProfileTable.__iter__(self):
+                key = bytes.fromhex(hashed_id)
+                profile = Profile(self, self._resident(key))
+                changes[key] = _RECORD.pack(
+                    key, profile.age, _code(genders, profile.gender), _code(rooms, profile.room)
+                )
+            removed = set(self._removed)
+
+        def chunks() -> Iterator[bytes]:
+            cursor = 0
+            for key in sorted(changes):
+                if base is not None:
+                    index = base.bisect(key)
+                    yield base.records(cursor, index)
+                    cursor = index
+                    if index < base.count and base._digest(index) == key:
+                        cursor += 1
+                if changes[key] is not None:
+                    yield changes[key]
+            if base is not None:
+                yield base.records(cursor, base.count)
+
+        write_profile_file(self.path, genders, rooms, chunks())
+        with self._lock:
+            self._file = ProfileFile(self.path)
+            self._removed -= removed
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print("Usage: python -m src.models.profile_file SOURCE.json PROFILES")
+    else:
+        started = time.perf_counter()
+        count = convert(sys.argv[1], sys.argv[2])
+        print(f"Wrote {count} profiles to {sys.argv[2]} in {time.perf_counter() - started:.1f} s")
@@ -0,0 +1,187 @@
+import threading
+from array import array
+from typing import Iterator, List, MutableMapping, Optional
+
+
+class Profile:
+    __slots__ = ("_table", "_slot")
+
+    def __init__(self, table: "ProfileTable", slot: int):
+        self._table = table
+        self._slot = slot
+
+    @property
+    def age(self) -> int:
+        return self._table._ages[self._slot]
+
+    @age.setter
+    def age(self, value: int):
+        self._table._ages[self._slot] = value
+
+    @property
+    def gender(self) -> str:
+        return self._table._gender_names[self._table._genders[self._slot]]
+
+    @gender.setter
+    def gender(self, value: str):
+        self._table._genders[self._slot] = self._table._gender_code(value)
+
+    @property
+    def room(self) -> str:
+        return self._table._room_names[self._table._rooms[self._slot]]
+
+    @room.setter
+    def room(self, value: str):
+        self._table._rooms[self._slot] = self._table._room_code(value)
+
+    def to_dict(self):
+        return {
+            "age": self.age,
+            "gender": self.gender,
+            "room": self.room,
+        }
+
+    def __repr__(self):
+        return f"Profile(age={self.age!r}, gender={self.gender!r}, room={self.room!r})"
+
+
+class ProfileTable(MutableMapping[str, Profile]):
+    """Profiles stored column-wise, keyed by user hash through an open-addressing index."""
+
+    DIGEST_SIZE = 32
+    _EMPTY = -1
+    _DELETED = -2
+
+    def __init__(self, rooms: Optional[List[str]] = None):
+        self._digests = bytearray()
+        self._index = array("q", [self._EMPTY]) * 8
+        self._used = 0
+        self._size = 0
+        self._free: List[int] = []
+        self._ages = array("B")
+        self._genders = array("B")
+        self._rooms = array("B")
+        self._gender_names: List[str] = ["", "M", "W"]
+        self._room_names: List[str] = list(rooms or ["general"])
+        self._lock = threading.RLock()
+
+    def _gender_code(self, gender: str) -> int:
+        try:
+            return self._gender_names.index(gender)
+        except ValueError:
+            self._gender_names.append(gender)
+            return len(self._gender_names) - 1
+
+    def _room_code(self, room: str) -> int:
+        try:
+            return self._room_names.index(room)
+        except ValueError:
+            self._room_names.append(room)
+            return len(self._room_names) - 1
+
+    def _digest(self, slot: int) -> bytes:
+        offset = slot * self.DIGEST_SIZE
+        return bytes(self._digests[offset : offset + self.DIGEST_SIZE])
+
+    def _probe(self, key: bytes):
+        index = self._index
+        digests = self._digests
+        size = self.DIGEST_SIZE
+        mask = len(index) - 1
+        pos = int.from_bytes(key[:8], "little") & mask
+        first_free = -1
+        while True:
+            slot = index[pos]
+            if slot >= 0:
+                offset = slot * size
+                if digests[offset : offset + size] == key:
+                    return pos, slot
+            elif slot == self._EMPTY:
+                return (first_free if first_free >= 0 else pos), -1
+            elif first_free < 0:
+                first_free = pos
+            pos = (pos + 1) & mask
+
+    def _grow(self):
+        old = self._index
+        size = len(old)
+        if (self._size + 1) * 2 > size:
+            size *= 2
+        index = array("q", [self._EMPTY]) * size
+        mask = size - 1
+        used = 0
+        for slot in old:
+            if slot >= 0:
+                offset = slot * self.DIGEST_SIZE
+                pos = int.from_bytes(self._digests[offset : offset + 8], "little") & mask
+                while index[pos] != self._EMPTY:
+                    pos = (pos + 1) & mask
+                index[pos] = slot
+                used += 1
+        self._index = index
+        self._used = used
+
+    def slot(self, hashed_id: str) -> Optional[int]:
+        key = bytes.fromhex(hashed_id)
+        with self._lock:
+            slot = self._probe(key)[1]
+        return slot if slot >= 0 else None
+
+    def __getitem__(self, hashed_id: str) -> Profile:
+        key = bytes.fromhex(hashed_id)
+        with self._lock:
+            slot = self._probe(key)[1]
+        if slot < 0:
+            raise KeyError(hashed_id)
+        return Profile(self, slot)
+
+    def __setitem__(self, hashed_id: str, settings):
+        key = bytes.fromhex(hashed_id)
+        with self._lock:
+            pos, slot = self._probe(key)
+            if slot < 0:
+                if (self._used + 1) * 3 > len(self._index) * 2:
+                    self._grow()
+                    pos, _ = self._probe(key)
+                if self._free:
+                    slot = self._free.pop()
+                    offset = slot * self.DIGEST_SIZE
+                    self._digests[offset : offset + self.DIGEST_SIZE] = key
+                else:
+                    slot = len(self._ages)
+                    self._digests += key
+                    self._ages.append(0)
+                    self._genders.append(0)
+                    self._rooms.append(0)
+                if self._index[pos] == self._EMPTY:
+                    self._used += 1
+                self._index[pos] = slot
+                self._size += 1
+            self._ages[slot] = settings.age
+            self._genders[slot] = self._gender_code(settings.gender)
+            self._rooms[slot] = self._room_code(settings.room)
+
+    def __delitem__(self, hashed_id: str):
+        key = bytes.fromhex(hashed_id)
+        with self._lock:
+            pos, slot = self._probe(key)
+            if slot < 0:
+                raise KeyError(hashed_id)
+            self._index[pos] = self._DELETED
+            self._free.append(slot)
+            self._size -= 1
+
+    def __contains__(self, hashed_id) -> bool:
+        key = bytes.fromhex(hashed_id)
+        with self._lock:
+            return self._probe(key)[1] >= 0
+
+    def __iter__(self) -> Iterator[str]:
+        with self._lock:
+            index = array("q", self._index)
+        for slot in index:
+            if slot >= 0:
+                yield self._digest(slot).hex()
+
+    def __len__(self) -> int:
+        return self._size
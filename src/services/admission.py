@@ -0,0 +1,91 @@
+import time
+from typing import Callable, Collection, List, Optional
+from telebot import types
+from telebot.util import extract_command
+from src.services.outbound import RateLimiter
+from src.utils.metrics import Counter
+
+
+LOW_PRIORITY_TYPES = {"sticker", "dice", "animation"}
+ESSENTIAL_COMMANDS = {"start", "end"}
+
+
+class AdmissionControl:
+    """Drops inbound updates over a per-user rate, and low-priority ones while the bot is overloaded."""
+
+    def __init__(
+        self,
+        load: Callable[[], tuple],
+        user_rate: float = 1.0,
+        user_burst: int = 20,
+        repeat_window: float = 2.0,
+        max_depth: int = 1000,
+        max_latency: float = 1.0,
+        check_interval: float = 0.05,
+        exempt: Collection[int] = (),
+        rejected: Optional[Counter] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.load = load
+        self.users = RateLimiter(user_rate, user_burst)
+        self.commands = RateLimiter(1.0 / repeat_window)
+        self.max_depth = max_depth
+        self.max_latency = max_latency
+        self.check_interval = check_interval
+        self.exempt = exempt
+        self.rejected = rejected or Counter(
+            "anonbot_updates_rejected_total",
+            "Inbound updates dropped before the handlers.",
+            ("reason", "kind"),
+        )
+        self.clock = clock
+        self._overloaded = False
+        self._checked = float("-inf")
+
+    def overloaded(self, now: float) -> bool:
+        if now - self._checked >= self.check_interval:
+            depth, latency = self.load()
+            self._overloaded = depth > self.max_depth or latency > self.max_latency
+            self._checked = now
+        return self._overloaded
+
+    def admit(self, update: types.Update) -> bool:
+        message = update.message or update.edited_message
+        user = message.from_user if message is not None else None
+        if user is None or user.id in self.exempt:
+            return True
+        now = self.clock()
+        kind = message.content_type
+        command = extract_command(message.text) if kind == "text" else None
+        if command is not None:
+            kind = "command"
+        if command in ESSENTIAL_COMMANDS:
+            return True
+        if not self.users.allow(user.id, now):
+            self.rejected.inc("throttled", kind)
+            return False
+        if command is not None:
+            low = not self.commands.allow((user.id, command), now)
+        else:
+            low = kind in LOW_PRIORITY_TYPES
+        if low and self.overloaded(now):
+            self.rejected.inc("shed", kind)
+            return False
+        return True
+
+    def filter(self, updates: List[types.Update]) -> List[types.Update]:
+        return [update for update in updates if self.admit(update)]
+
+    def wrap(self, process: Callable) -> Callable:
+        """``process`` behind admission; works for sync and async handlers alike."""
+
+        def admitted(updates):
+            return process(self.filter(updates))
+
+        return admitted
+
+    def stats(self) -> dict:
+        return {
+            f"{reason}:{kind}": count
+            for (reason, kind), count in sorted(self.rejected.values().items())
+        }
@@ -0,0 +1,104 @@
+import asyncio
+import functools
+from typing import Awaitable, Callable, Dict, Hashable, List, Optional
+from telebot import types
+from telebot.async_telebot import AsyncTeleBot
+from src.services.outbound import PRIORITY_NORMAL, AsyncOutboundScheduler
+
+
+CHAT_METHOD_PREFIXES = ("send_", "edit_message_", "copy_message", "forward_message", "delete_message")
+
+
+class KeyedSerializer:
+    """Runs coroutines one after another per key and concurrently across keys."""
+
+    def __init__(self):
+        self._tails: Dict[Hashable, asyncio.Task] = {}
+
+    def __len__(self) -> int:
+        return len(self._tails)
+
+    def submit(self, key: Hashable, make_call: Callable[[], Awaitable]) -> asyncio.Task:
+        task = asyncio.get_running_loop().create_task(
+            self._run(self._tails.get(key), make_call)
+        )
+        self._tails[key] = task
+        task.add_done_callback(lambda done: self._release(key, done))
+        return task
+
+    async def _run(self, previous, make_call):
+        if previous is not None:
+            await asyncio.wait([previous])
+        return await make_call()
+
+    def _release(self, key: Hashable, task: asyncio.Task):
+        if self._tails.get(key) is task:
+            del self._tails[key]
+
+    async def drain(self):
+        while self._tails:
+            await asyncio.wait(list(self._tails.values()))
+
+
+class OrderedAsyncTeleBot(AsyncTeleBot):
+    """AsyncTeleBot that never handles two updates from the same user at once."""
+
+    def __init__(self, token: str, **kwargs):
+        super().__init__(token, **kwargs)
+        self.update_order = KeyedSerializer()
+
+    async def process_new_updates(self, updates: List[types.Update]):
+        for update in updates:
+            message = update.message or update.edited_message
+            key = message.from_user.id if message and message.from_user else None
+            self.update_order.submit(
+                key, lambda update=update: super(
+                    OrderedAsyncTeleBot, self
+                ).process_new_updates([update])
+            )
+
+
+class AsyncBotFacade:
+    """Synchronous-looking front for an AsyncTeleBot that queues chat sends on ``sends``."""
+
+    def __init__(self, async_bot: AsyncTeleBot, sends: Optional[AsyncOutboundScheduler] = None):
+        self.async_bot = async_bot
+        self.sends = sends or AsyncOutboundScheduler()
+
+    def submit(
+        self, chat_id: int, make_call: Callable[[], Awaitable], priority: int = PRIORITY_NORMAL
+    ) -> asyncio.Future:
+        return self.sends.submit(chat_id, make_call, priority)
+
+    def message_handler(self, **kwargs):
+        return self._wrap(self.async_bot.message_handler(**kwargs))
+
+    def edited_message_handler(self, **kwargs):
+        return self._wrap(self.async_bot.edited_message_handler(**kwargs))
+
+    def _wrap(self, register):
+        def decorator(handler):
+            @functools.wraps(handler)
+            async def run(message):
+                handler(message)
+
+            register(run)
+            return handler
+
+        return decorator
+
+    def reply_to(self, message, text: str, **kwargs) -> asyncio.Future:
+        return self.submit(
+            message.chat.id,
+            lambda: self.async_bot.reply_to(message, text, **kwargs),
+        )
+
+    def __getattr__(self, name: str):
+        if not name.startswith(CHAT_METHOD_PREFIXES):
+            raise AttributeError(f"{type(self).__name__} only forwards chat sends, not {name!r}")
+        method = getattr(self.async_bot, name)
+
+        def call(chat_id, *args, **kwargs):
+            return self.submit(chat_id, lambda: method(chat_id, *args, **kwargs))
+
+        return call
@@ -0,0 +1,363 @@
+import heapq
+import json
+import os
+import struct
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from concurrent.futures import Future
+from typing import Callable, Dict, Iterable, Iterator, Optional, Set, Tuple
+from src.services.outbound import RateLimiter
+
+
+_RECORD = struct.Struct("<q")
+READ_CHUNK = 65536
+
+Send = Callable[[int, str], Future]
+
+
+class RecipientLog:
+    """Append-only file of user ids the bot may write to, with a sorted id index beside it."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.index_path = path + ".idx"
+        if not os.path.exists(path):
+            open(path, "wb").close()
+        self._file = open(path, "r+b")
+        size = os.path.getsize(path)
+        if size % _RECORD.size:
+            size -= size % _RECORD.size
+            self._file.truncate(size)
+        self._count = size // _RECORD.size
+        self._lock = threading.Lock()
+        self._ids, self._offsets = self._load_index()
+        self._added: Dict[int, int] = {
+            abs(user_id): index for index, user_id in self.records(len(self._ids))
+        }
+
+    def _load_index(self) -> Tuple[array, array]:
+        entries = array("q")
+        try:
+            with open(self.index_path, "rb") as f:
+                entries.frombytes(f.read())
+        except (OSError, ValueError):
+            return self._build_index()
+        if len(entries) % 2 or len(entries) // 2 > self._count:
+            return self._build_index()
+        return entries[0::2], entries[1::2]
+
+    def _build_index(self) -> Tuple[array, array]:
+        runs = []
+        chunk: list = []
+        for index, user_id in self.records():
+            chunk.append((abs(user_id), index))
+            if len(chunk) == READ_CHUNK:
+                runs.append(self._run(chunk))
+                chunk = []
+        if chunk:
+            runs.append(self._run(chunk))
+        return self._merge(*(zip(ids, offsets) for ids, offsets in runs))
+
+    @staticmethod
+    def _run(chunk: list) -> Tuple[array, array]:
+        chunk.sort()
+        return array("q", (entry[0] for entry in chunk)), array("q", (entry[1] for entry in chunk))
+
+    @staticmethod
+    def _merge(*sorted_entries) -> Tuple[array, array]:
+        ids, offsets = array("q"), array("q")
+        for user_id, index in heapq.merge(*sorted_entries):
+            ids.append(user_id)
+            offsets.append(index)
+        return ids, offsets
+
+    def _save_index(self):
+        if self._added:
+            self._ids, self._offsets = self._merge(
+                zip(self._ids, self._offsets), sorted(self._added.items())
+            )
+            self._added = {}
+        elif os.path.exists(self.index_path):
+            return
+        entries = array("q", bytes(16 * len(self._ids)))
+        entries[0::2] = self._ids
+        entries[1::2] = self._offsets
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(entries.tobytes())
+        os.replace(tmp_path, self.index_path)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _find(self, user_id: int) -> Optional[int]:
+        index = self._added.get(user_id)
+        if index is not None:
+            return index
+        position = bisect_left(self._ids, user_id)
+        if position < len(self._ids) and self._ids[position] == user_id:
+            return self._offsets[position]
+        return None
+
+    def _write(self, index: int, value: int):
+        self._file.seek(index * _RECORD.size)
+        self._file.write(_RECORD.pack(value))
+        self._file.flush()
+
+    def add(self, user_id: int):
+        """Lists ``user_id``, or lists them as active again after a block."""
+        with self._lock:
+            index = self._find(user_id)
+            if index is None:
+                self._write(self._count, user_id)
+                self._added[user_id] = self._count
+                self._count += 1
+                return
+            self._file.seek(index * _RECORD.size)
+            if _RECORD.unpack(self._file.read(_RECORD.size))[0] < 0:
+                self._write(index, user_id)
+
+    def extend(self, user_ids: Iterable[int]) -> int:
+        """Lists every id not listed yet in one append; returns how many were new."""
+        with self._lock:
+            new = array("q")
+            for user_id in user_ids:
+                if self._find(user_id) is None:
+                    self._added[user_id] = self._count + len(new)
+                    new.append(user_id)
+            if new:
+                self._file.seek(self._count * _RECORD.size)
+                self._file.write(new.tobytes())
+                self._file.flush()
+                self._count += len(new)
+            return len(new)
+
+    def deactivate(self, user_id: int):
+        with self._lock:
+            index = self._find(user_id)
+            if index is not None:
+                self._write(index, -user_id)
+
+    def records(self, start: int = 0, stop: Optional[int] = None) -> Iterator[Tuple[int, int]]:
+        """Yields ``(index, user_id)`` from disk a chunk at a time; blocked users come negated."""
+        stop = self._count if stop is None else stop
+        with open(self.path, "rb") as f:
+            f.seek(start * _RECORD.size)
+            index = start
+            while index < stop:
+                chunk = array("q")
+                data = f.read(min(READ_CHUNK, stop - index) * _RECORD.size)
+                chunk.frombytes(data[: len(data) - len(data) % _RECORD.size])
+                if not chunk:
+                    return
+                for user_id in chunk:
+                    yield index, user_id
+                    index += 1
+
+    def close(self):
+        with self._lock:
+            if self._file.closed:
+                return
+            self._file.close()
+            self._save_index()
+
+
+class Broadcaster:
+    """Sends one text to every listed user from a background thread, checkpointing progress."""
+
+    def __init__(
+        self,
+        recipients: RecipientLog,
+        send: Send,
+        path: str,
+        rate: float = 20.0,
+        window: int = 100,
+        checkpoint_interval: float = 1.0,
+        report_interval: float = 10.0,
+        on_done: Optional[Callable[[dict], None]] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.recipients = recipients
+        self.send = send
+        self.path = path
+        self.rate = rate
+        self.window = window
+        self.checkpoint_interval = checkpoint_interval
+        self.report_interval = report_interval
+        self.on_done = on_done
+        self.clock = clock
+        self.state: Optional[dict] = None
+        self._pending: Set[int] = set()
+        self._next = 0
+        self._delivered = 0
+        self._started = 0.0
+        self._slots = threading.Semaphore(window)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, text: str, admin_id: int = 0) -> bool:
+        if self.running:
+            return False
+        self.state = {
+            "text": text,
+            "admin": admin_id,
+            "total": len(self.recipients),
+            "offset": 0,
+            "sent": 0,
+            "blocked": 0,
+            "failed": 0,
+            "done": False,
+        }
+        self._run_thread()
+        return True
+
+    def resume(self) -> bool:
+        """Continues an unfinished broadcast found at ``path``."""
+        if self.running or not os.path.exists(self.path):
+            return False
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Error while reading broadcast checkpoint: {e}")
+            return False
+        if state.get("done"):
+            return False
+        self.state = state
+        print(f"Resuming broadcast at {state['offset']}/{state['total']}")
+        self._run_thread()
+        return True
+
+    def cancel(self) -> bool:
+        if not self.running:
+            return False
+        self.state["done"] = True
+        self.stop()
+        return True
+
+    def stop(self):
+        """Stops handing out messages and checkpoints; in-flight ones may be sent again later."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run_thread(self):
+        self._stop.clear()
+        self._pending.clear()
+        self._next = self.state["offset"]
+        self._delivered = 0
+        self._started = self.clock()
+        self._thread = threading.Thread(target=self._run, name="broadcast", daemon=True)
+        self._thread.start()
+
+    def progress(self) -> str:
+        state = self.state
+        if state is None:
+            return "No broadcast has run."
+        with self._lock:
+            done = self._next - len(self._pending)
+            elapsed = self.clock() - self._started
+            speed = self._delivered / elapsed if elapsed > 0 else 0.0
+        total = state["total"] or 1
+        return (
+            f"Broadcast {'finished' if state['done'] else 'running'}: {done}/{state['total']}"
+            f" ({done / total * 100:.1f}%), sent {state['sent']}, blocked {state['blocked']},"
+            f" failed {state['failed']}, {speed:.1f} msg/s"
+        )
+
+    def _acquire(self) -> bool:
+        while not self._slots.acquire(timeout=0.1):
+            if self._stop.is_set():
+                return False
+        return True
+
+    def _run(self):
+        text = self.state["text"]
+        limit = RateLimiter(self.rate)
+        saved = reported = self.clock()
+        for index, user_id in self.recipients.records(self.state["offset"], self.state["total"]):
+            if user_id <= 0:
+                with self._lock:
+                    self._next = index + 1
+                continue
+            if not self._acquire():
+                break
+            delay = limit.delay(None, self.clock())
+            if delay > 0 and self._stop.wait(delay):
+                self._slots.release()
+                break
+            limit.consume(None, self.clock())
+            with self._lock:
+                self._next = index + 1
+                self._pending.add(index)
+            self._submit(index, user_id, text)
+
+            now = self.clock()
+            if now - saved >= self.checkpoint_interval:
+                self._checkpoint()
+                saved = now
+            if now - reported >= self.report_interval:
+                print(self.progress())
+                reported = now
+
+        finished = not self._stop.is_set()
+        if finished:
+            with self._lock:
+                self._next = self.state["total"]
+            acquired = 0
+            while acquired < self.window and self._acquire():
+                acquired += 1
+            for _ in range(acquired):
+                self._slots.release()
+            finished = acquired == self.window
+            self.state["done"] = self.state["done"] or finished
+        self._checkpoint()
+        if finished:
+            print(self.progress())
+            if self.on_done is not None:
+                self.on_done(self.state)
+
+    def _submit(self, index: int, user_id: int, text: str):
+        try:
+            future = self.send(user_id, text)
+        except Exception as e:
+            future = Future()
+            future.set_exception(e)
+        future.add_done_callback(lambda done: self._finished(index, user_id, done))
+
+    def _finished(self, index: int, user_id: int, future: Future):
+        error = future.exception()
+        if error is not None and getattr(error, "error_code", None) == 403:
+            self.recipients.deactivate(user_id)
+        with self._lock:
+            self._pending.discard(index)
+            if error is None:
+                self.state["sent"] += 1
+                self._delivered += 1
+            elif getattr(error, "error_code", None) == 403:
+                self.state["blocked"] += 1
+            else:
+                self.state["failed"] += 1
+        self._slots.release()
+
+    def checkpoint(self):
+        """Saves progress of a stopped broadcast once its in-flight sends have settled."""
+        if self.state is not None and not self.running:
+            self._checkpoint()
+
+    def _checkpoint(self):
+        with self._lock:
+            self.state["offset"] = min(self._pending) if self._pending else self._next
+            data = json.dumps(self.state)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(data)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,107 @@
+import random
+import time
+from typing import Callable, Dict, Optional
+import numpy as np
+from src.services.match_queue import MatchQueue
+
+
+class ColumnarMatchQueue(MatchQueue):
+    """MatchQueue that also keeps its waiters as dense NumPy columns for one-pass partner search."""
+
+    def __init__(
+        self,
+        rng: Optional[random.Random] = None,
+        clock: Callable[[], float] = time.monotonic,
+        capacity: int = 1024,
+    ):
+        super().__init__(rng, clock)
+        self._rows: Dict[int, int] = {}
+        self._room_codes: Dict[str, int] = {}
+        self._gender_codes: Dict[str, int] = {}
+        self._user_col = np.empty(capacity, np.int64)
+        self._room_col = np.empty(capacity, np.int32)
+        self._gender_col = np.empty(capacity, np.int32)
+        self._age_col = np.empty(capacity, np.int32)
+        self._seq_col = np.empty(capacity, np.int64)
+
+    def _columns(self):
+        return (
+            self._user_col,
+            self._room_col,
+            self._gender_col,
+            self._age_col,
+            self._seq_col,
+        )
+
+    def _grow(self):
+        capacity = 2 * len(self._user_col)
+        (
+            self._user_col,
+            self._room_col,
+            self._gender_col,
+            self._age_col,
+            self._seq_col,
+        ) = (np.resize(column, capacity) for column in self._columns())
+
+    def add(self, user_id: int, room: str, gender: str, age: int):
+        super().add(user_id, room, gender, age)
+        row = len(self._rows)
+        if row == len(self._user_col):
+            self._grow()
+        self._rows[user_id] = row
+        self._user_col[row] = user_id
+        self._room_col[row] = self._room_codes.setdefault(room, len(self._room_codes))
+        self._gender_col[row] = self._gender_codes.setdefault(gender, len(self._gender_codes))
+        self._age_col[row] = age
+        self._seq_col[row] = self.position(user_id)
+
+    def remove(self, user_id: int) -> bool:
+        if not super().remove(user_id):
+            return False
+        row = self._rows.pop(user_id)
+        last = len(self._rows)
+        if row != last:
+            for column in self._columns():
+                column[row] = column[last]
+            self._rows[int(self._user_col[row])] = row
+        return True
+
+    def _window(self, room: str, age: int, window: Optional[int] = None) -> np.ndarray:
+        count = len(self._rows)
+        room_code = self._room_codes.get(room)
+        if room_code is None:
+            return np.zeros(count, bool)
+        return (self._room_col[:count] == room_code) & (
+            np.abs(self._age_col[:count] - age) <= (self.AGE_WINDOW if window is None else window)
+        )
+
+    def find_partner(
+        self,
+        room: str,
+        gender: str,
+        age: int,
+        window: Optional[int] = None,
+        same_gender_chance: Optional[float] = None,
+        exclude: Optional[int] = None,
+    ) -> Optional[int]:
+        if same_gender_chance is None:
+            same_gender_chance = self.SAME_GENDER_CHANCE
+        count = len(self._rows)
+        window = self._window(room, age, window)
+        if exclude is not None:
+            window &= self._user_col[:count] != exclude
+        gender_code = self._gender_codes.get(gender, -1)
+        same = self._gender_col[:count] == gender_code
+        seqs = self._seq_col[:count]
+
+        opposite = np.flatnonzero(window & ~same)
+        opposite_row = opposite[np.argmin(seqs[opposite])] if len(opposite) else None
+
+        rows = np.flatnonzero(window & same)
+        if opposite_row is not None:
+            rows = rows[seqs[rows] < seqs[opposite_row]]
+        for row in rows[np.argsort(seqs[rows])]:
+            if self._rng.random() < same_gender_chance:
+                return int(self._user_col[row])
+
+        return int(self._user_col[opposite_row]) if opposite_row is not None else None
@@ -0,0 +1,241 @@
+from typing import Callable, Dict, List, Optional
+from telebot import TeleBot, types
+from telebot.apihelper import ApiTelegramException
+
+
+Forwarder = Callable[..., object]
+Editor = Callable[..., object]
+
+
+def copy_forwarder(bot: TeleBot, message, receiver_id: int, **kwargs):
+    return bot.copy_message(receiver_id, message.chat.id, message.message_id, **kwargs)
+
+
+def _resend_file(method: str, field: str, captioned: bool = True) -> Forwarder:
+    if captioned:
+        def forwarder(bot, message, receiver_id, **kwargs):
+            return getattr(bot, method)(
+                receiver_id,
+                getattr(message, field).file_id,
+                caption=message.caption,
+                caption_entities=message.caption_entities,
+                **kwargs,
+            )
+    else:
+        def forwarder(bot, message, receiver_id, **kwargs):
+            return getattr(bot, method)(
+                receiver_id, getattr(message, field).file_id, **kwargs
+            )
+
+    return forwarder
+
+
+def _resend_text(bot: TeleBot, message, receiver_id: int, **kwargs):
+    return bot.send_message(receiver_id, message.text, entities=message.entities, **kwargs)
+
+
+def _resend_photo(bot: TeleBot, message, receiver_id: int, **kwargs):
+    return bot.send_photo(
+        receiver_id,
+        message.photo[-1].file_id,
+        caption=message.caption,
+        caption_entities=message.caption_entities,
+        **kwargs,
+    )
+
+
+def _resend_location(bot: TeleBot, message, receiver_id: int, **kwargs):
+    location = message.location
+    return bot.send_location(
+        receiver_id,
+        latitude=location.latitude,
+        longitude=location.longitude,
+        horizontal_accuracy=location.horizontal_accuracy,
+        live_period=location.live_period,
+        **kwargs,
+    )
+
+
+def _resend_contact(bot: TeleBot, message, receiver_id: int, **kwargs):
+    contact = message.contact
+    return bot.send_contact(
+        receiver_id,
+        phone_number=contact.phone_number,
+        first_name=contact.first_name,
+        last_name=contact.last_name,
+        **kwargs,
+    )
+
+
+def _resend_venue(bot: TeleBot, message, receiver_id: int, **kwargs):
+    venue = message.venue
+    return bot.send_venue(
+        receiver_id,
+        latitude=venue.location.latitude,
+        longitude=venue.location.longitude,
+        title=venue.title,
+        address=venue.address,
+        foursquare_id=venue.foursquare_id,
+        foursquare_type=venue.foursquare_type,
+        **kwargs,
+    )
+
+
+def _resend_poll(bot: TeleBot, message, receiver_id: int, **kwargs):
+    poll = message.poll
+    return bot.send_poll(
+        receiver_id,
+        question=poll.question,
+        options=[option.text for option in poll.options],
+        is_anonymous=poll.is_anonymous,
+        type=poll.type,
+        allows_multiple_answers=poll.allows_multiple_answers,
+        correct_option_id=getattr(poll, "correct_option_id", None),
+        explanation=getattr(poll, "explanation", None),
+        explanation_entities=getattr(poll, "explanation_entities", None),
+        open_period=poll.open_period,
+        close_date=poll.close_date,
+        **kwargs,
+    )
+
+
+def _resend_dice(bot: TeleBot, message, receiver_id: int, **kwargs):
+    return bot.send_dice(receiver_id, emoji=message.dice.emoji, **kwargs)
+
+
+def _edit_text(bot: TeleBot, message, receiver_id: int, partner_message_id: int):
+    return bot.edit_message_text(
+        message.text,
+        chat_id=receiver_id,
+        message_id=partner_message_id,
+        entities=message.entities,
+    )
+
+
+def _edit_caption(bot: TeleBot, message, receiver_id: int, partner_message_id: int):
+    return bot.edit_message_caption(
+        message.caption or "",
+        chat_id=receiver_id,
+        message_id=partner_message_id,
+        caption_entities=message.caption_entities,
+    )
+
+
+def _edit_media(input_media, field: str) -> Editor:
+    def editor(bot, message, receiver_id, partner_message_id):
+        media = getattr(message, field)
+        file_id = media[-1].file_id if isinstance(media, list) else media.file_id
+        return bot.edit_message_media(
+            input_media(
+                file_id,
+                caption=message.caption,
+                caption_entities=message.caption_entities,
+            ),
+            chat_id=receiver_id,
+            message_id=partner_message_id,
+        )
+
+    return editor
+
+
+class ForwarderRegistry:
+    """Maps a content type to its forwarder, with a fallback when the Bot API rejects the copy."""
+
+    def __init__(self):
+        self._forwarders: Dict[str, Forwarder] = {}
+        self._fallbacks: Dict[str, Forwarder] = {}
+        self._editors: Dict[str, Editor] = {}
+
+    def register(
+        self,
+        content_type: str,
+        forwarder: Forwarder = copy_forwarder,
+        fallback: Optional[Forwarder] = None,
+    ):
+        self._forwarders[content_type] = forwarder
+        if fallback is not None:
+            self._fallbacks[content_type] = fallback
+        else:
+            self._fallbacks.pop(content_type, None)
+
+    def register_editor(self, content_type: str, editor: Editor):
+        self._editors[content_type] = editor
+
+    def editable_types(self) -> List[str]:
+        return list(self._editors)
+
+    def edit(self, bot: TeleBot, message, receiver_id: int, partner_message_id: int):
+        editor = self._editors[message.content_type]
+        return editor(bot, message, receiver_id, partner_message_id)
+
+    def __contains__(self, content_type: str) -> bool:
+        return content_type in self._forwarders
+
+    def content_types(self) -> List[str]:
+        return list(self._forwarders)
+
+    def forward(self, bot: TeleBot, message, receiver_id: int, **kwargs):
+        forwarder = self._forwarders[message.content_type]
+        try:
+            return forwarder(bot, message, receiver_id, **kwargs)
+        except ApiTelegramException as e:
+            fallback = self._fallbacks.get(message.content_type)
+            if fallback is None or e.error_code != 400:
+                raise
+            return fallback(bot, message, receiver_id, **kwargs)
+
+    async def forward_async(self, bot, message, receiver_id: int, **kwargs):
+        forwarder = self._forwarders[message.content_type]
+        try:
+            return await forwarder(bot, message, receiver_id, **kwargs)
+        except Exception as e:
+            fallback = self._fallbacks.get(message.content_type)
+            if fallback is None or getattr(e, "error_code", None) != 400:
+                raise
+            return await fallback(bot, message, receiver_id, **kwargs)
+
+
+RESENDERS: Dict[str, Forwarder] = {
+    "text": _resend_text,
+    "audio": _resend_file("send_audio", "audio"),
+    "document": _resend_file("send_document", "document"),
+    "photo": _resend_photo,
+    "sticker": _resend_file("send_sticker", "sticker", captioned=False),
+    "video": _resend_file("send_video", "video"),
+    "video_note": _resend_file("send_video_note", "video_note", captioned=False),
+    "voice": _resend_file("send_voice", "voice"),
+    "location": _resend_location,
+    "contact": _resend_contact,
+    "venue": _resend_venue,
+    "dice": _resend_dice,
+    "poll": _resend_poll,
+    "animation": _resend_file("send_animation", "animation"),
+}
+
+
+EDITORS: Dict[str, Editor] = {
+    "text": _edit_text,
+    "audio": _edit_media(types.InputMediaAudio, "audio"),
+    "document": _edit_media(types.InputMediaDocument, "document"),
+    "photo": _edit_media(types.InputMediaPhoto, "photo"),
+    "video": _edit_media(types.InputMediaVideo, "video"),
+    "voice": _edit_caption,
+    "animation": _edit_media(types.InputMediaAnimation, "animation"),
+}
+
+
+def reply_parameters(partner_message_id: int) -> Dict[str, types.ReplyParameters]:
+    return {
+        "reply_parameters": types.ReplyParameters(
+            partner_message_id, allow_sending_without_reply=True
+        )
+    }
+
+
+def build_default_registry() -> ForwarderRegistry:
+    registry = ForwarderRegistry()
+    for content_type, resender in RESENDERS.items():
+        registry.register(content_type, copy_forwarder, fallback=resender)
+    for content_type, editor in EDITORS.items():
+        registry.register_editor(content_type, editor)
+    return registry
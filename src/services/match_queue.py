@@ -0,0 +1,279 @@
+from collections import OrderedDict
+from itertools import count, takewhile
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple
+import heapq
+import random
+import time
+
+
+BucketKey = Tuple[str, str, int]
+
+
+class MatchQueue:
+    """Waiting pool bucketed by (room, gender, age); each bucket is FIFO."""
+
+    AGE_WINDOW = 10
+    SAME_GENDER_CHANCE = 0.3
+    AGE_PENALTY = 0.5
+    WAIT_BONUS = 0.5
+    WAIT_HORIZON = 300.0
+    RELAX_AFTER = 30.0
+    RELAX_STEP = 30.0
+    AGE_STEP = 2
+    MAX_AGE_WINDOW = 20
+    GENDER_STEP = 0.2
+
+    def __init__(
+        self,
+        rng: Optional[random.Random] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self._buckets: Dict[BucketKey, "OrderedDict[int, int]"] = {}
+        self._index: Dict[int, BucketKey] = {}
+        self._since: Dict[int, float] = {}
+        self._room_sizes: Dict[str, int] = {}
+        self._genders: Set[str] = set()
+        self._fallback: Set[int] = set()
+        self._seq = count()
+        self._rng = rng or random.Random()
+        self._clock = clock
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self._index
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(sorted(self._index, key=self.position))
+
+    def add(self, user_id: int, room: str, gender: str, age: int):
+        self.remove(user_id)
+        key = (room, gender, age)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = OrderedDict()
+        bucket[user_id] = next(self._seq)
+        self._index[user_id] = key
+        self._since[user_id] = self._clock()
+        self._room_sizes[room] = self._room_sizes.get(room, 0) + 1
+        self._genders.add(gender)
+
+    def remove(self, user_id: int) -> bool:
+        key = self._index.pop(user_id, None)
+        if key is None:
+            return False
+        del self._since[user_id]
+        self._fallback.discard(user_id)
+        bucket = self._buckets[key]
+        del bucket[user_id]
+        if not bucket:
+            del self._buckets[key]
+        self._room_sizes[key[0]] -= 1
+        return True
+
+    def entries(self) -> List[Tuple[int, str, str, int]]:
+        """(user_id, room, gender, age) for every waiter, oldest first."""
+        waiting = sorted(
+            (seq, user_id, key)
+            for key, bucket in self._buckets.items()
+            for user_id, seq in bucket.items()
+        )
+        return [(user_id, *key) for _, user_id, key in waiting]
+
+    def position(self, user_id: int) -> int:
+        return self._buckets[self._index[user_id]][user_id]
+
+    def room_sizes(self) -> Dict[str, int]:
+        return dict(self._room_sizes)
+
+    def _heads(
+        self,
+        room: str,
+        gender: str,
+        age: int,
+        window: Optional[int] = None,
+    ) -> List[Tuple[int, int]]:
+        window = self.AGE_WINDOW if window is None else window
+        heads = []
+        for candidate_age in range(age - window, age + window + 1):
+            bucket = self._buckets.get((room, gender, candidate_age))
+            if bucket:
+                user_id, seq = next(iter(bucket.items()))
+                heads.append((seq, user_id))
+        heads.sort()
+        return heads
+
+    def _candidates(
+        self,
+        room: str,
+        gender: str,
+        age: int,
+        window: Optional[int] = None,
+        exclude: Optional[int] = None,
+    ) -> Iterator[Tuple[int, int]]:
+        """(seq, user_id) of every waiter of ``gender`` in the age window, oldest first."""
+        window = self.AGE_WINDOW if window is None else window
+        buckets = []
+        for candidate_age in range(age - window, age + window + 1):
+            bucket = self._buckets.get((room, gender, candidate_age))
+            if bucket:
+                buckets.append(bucket.items())
+        for user_id, seq in heapq.merge(*buckets, key=lambda item: item[1]):
+            if user_id != exclude:
+                yield seq, user_id
+
+    def find_partner(
+        self,
+        room: str,
+        gender: str,
+        age: int,
+        window: Optional[int] = None,
+        same_gender_chance: Optional[float] = None,
+        exclude: Optional[int] = None,
+    ) -> Optional[int]:
+        if same_gender_chance is None:
+            same_gender_chance = self.SAME_GENDER_CHANCE
+        opposite = None
+        for other in self._genders:
+            if other == gender:
+                continue
+            heads = self._heads(room, other, age, window)
+            if heads and (opposite is None or heads[0] < opposite):
+                opposite = heads[0]
+
+        for seq, user_id in self._candidates(room, gender, age, window, exclude):
+            if opposite is not None and seq > opposite[0]:
+                break
+            if self._rng.random() < same_gender_chance:
+                return user_id
+
+        return opposite[1] if opposite is not None else None
+
+    def match(self, user_id: int, room: str, gender: str, age: int) -> Optional[int]:
+        self.remove(user_id)
+        partner_id = self.find_partner(room, gender, age)
+        if partner_id is None:
+            self.add(user_id, room, gender, age)
+            return None
+        self.remove(partner_id)
+        return partner_id
+
+    def score(self, a: BucketKey, b: BucketKey, waited: float) -> float:
+        """Pair quality: opposite genders, close ages and long waits score higher."""
+        weight = 1.0 if a[1] != b[1] else self.SAME_GENDER_CHANCE
+        weight -= self.AGE_PENALTY * abs(a[2] - b[2]) / self.AGE_WINDOW
+        return weight + self.WAIT_BONUS * min(waited, self.WAIT_HORIZON) / self.WAIT_HORIZON
+
+    def _pair_heads(self, a: BucketKey, b: BucketKey) -> Optional[Tuple[int, int]]:
+        bucket = self._buckets.get(a)
+        if not bucket:
+            return None
+        if a == b:
+            if len(bucket) < 2:
+                return None
+            users = iter(bucket)
+            return next(users), next(users)
+        other = self._buckets.get(b)
+        if not other:
+            return None
+        return next(iter(bucket)), next(iter(other))
+
+    def match_round(self, now: Optional[float] = None) -> List[Tuple[int, int]]:
+        """Pairs as much of the pool as it can at once and removes the pairs.
+
+        This is the greedy maximum-weight matching over every compatible
+        pair in a room, best ``score`` first. Users in one bucket only
+        differ by how long they waited, so the best pair between two buckets
+        is always their two heads; the heap holds one entry per pair of
+        buckets and the round costs O(buckets * age window + pairs) heap
+        operations however many users wait.
+        """
+        if now is None:
+            now = self._clock()
+        since = self._since
+        heap = []
+        for a in self._buckets:
+            room, _, age = a
+            for gender in self._genders:
+                for other_age in range(age - self.AGE_WINDOW, age + self.AGE_WINDOW + 1):
+                    b = (room, gender, other_age)
+                    if b >= a and b in self._buckets:
+                        heap.append((-self.score(a, b, self.WAIT_HORIZON), a, b))
+        heapq.heapify(heap)
+
+        pairs = []
+        while heap:
+            bound, a, b = heapq.heappop(heap)
+            heads = self._pair_heads(a, b)
+            if heads is None:
+                continue
+            user_id, partner_id = heads
+            weight = self.score(a, b, 2 * now - since[user_id] - since[partner_id])
+            if weight <= 0:
+                continue
+            if weight < -bound:
+                heapq.heappush(heap, (-weight, a, b))
+                continue
+            self.remove(user_id)
+            self.remove(partner_id)
+            pairs.append((user_id, partner_id))
+            heapq.heappush(heap, (-weight, a, b))
+        return pairs
+
+    def relaxed(self, waited: float) -> Tuple[int, float]:
+        """Age window and same-gender chance for someone who has waited ``waited`` seconds.
+
+        Both start widening after ``RELAX_AFTER`` seconds, by one step every
+        ``RELAX_STEP`` seconds, up to ``MAX_AGE_WINDOW`` and certainty.
+        """
+        if waited < self.RELAX_AFTER:
+            return self.AGE_WINDOW, self.SAME_GENDER_CHANCE
+        steps = int((waited - self.RELAX_AFTER) // self.RELAX_STEP) + 1
+        return (
+            min(self.AGE_WINDOW + self.AGE_STEP * steps, self.MAX_AGE_WINDOW),
+            min(1.0, self.SAME_GENDER_CHANCE + self.GENDER_STEP * steps),
+        )
+
+    def long_waiters(
+        self, min_wait: float, now: Optional[float] = None
+    ) -> List[Tuple[int, str, float]]:
+        """(user_id, room, seconds waited) for everyone waiting ``min_wait`` or longer, oldest first."""
+        if now is None:
+            now = self._clock()
+        waiting = takewhile(lambda item: now - item[1] >= min_wait, self._since.items())
+        return [(user_id, self._index[user_id][0], now - since) for user_id, since in waiting]
+
+    def allow_fallback(self, user_id: int):
+        """Lets ``rematch`` also look in the fallback room for ``user_id``."""
+        if user_id in self._index:
+            self._fallback.add(user_id)
+
+    def rematch(
+        self, now: Optional[float] = None, fallback_room: Optional[str] = None
+    ) -> List[Tuple[int, int]]:
+        """Retries long waiters, oldest first, with ``relaxed`` criteria; removes the pairs.
+
+        Waiters who allowed it are also tried against ``fallback_room``
+        when nobody fits in their own room.
+        """
+        if now is None:
+            now = self._clock()
+        pairs = []
+        for user_id, room, waited in self.long_waiters(self.RELAX_AFTER, now):
+            key = self._index.get(user_id)
+            if key is None:
+                continue
+            _, gender, age = key
+            window, chance = self.relaxed(waited)
+            rooms = [room]
+            if fallback_room is not None and fallback_room != room and user_id in self._fallback:
+                rooms.append(fallback_room)
+            for candidate_room in rooms:
+                partner_id = self.find_partner(candidate_room, gender, age, window, chance, user_id)
+                if partner_id is not None:
+                    self.remove(user_id)
+                    self.remove(partner_id)
+                    pairs.append((user_id, partner_id))
+                    break
+        return pairs
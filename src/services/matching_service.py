@@ -1,19 +1,22 @@
-from typing import Dict, List
+from typing import Dict
 from telebot import TeleBot
+from src.models.profile_table import ProfileTable
 from src.models.user import UserSettings
 from src.models.states import UserState
+from src.services.match_queue import MatchQueue
 from src.utils.helpers import hash_id
-import random
 
 
 class MatchingService:
     def __init__(self, bot: TeleBot):
         self.bot = bot
         self.user_states: Dict[int, UserState] = {}
-        self.user_settings: Dict[str, UserSettings] = {}
         self.active_chats: Dict[int, int] = {}
-        self.waiting_users: List[int] = []
+        self.waiting_users = MatchQueue()
+        # Same room and ages within 10 years, any gender: the oldest compatible waiter wins.
+        self.waiting_users.SAME_GENDER_CHANCE = 1.0
         self.rooms = ["general", "movies", "books", "gaming", "music"]
+        self.user_settings = ProfileTable(self.rooms)
 
     def start_setup(self, user_id: int, message):
         hashed_id = hash_id(user_id)
@@ -43,40 +46,25 @@ class MatchingService:
             return
 
         self.user_states[user_id] = UserState.WAITING
-        self.waiting_users.append(user_id)
         self.bot.reply_to(message, "Looking for a chat partner...")
 
-        self._try_match_users()
+        self._try_match_users(user_id, self.user_settings[hashed_id])
 
-    def _try_match_users(self):
-        if len(self.waiting_users) < 2:
+    def _try_match_users(self, user_id: int, settings):
+        partner_id = self.waiting_users.match(
+            user_id, settings.room, settings.gender, settings.age
+        )
+        if partner_id is None:
             return
 
-        user1 = self.waiting_users.pop(0)
-        for i, user2 in enumerate(self.waiting_users):
-            if self._is_good_match(user1, user2):
-                self.waiting_users.pop(i)
+        self.active_chats[user_id] = partner_id
+        self.active_chats[partner_id] = user_id
 
-                self.active_chats[user1] = user2
-                self.active_chats[user2] = user1
+        self.user_states[user_id] = UserState.CHATTING
+        self.user_states[partner_id] = UserState.CHATTING
 
-                self.user_states[user1] = UserState.CHATTING
-                self.user_states[user2] = UserState.CHATTING
-
-                self.bot.send_message(user1, "Chat partner found! Start chatting.")
-                self.bot.send_message(user2, "Chat partner found! Start chatting.")
-                break
-
-    def _is_good_match(self, user1: int, user2: int) -> bool:
-        user1_hash = hash_id(user1)
-        user2_hash = hash_id(user2)
-
-        settings1 = self.user_settings[user1_hash]
-        settings2 = self.user_settings[user2_hash]
-
-        if settings1.room != settings2.room:
-            return False
-        return abs(settings1.age - settings2.age) <= 10
+        self.bot.send_message(partner_id, "Chat partner found! Start chatting.")
+        self.bot.send_message(user_id, "Chat partner found! Start chatting.")
 
     def end_chat(self, user_id: int, message):
         partner_id = self.active_chats.pop(user_id, None)
@@ -0,0 +1,128 @@
+import heapq
+import threading
+import time
+from itertools import count
+from typing import Callable, Dict, List, Optional, Tuple
+from telebot import types
+
+
+ALBUM_CONTENT_TYPES = {"photo", "video", "document", "audio"}
+
+_INPUT_MEDIA = {
+    "photo": (types.InputMediaPhoto, lambda message: message.photo[-1].file_id),
+    "video": (types.InputMediaVideo, lambda message: message.video.file_id),
+    "document": (types.InputMediaDocument, lambda message: message.document.file_id),
+    "audio": (types.InputMediaAudio, lambda message: message.audio.file_id),
+}
+
+
+def input_media(message):
+    media_type, file_id = _INPUT_MEDIA[message.content_type]
+    return media_type(
+        file_id(message),
+        caption=message.caption,
+        caption_entities=message.caption_entities,
+    )
+
+
+class TimerThread:
+    """One daemon thread running callbacks after a delay, earliest first."""
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self.clock = clock
+        self._heap: List[Tuple[float, int, Callable[[], None]]] = []
+        self._seq = count()
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+    def call_later(self, delay: float, callback: Callable[[], None]):
+        with self._cond:
+            heapq.heappush(self._heap, (self.clock() + delay, next(self._seq), callback))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._heap or self._heap[0][0] > self.clock():
+                    timeout = self._heap[0][0] - self.clock() if self._heap else None
+                    self._cond.wait(timeout)
+                _, _, callback = heapq.heappop(self._heap)
+            try:
+                callback()
+            except Exception as e:
+                print(f"Error in timer callback: {e}")
+
+
+class _Album:
+    __slots__ = ("receiver_id", "messages", "last_added")
+
+    def __init__(self, receiver_id: int):
+        self.receiver_id = receiver_id
+        self.messages: list = []
+        self.last_added = 0.0
+
+
+class MediaGroupBuffer:
+    """Collects album items per (sender, media_group_id) and flushes them once."""
+
+    MAX_ITEMS = 10
+
+    def __init__(
+        self,
+        flush: Callable[[int, int, list], None],
+        window: float = 0.5,
+        call_later: Optional[Callable[[float, Callable[[], None]], object]] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.flush = flush
+        self.window = window
+        self.clock = clock
+        self._call_later = call_later or TimerThread(clock).call_later
+        self._albums: Dict[Tuple[int, str], _Album] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._albums)
+
+    def add(self, sender_id: int, receiver_id: int, message):
+        key = (sender_id, message.media_group_id)
+        with self._lock:
+            album = self._albums.get(key)
+            if album is None:
+                album = self._albums[key] = _Album(receiver_id)
+            album.messages.append(message)
+            album.last_added = self.clock()
+            complete = len(album.messages) >= self.MAX_ITEMS
+            if complete:
+                del self._albums[key]
+
+        if complete:
+            self._flush(sender_id, album)
+        else:
+            self._call_later(self.window, lambda: self._expire(key))
+
+    def _expire(self, key: Tuple[int, str]):
+        with self._lock:
+            album = self._albums.get(key)
+            if album is None:
+                return
+            remaining = album.last_added + self.window - self.clock()
+            if remaining <= 0:
+                del self._albums[key]
+        if remaining > 0:
+            self._call_later(remaining, lambda: self._expire(key))
+        else:
+            self._flush(key[0], album)
+
+    def _flush(self, sender_id: int, album: _Album):
+        album.messages.sort(key=lambda message: message.message_id)
+        self.flush(sender_id, album.receiver_id, album.messages)
+
+    def flush_all(self):
+        with self._lock:
+            albums, self._albums = self._albums, {}
+        for (sender_id, _), album in albums.items():
+            self._flush(sender_id, album)
@@ -1,11 +1,18 @@
 from telebot import TeleBot
+from src.services.forwarding import ForwarderRegistry, build_default_registry
 from src.services.matching_service import MatchingService
 
 
 class MessageService:
-    def __init__(self, bot: TeleBot, matching_service: MatchingService):
+    def __init__(
+        self,
+        bot: TeleBot,
+        matching_service: MatchingService,
+        forwarders: ForwarderRegistry = None,
+    ):
         self.bot = bot
         self.matching_service = matching_service
+        self.forwarders = forwarders or build_default_registry()
 
     def forward_message(self, user_id: int, message):
         partner_id = self.matching_service.active_chats.get(user_id)
@@ -13,16 +20,11 @@ class MessageService:
             self.bot.reply_to(message, "You are not in an active chat.")
             return
 
+        if message.content_type not in self.forwarders:
+            self.bot.reply_to(message, "Unsupported content type.")
+            return
+
         try:
-            if message.content_type == "text":
-                self.bot.send_message(partner_id, message.text)
-            elif message.content_type == "photo":
-                self.bot.send_photo(partner_id, message.photo[-1].file_id)
-            elif message.content_type == "video":
-                self.bot.send_video(partner_id, message.video.file_id)
-            elif message.content_type == "voice":
-                self.bot.send_voice(partner_id, message.voice.file_id)
-            else:
-                self.bot.reply_to(message, "Unsupported content type.")
+            self.forwarders.forward(self.bot, message, partner_id)
         except Exception as e:
             self.bot.reply_to(message, f"Error forwarding message: {e}")
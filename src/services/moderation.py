@@ -0,0 +1,183 @@
+import json
+import os
+import threading
+import unicodedata
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+
+LINK_ENTITIES = {"url", "text_link"}
+
+
+def normalize(text: str) -> str:
+    """NFKC then casefold, so full-width, ligature and case variants match alike."""
+    return unicodedata.normalize("NFKC", text).casefold()
+
+
+class PhraseMatcher:
+    """Aho–Corasick automaton over normalized phrases; alphanumeric phrase edges match at word boundaries only."""
+
+    def __init__(self, phrases: Iterable[str]):
+        self.phrases: List[str] = []
+        self._goto: List[Dict[str, int]] = [{}]
+        self._output: List[int] = [-1]
+        for phrase in phrases:
+            phrase = normalize(phrase.strip())
+            if phrase:
+                self._insert(phrase)
+        self._edges = [(p[0].isalnum(), p[-1].isalnum()) for p in self.phrases]
+        self._fail = [0] * len(self._goto)
+        self._next_output = [0] * len(self._goto)
+        self._link()
+
+    def __len__(self) -> int:
+        return len(self.phrases)
+
+    def _insert(self, phrase: str):
+        state = 0
+        for char in phrase:
+            following = self._goto[state].get(char)
+            if following is None:
+                following = self._goto[state][char] = len(self._goto)
+                self._goto.append({})
+                self._output.append(-1)
+            state = following
+        if self._output[state] < 0:
+            self._output[state] = len(self.phrases)
+            self.phrases.append(phrase)
+
+    def _link(self):
+        goto, fail, output, next_output = self._goto, self._fail, self._output, self._next_output
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, following in goto[state].items():
+                queue.append(following)
+                fallback = fail[state]
+                while fallback and char not in goto[fallback]:
+                    fallback = fail[fallback]
+                target = goto[fallback].get(char, 0)
+                fail[following] = target if target != following else 0
+                next_output[following] = (
+                    fail[following] if output[fail[following]] >= 0 else next_output[fail[following]]
+                )
+
+    def search(self, text: str) -> Optional[str]:
+        """The first phrase found in already normalized ``text``, or None."""
+        goto, fail, output, next_output = self._goto, self._fail, self._output, self._next_output
+        state = 0
+        for end, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            found = state if output[state] >= 0 else next_output[state]
+            while found:
+                phrase = output[found]
+                if self._bounded(text, end, phrase):
+                    return self.phrases[phrase]
+                found = next_output[found]
+        return None
+
+    def _bounded(self, text: str, end: int, phrase: int) -> bool:
+        starts_word, ends_word = self._edges[phrase]
+        start = end - len(self.phrases[phrase]) + 1
+        if starts_word and start > 0 and text[start - 1].isalnum():
+            return False
+        if ends_word and end + 1 < len(text) and text[end + 1].isalnum():
+            return False
+        return True
+
+
+class RuleSet:
+    def __init__(self, phrases: Sequence[str] = (), links: bool = False):
+        self.matcher = PhraseMatcher(phrases)
+        self.links = links
+
+
+class Moderator:
+    """Banned phrases and links for forwarded text, for all rooms and per room, reloaded from a JSON file."""
+
+    def __init__(self, path: str, rooms: Sequence[str], reload_interval: float = 5.0):
+        self.path = path
+        self.rooms = rooms
+        self.reload_interval = reload_interval
+        self._rules: Tuple[RuleSet, Dict[str, RuleSet]] = (RuleSet(), {})
+        self._mtime: Optional[float] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def active(self) -> bool:
+        common, rooms = self._rules
+        return bool(len(common.matcher) or common.links or rooms)
+
+    @property
+    def per_room(self) -> bool:
+        return bool(self._rules[1])
+
+    def load(self) -> bool:
+        """Rebuilds the rules if the file changed since the last load."""
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            mtime = None
+        if mtime == self._mtime:
+            return False
+        self._mtime = mtime
+        if mtime is None:
+            self._rules = (RuleSet(), {})
+            return True
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                config = json.load(f)
+            common = self._rule_set(config.get("all", {}))
+            rooms = {}
+            for room, rules in config.get("rooms", {}).items():
+                if room not in self.rooms:
+                    print(f"Moderation rules for unknown room {room!r} ignored")
+                    continue
+                rooms[room] = self._rule_set(rules)
+        except (OSError, ValueError, TypeError, AttributeError) as e:
+            print(f"Error while loading moderation rules: {e}")
+            return False
+        self._rules = (common, rooms)
+        print(
+            f"Loaded {len(common.matcher)} moderation phrases"
+            f" and rules for {len(rooms)} rooms from {self.path}"
+        )
+        return True
+
+    @staticmethod
+    def _rule_set(rules: dict) -> RuleSet:
+        return RuleSet(rules.get("phrases", []), bool(rules.get("links", False)))
+
+    def check(self, text: str, room: Optional[str] = None, has_link: bool = False) -> Optional[str]:
+        """Why the message must not be forwarded, "link" or "phrase", or None."""
+        common, rooms = self._rules
+        own = rooms.get(room)
+        if has_link and (common.links or (own is not None and own.links)):
+            return "link"
+        if not text:
+            return None
+        if len(common.matcher) or own is not None:
+            text = normalize(text)
+        if len(common.matcher) and common.matcher.search(text) is not None:
+            return "phrase"
+        if own is not None and own.matcher.search(text) is not None:
+            return "phrase"
+        return None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="moderation", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.reload_interval):
+            self.load()
@@ -0,0 +1,330 @@
+import asyncio
+import heapq
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from itertools import count
+from typing import Awaitable, Callable, Deque, Dict, Hashable, List, Optional, Tuple
+
+
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_BULK = 2
+PRIORITY_BACKGROUND = 3
+
+LATENCY_WEIGHT = 0.05
+
+BULK_CONTENT_TYPES = {
+    "audio",
+    "document",
+    "photo",
+    "video",
+    "video_note",
+    "voice",
+    "animation",
+}
+
+
+def content_priority(content_type: str) -> int:
+    return PRIORITY_BULK if content_type in BULK_CONTENT_TYPES else PRIORITY_NORMAL
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    if getattr(error, "error_code", None) != 429:
+        return None
+    result = getattr(error, "result_json", None) or {}
+    return float(result.get("parameters", {}).get("retry_after", 1))
+
+
+def is_transient(error: Exception) -> bool:
+    code = getattr(error, "error_code", None)
+    return code is None or code >= 500
+
+
+class RateLimiter:
+    """Generic cell rate algorithm: one theoretical arrival time per key instead of a bucket."""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.interval = 1.0 / rate
+        self.tolerance = self.interval * (burst - 1)
+        self.period = self.interval + self.tolerance
+        self._tat: Dict[Hashable, float] = {}
+        self._old: Dict[Hashable, float] = {}
+        self._rotated: Optional[float] = None
+
+    def __len__(self) -> int:
+        return len(self._tat) + len(self._old)
+
+    def _get(self, key: Hashable, now: float) -> float:
+        tat = self._tat.get(key)
+        return self._old.get(key, now) if tat is None else tat
+
+    def delay(self, key: Hashable, now: float) -> float:
+        return max(0.0, self._get(key, now) - self.tolerance - now)
+
+    def consume(self, key: Hashable, now: float):
+        if self._rotated is None:
+            self._rotated = now
+        elif now - self._rotated >= self.period:
+            self._old, self._tat = self._tat, {}
+            self._rotated = now
+        self._tat[key] = max(self._get(key, now), now) + self.interval
+
+    def hold(self, key: Hashable, now: float, seconds: float):
+        """Lets nothing through for ``key`` during the next ``seconds``."""
+        self._tat[key] = max(self._get(key, now), now + seconds + self.tolerance)
+
+    def allow(self, key: Hashable, now: float) -> bool:
+        if self.delay(key, now) > 0:
+            return False
+        self.consume(key, now)
+        return True
+
+
+class _Job:
+    __slots__ = ("call", "future", "priority", "attempts")
+
+    def __init__(self, call: Callable, priority: int, future=None):
+        self.call = call
+        self.future = Future() if future is None else future
+        self.priority = priority
+        self.attempts = 0
+
+
+class OutboundScheduler:
+    """Bot API calls queued per chat, run in order per chat and by priority across chats."""
+
+    def __init__(
+        self,
+        per_chat_rate: float = 1.0,
+        per_chat_burst: int = 3,
+        global_rate: float = 30.0,
+        global_burst: int = 30,
+        workers: int = 8,
+        max_retries: int = 5,
+        backoff: float = 0.5,
+        clock: Callable[[], float] = time.monotonic,
+        rng: Optional[random.Random] = None,
+    ):
+        self.chat_limit = RateLimiter(per_chat_rate, per_chat_burst)
+        self.global_limit = RateLimiter(global_rate, global_burst)
+        self.workers = workers
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.clock = clock
+        self.rng = rng or random.Random()
+
+        self._queues: Dict[Hashable, Deque[_Job]] = {}
+        self._ready: List[Tuple[int, int, Hashable]] = []
+        self._delayed: List[Tuple[float, int, Hashable]] = []
+        self._seq = count()
+        self._inflight = 0
+        self._pending = 0
+        self.latency = 0.0
+        self._cond = threading.Condition()
+        self._stopping = False
+        self._thread: Optional[threading.Thread] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def submit(
+        self, chat_id: Hashable, call: Callable, priority: int = PRIORITY_NORMAL
+    ) -> Future:
+        job = _Job(call, priority)
+        with self._cond:
+            if self._thread is None:
+                self._start()
+            if self._enqueue(chat_id, job):
+                self._cond.notify()
+        return job.future
+
+    def _enqueue(self, chat_id: Hashable, job: _Job) -> bool:
+        """Queues ``job``; True if its chat had nothing queued before."""
+        self._pending += 1
+        queue = self._queues.get(chat_id)
+        if queue is None:
+            self._queues[chat_id] = deque((job,))
+            heapq.heappush(self._ready, (job.priority, next(self._seq), chat_id))
+            return True
+        queue.append(job)
+        return False
+
+    def _take(self, now: float) -> Tuple[Optional[Hashable], Optional[float]]:
+        """The chat whose next call may start now, else how long to wait (None: until woken)."""
+        while self._delayed and self._delayed[0][0] <= now:
+            _, _, chat_id = heapq.heappop(self._delayed)
+            priority = self._queues[chat_id][0].priority
+            heapq.heappush(self._ready, (priority, next(self._seq), chat_id))
+
+        while True:
+            if not self._ready or self._inflight >= self.workers:
+                return None, self._delayed[0][0] - now if self._delayed else None
+            chat_id = self._ready[0][2]
+            wait = self.chat_limit.delay(chat_id, now)
+            if wait > 0:
+                heapq.heappop(self._ready)
+                heapq.heappush(self._delayed, (now + wait, next(self._seq), chat_id))
+                continue
+            wait = self.global_limit.delay(None, now)
+            if wait > 0:
+                return None, wait
+
+            heapq.heappop(self._ready)
+            self.chat_limit.consume(chat_id, now)
+            self.global_limit.consume(None, now)
+            self._inflight += 1
+            return chat_id, None
+
+    def _finish(self, chat_id: Hashable, job: _Job, elapsed: float, error: Optional[Exception]) -> bool:
+        """Books a finished attempt; False if the job was put back for a retry."""
+        delay = flood = None
+        if error is not None and job.attempts < self.max_retries:
+            delay = flood = retry_after(error)
+            if delay is None and is_transient(error):
+                delay = self.backoff * (2 ** job.attempts) * (0.5 + self.rng.random())
+
+        self.latency += LATENCY_WEIGHT * (elapsed - self.latency)
+        if flood is not None:
+            self.global_limit.hold(None, self.clock(), flood)
+        self._inflight -= 1
+        if delay is not None:
+            job.attempts += 1
+            heapq.heappush(self._delayed, (self.clock() + delay, next(self._seq), chat_id))
+            return False
+        self._queues[chat_id].popleft()
+        self._pending -= 1
+        return True
+
+    def _release(self, chat_id: Hashable):
+        """Lets the chat's next call be dispatched once the finished one is resolved."""
+        queue = self._queues[chat_id]
+        if queue:
+            heapq.heappush(self._ready, (queue[0].priority, next(self._seq), chat_id))
+        else:
+            del self._queues[chat_id]
+
+    def _start(self):
+        self._stopping = False
+        self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="outbound")
+        self._thread = threading.Thread(
+            target=self._dispatch, name="outbound-dispatch", daemon=True
+        )
+        self._thread.start()
+
+    def _dispatch(self):
+        with self._cond:
+            while not (self._stopping and not self._queues):
+                chat_id, wait = self._take(self.clock())
+                if chat_id is None:
+                    self._cond.wait(wait)
+                    continue
+                self._executor.submit(self._execute, chat_id, self._queues[chat_id][0])
+
+    def _execute(self, chat_id: Hashable, job: _Job):
+        started = self.clock()
+        try:
+            result = job.call()
+            error = None
+        except Exception as e:
+            result = None
+            error = e
+        elapsed = self.clock() - started
+
+        with self._cond:
+            done = self._finish(chat_id, job, elapsed, error)
+            self._cond.notify()
+        if not done:
+            return
+
+        if error is None:
+            job.future.set_result(result)
+        else:
+            job.future.set_exception(error)
+        with self._cond:
+            self._release(chat_id)
+            self._cond.notify()
+
+    def close(self, timeout: Optional[float] = None):
+        with self._cond:
+            if self._thread is None:
+                return
+            self._stopping = True
+            self._cond.notify()
+            thread, executor = self._thread, self._executor
+        thread.join(timeout)
+        executor.shutdown(wait=True)
+        with self._cond:
+            self._thread = None
+            self._executor = None
+
+
+class AsyncOutboundScheduler(OutboundScheduler):
+    """OutboundScheduler for coroutine calls, run as tasks on the submitting event loop."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._wakeup: Optional[asyncio.Event] = None
+        self._idle: Optional[asyncio.Event] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+
+    def submit(
+        self, chat_id: Hashable, make_call: Callable[[], Awaitable], priority: int = PRIORITY_NORMAL
+    ) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        job = _Job(make_call, priority, loop.create_future())
+        if self._dispatcher is None:
+            self._wakeup = asyncio.Event()
+            self._idle = asyncio.Event()
+            self._dispatcher = loop.create_task(self._dispatch())
+        self._idle.clear()
+        if self._enqueue(chat_id, job):
+            self._wakeup.set()
+        return job.future
+
+    async def _dispatch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            chat_id, wait = self._take(self.clock())
+            if chat_id is not None:
+                loop.create_task(self._execute(chat_id, self._queues[chat_id][0]))
+                continue
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), wait)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _execute(self, chat_id: Hashable, job: _Job):
+        started = self.clock()
+        try:
+            result = await job.call()
+            error = None
+        except Exception as e:
+            result = None
+            error = e
+        if self._finish(chat_id, job, self.clock() - started, error):
+            if not job.future.done():
+                if error is None:
+                    job.future.set_result(result)
+                else:
+                    job.future.set_exception(error)
+            self._release(chat_id)
+        self._wakeup.set()
+
+    def _release(self, chat_id: Hashable):
+        super()._release(chat_id)
+        if not self._queues:
+            self._idle.set()
+
+    async def drain(self):
+        """Waits until everything submitted so far was sent, then stops the dispatcher."""
+        if self._dispatcher is None:
+            return
+        await self._idle.wait()
+        self._dispatcher.cancel()
+        self._dispatcher = None
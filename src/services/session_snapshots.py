@@ -0,0 +1,479 @@
+import os
+import struct
+import threading
+import time
+from array import array
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, MutableMapping, Optional, Tuple
+from src.models.message import MessageHistory
+from src.models.states import SetupState, UserState
+from src.services.state_store import InMemoryStateStore
+
+
+MAGIC = b"ANSS"
+VERSION = 1
+DELETED = 255
+
+_HEADER = struct.Struct("<4sHQ")
+_COUNT = struct.Struct("<I")
+_STATE = struct.Struct("<cqB")
+_PAIR = struct.Struct("<cqq")
+_ID = struct.Struct("<cq")
+_WAIT = struct.Struct("<cqHBB")
+_MESSAGE = struct.Struct("<cqqqqq")
+
+USER_STATES = list(UserState)
+SETUP_STATES = list(SetupState)
+
+Chats = Dict[int, Dict[int, MessageHistory]]
+
+
+class _JournaledMap(MutableMapping):
+    """Dict front that journals every write; reads go straight to the dict."""
+
+    def __init__(self, data: dict, sessions: "SessionSnapshots", record: Callable):
+        self.data = data
+        self.get = data.get
+        self._lock = sessions.lock
+        self._record = record
+
+    def __getitem__(self, key):
+        return self.data[key]
+
+    def __contains__(self, key) -> bool:
+        return key in self.data
+
+    def __iter__(self):
+        return iter(self.data)
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            self.data[key] = value
+            self._record(key, value)
+
+    def __delitem__(self, key):
+        with self._lock:
+            del self.data[key]
+            self._record(key, None)
+
+    def pop(self, key, *default):
+        with self._lock:
+            if key not in self.data:
+                if default:
+                    return default[0]
+                raise KeyError(key)
+            value = self.data.pop(key)
+            self._record(key, None)
+            return value
+
+
+class _JournaledQueue:
+    def __init__(self, queue, sessions: "SessionSnapshots"):
+        self.queue = queue
+        self._sessions = sessions
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self.queue
+
+    def __len__(self) -> int:
+        return len(self.queue)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.queue)
+
+    def __getattr__(self, name: str):
+        return getattr(self.queue, name)
+
+    def add(self, user_id: int, room: str, gender: str, age: int):
+        with self._sessions.lock:
+            self.queue.add(user_id, room, gender, age)
+            self._sessions._record_wait(user_id, room, gender, age)
+
+    def remove(self, user_id: int) -> bool:
+        with self._sessions.lock:
+            removed = self.queue.remove(user_id)
+            if removed:
+                self._sessions._record(_ID.pack(b"x", user_id))
+            return removed
+
+    def match(self, user_id: int, room: str, gender: str, age: int) -> Optional[int]:
+        with self._sessions.lock:
+            partner_id = self.queue.match(user_id, room, gender, age)
+            if partner_id is None:
+                self._sessions._record_wait(user_id, room, gender, age)
+            else:
+                self._sessions._record(_ID.pack(b"x", user_id) + _ID.pack(b"x", partner_id))
+            return partner_id
+
+    def match_round(self, *args, **kwargs) -> List[Tuple[int, int]]:
+        with self._sessions.lock:
+            pairs = self.queue.match_round(*args, **kwargs)
+            for pair in pairs:
+                self._sessions._record(b"".join(_ID.pack(b"x", user_id) for user_id in pair))
+            return pairs
+
+    def rematch(self, *args, **kwargs) -> List[Tuple[int, int]]:
+        with self._sessions.lock:
+            pairs = self.queue.rematch(*args, **kwargs)
+            for pair in pairs:
+                self._sessions._record(b"".join(_ID.pack(b"x", user_id) for user_id in pair))
+            return pairs
+
+    def long_waiters(self, *args, **kwargs) -> List[Tuple[int, str, float]]:
+        with self._sessions.lock:
+            return self.queue.long_waiters(*args, **kwargs)
+
+    def allow_fallback(self, user_id: int):
+        with self._sessions.lock:
+            self.queue.allow_fallback(user_id)
+
+    def entries(self) -> List[Tuple[int, str, str, int]]:
+        with self._sessions.lock:
+            return self.queue.entries()
+
+    def room_sizes(self) -> Dict[str, int]:
+        with self._sessions.lock:
+            return self.queue.room_sizes()
+
+
+def _states(data: Dict[int, object], members: list) -> bytes:
+    codes = {member: i for i, member in enumerate(members)}
+    ids = array("q", data.keys())
+    return _COUNT.pack(len(ids)) + ids.tobytes() + bytes(map(codes.__getitem__, data.values()))
+
+
+class _Reader:
+    def __init__(self, data: bytes):
+        self.data = memoryview(data)
+        self.pos = 0
+
+    def count(self) -> int:
+        (value,) = _COUNT.unpack_from(self.data, self.pos)
+        self.pos += _COUNT.size
+        return value
+
+    def column(self, typecode: str, length: int) -> array:
+        column = array(typecode)
+        end = self.pos + length * column.itemsize
+        column.frombytes(self.data[self.pos:end])
+        self.pos = end
+        return column
+
+    def raw(self, length: int) -> bytes:
+        value = bytes(self.data[self.pos:self.pos + length])
+        self.pos += length
+        return value
+
+
+class SessionSnapshots:
+    """Binary snapshots of live sessions plus a journal of the changes made since."""
+
+    def __init__(
+        self,
+        path: str,
+        journal_path: str,
+        chat_id: Callable[[int, int], int],
+        history_capacity: int = 1000,
+        flush_interval: float = 1.0,
+        snapshot_interval: float = 60.0,
+    ):
+        self.path = Path(path)
+        self.journal_path = journal_path
+        self.chat_id = chat_id
+        self.history_capacity = history_capacity
+        self.flush_interval = flush_interval
+        self.snapshot_interval = snapshot_interval
+        self.lock = threading.RLock()
+        self.generation = 0
+        self._journal = bytearray()
+        self._store: Optional[InMemoryStateStore] = None
+        self._chats: Optional[Chats] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _journal_file(self, generation: int) -> Path:
+        return Path(f"{self.journal_path}.{generation}")
+
+    def _record(self, entry: bytes):
+        self._journal += entry
+
+    def _record_state(self, op: bytes, members: list) -> Callable:
+        codes = {member: i for i, member in enumerate(members)}
+
+        def record(user_id: int, state):
+            self._journal += _STATE.pack(op, user_id, DELETED if state is None else codes[state])
+
+        return record
+
+    def _record_chat(self, user_id: int, partner_id: Optional[int]):
+        if partner_id is None:
+            self._journal += _ID.pack(b"A", user_id)
+        else:
+            self._journal += _PAIR.pack(b"a", user_id, partner_id)
+
+    def _record_wait(self, user_id: int, room: str, gender: str, age: int):
+        room_bytes, gender_bytes = room.encode(), gender.encode()
+        self._journal += (
+            _WAIT.pack(b"w", user_id, age, len(room_bytes), len(gender_bytes))
+            + room_bytes
+            + gender_bytes
+        )
+
+    def append_message(
+        self, history: MessageHistory, sender_id: int, receiver_id: int, message_id: int, partner_message_id: int
+    ):
+        timestamp = time.time_ns()
+        with self.lock:
+            history.append(message_id, partner_message_id, timestamp)
+            self._journal += _MESSAGE.pack(
+                b"m", sender_id, receiver_id, message_id, partner_message_id, timestamp
+            )
+
+    def attach(self, store: InMemoryStateStore, chats: Chats):
+        self._store = store
+        self._chats = chats
+        store.user_states = _JournaledMap(
+            store.user_states, self, self._record_state(b"u", USER_STATES)
+        )
+        store.setup_states = _JournaledMap(
+            store.setup_states, self, self._record_state(b"s", SETUP_STATES)
+        )
+        store.active_chats = _JournaledMap(store.active_chats, self, self._record_chat)
+        store.waiting_users = _JournaledQueue(store.waiting_users, self)
+
+    def _capture(self) -> tuple:
+        """Copies of the live state, taken under ``lock`` so ``_encode`` can run outside it."""
+        store = self._store
+        sides = []
+        for chat in list(self._chats.values()):
+            (a, history_a), (b, history_b) = chat.items()
+            sides.append((a, b, history_a.capacity, history_a.columns()))
+            sides.append((b, a, history_b.capacity, history_b.columns()))
+        return (
+            self.generation,
+            dict(store.user_states.data),
+            dict(store.setup_states.data),
+            dict(store.active_chats.data),
+            store.waiting_users.entries(),
+            sides,
+        )
+
+    def _encode(self, state: tuple) -> bytes:
+        generation, user_states, setup_states, active, entries, sides = state
+        parts = [_HEADER.pack(MAGIC, VERSION, generation)]
+        parts.append(_states(user_states, USER_STATES))
+        parts.append(_states(setup_states, SETUP_STATES))
+
+        parts.append(_COUNT.pack(len(active)))
+        parts.append(array("q", active.keys()).tobytes())
+        parts.append(array("q", active.values()).tobytes())
+
+        rooms = sorted({room for _, room, _, _ in entries})
+        genders = sorted({gender for _, _, gender, _ in entries})
+        names = "\n".join(rooms).encode(), "\n".join(genders).encode()
+        for blob in names:
+            parts.append(_COUNT.pack(len(blob)) + blob)
+        room_codes = {room: i for i, room in enumerate(rooms)}
+        gender_codes = {gender: i for i, gender in enumerate(genders)}
+        parts.append(_COUNT.pack(len(entries)))
+        parts.append(array("q", [entry[0] for entry in entries]).tobytes())
+        parts.append(bytes(room_codes[entry[1]] for entry in entries))
+        parts.append(bytes(gender_codes[entry[2]] for entry in entries))
+        parts.append(array("H", [entry[3] for entry in entries]).tobytes())
+
+        users, partners, capacities, lengths = array("q"), array("q"), array("I"), array("I")
+        message_ids, partner_ids, timestamps = array("q"), array("q"), array("q")
+        for user_id, partner_id, capacity, (mids, pids, tss) in sides:
+            users.append(user_id)
+            partners.append(partner_id)
+            capacities.append(capacity)
+            lengths.append(len(mids))
+            message_ids.extend(mids)
+            partner_ids.extend(pids)
+            timestamps.extend(tss)
+        parts.append(_COUNT.pack(len(users)))
+        for column in (users, partners, capacities, lengths):
+            parts.append(column.tobytes())
+        parts.append(_COUNT.pack(len(message_ids)))
+        for column in (message_ids, partner_ids, timestamps):
+            parts.append(column.tobytes())
+        return b"".join(parts)
+
+    def _decode(self, data: bytes, store: InMemoryStateStore, chats: Chats) -> int:
+        reader = _Reader(data)
+        magic, version, generation = _HEADER.unpack_from(reader.data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{self.path} is not a version {VERSION} session snapshot")
+        reader.pos = _HEADER.size
+
+        for target, members in ((store.user_states, USER_STATES), (store.setup_states, SETUP_STATES)):
+            count = reader.count()
+            ids = reader.column("q", count)
+            target.update(zip(ids, map(members.__getitem__, reader.raw(count))))
+
+        count = reader.count()
+        store.active_chats.update(zip(reader.column("q", count), reader.column("q", count)))
+
+        rooms = reader.raw(reader.count()).decode().split("\n")
+        genders = reader.raw(reader.count()).decode().split("\n")
+        count = reader.count()
+        ids = reader.column("q", count)
+        room_codes, gender_codes = reader.raw(count), reader.raw(count)
+        ages = reader.column("H", count)
+        for user_id, room, gender, age in zip(ids, room_codes, gender_codes, ages):
+            store.waiting_users.add(user_id, rooms[room], genders[gender], age)
+
+        count = reader.count()
+        users, partners = reader.column("q", count), reader.column("q", count)
+        capacities, lengths = reader.column("I", count), reader.column("I", count)
+        total = reader.count()
+        columns = [reader.column("q", total) for _ in range(3)]
+        offset = 0
+        for user_id, partner_id, capacity, length in zip(users, partners, capacities, lengths):
+            end = offset + length
+            history = MessageHistory.from_columns(
+                capacity, *(column[offset:end] for column in columns)
+            )
+            offset = end
+            sides = chats.setdefault(self.chat_id(user_id, partner_id), {})
+            sides[user_id] = history
+        return generation
+
+    def _replay(self, data: bytes, store: InMemoryStateStore, chats: Chats):
+        view = memoryview(data)
+        pos = 0
+        try:
+            while pos < len(view):
+                op = bytes(view[pos:pos + 1])
+                if op in (b"u", b"s"):
+                    _, user_id, code = _STATE.unpack_from(view, pos)
+                    pos += _STATE.size
+                    target, members = (
+                        (store.user_states, USER_STATES) if op == b"u" else (store.setup_states, SETUP_STATES)
+                    )
+                    if code == DELETED:
+                        target.pop(user_id, None)
+                    else:
+                        target[user_id] = members[code]
+                elif op == b"a":
+                    _, user_id, partner_id = _PAIR.unpack_from(view, pos)
+                    pos += _PAIR.size
+                    store.active_chats[user_id] = partner_id
+                elif op == b"A":
+                    _, user_id = _ID.unpack_from(view, pos)
+                    pos += _ID.size
+                    store.active_chats.pop(user_id, None)
+                elif op == b"w":
+                    _, user_id, age, room_length, gender_length = _WAIT.unpack_from(view, pos)
+                    pos += _WAIT.size
+                    end = pos + room_length + gender_length
+                    if end > len(view):
+                        break
+                    room = bytes(view[pos:pos + room_length]).decode()
+                    gender = bytes(view[pos + room_length:end]).decode()
+                    pos = end
+                    store.waiting_users.add(user_id, room, gender, age)
+                elif op == b"x":
+                    _, user_id = _ID.unpack_from(view, pos)
+                    pos += _ID.size
+                    store.waiting_users.remove(user_id)
+                elif op == b"m":
+                    _, sender_id, receiver_id, message_id, partner_message_id, timestamp = (
+                        _MESSAGE.unpack_from(view, pos)
+                    )
+                    pos += _MESSAGE.size
+                    sides = chats.get(self.chat_id(sender_id, receiver_id))
+                    if sides is None:
+                        sides = chats[self.chat_id(sender_id, receiver_id)] = {
+                            sender_id: MessageHistory(self.history_capacity),
+                            receiver_id: MessageHistory(self.history_capacity),
+                        }
+                    sides[sender_id].append(message_id, partner_message_id, timestamp)
+                else:
+                    raise ValueError(f"Unknown journal entry {op!r}")
+        except struct.error:
+            pass
+
+    def restore(self, store: InMemoryStateStore, chats: Chats) -> bool:
+        """Loads the last snapshot and journals into an empty store; False if there was none."""
+        found = False
+        if self.path.exists():
+            self.generation = self._decode(self.path.read_bytes(), store, chats)
+            found = True
+        for generation in (self.generation, self.generation + 1):
+            journal = self._journal_file(generation)
+            if journal.exists():
+                self._replay(journal.read_bytes(), store, chats)
+                self.generation = generation
+                found = True
+
+        active = store.active_chats
+        for chat_id, sides in list(chats.items()):
+            user_id, partner_id = list(sides)
+            if active.get(user_id) != partner_id or active.get(partner_id) != user_id:
+                del chats[chat_id]
+        for user_id, partner_id in active.items():
+            sides = chats.setdefault(self.chat_id(user_id, partner_id), {})
+            for side in (user_id, partner_id):
+                if side not in sides:
+                    sides[side] = MessageHistory(self.history_capacity)
+        return found
+
+    def flush(self):
+        with self.lock:
+            entries, self._journal = self._journal, bytearray()
+            journal = self._journal_file(self.generation)
+        if not entries:
+            return
+        with open(journal, "ab") as f:
+            f.write(entries)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def snapshot(self):
+        with self.lock:
+            entries, self._journal = self._journal, bytearray()
+            previous = self._journal_file(self.generation)
+            self.generation += 1
+            state = self._capture()
+        data = self._encode(state)
+        if entries:
+            with open(previous, "ab") as f:
+                f.write(entries)
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        for generation in range(self.generation - 2, self.generation):
+            self._journal_file(generation).unlink(missing_ok=True)
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="session-snapshots", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        next_snapshot = time.monotonic() + self.snapshot_interval
+        while not self._stop.wait(self.flush_interval):
+            try:
+                if time.monotonic() >= next_snapshot:
+                    self.snapshot()
+                    next_snapshot = time.monotonic() + self.snapshot_interval
+                else:
+                    self.flush()
+            except OSError as e:
+                print(f"Error while saving sessions: {e}")
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.snapshot()
@@ -0,0 +1,164 @@
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Mapping, Optional, Tuple
+
+
+Record = Dict[str, Any]
+
+
+class SettingsStore:
+    """Append-only JSON-lines log of profile records; the last line for an id wins."""
+
+    def __init__(
+        self,
+        path: str,
+        legacy_path: Optional[str] = None,
+        flush_interval: float = 1.0,
+        compact_ratio: float = 4.0,
+        compact_min_lines: int = 10_000,
+        fold_ratio: float = 0.01,
+        on_flush: Optional[Callable[[float], None]] = None,
+    ):
+        self.path = Path(path)
+        self.legacy_path = Path(legacy_path) if legacy_path else None
+        self.flush_interval = flush_interval
+        self.compact_ratio = compact_ratio
+        self.compact_min_lines = compact_min_lines
+        self.fold_ratio = fold_ratio
+        self.on_flush = on_flush
+        self._profiles: Optional[Mapping[str, Any]] = None
+        self._to_record: Callable[[Any], Record] = dict
+        self._fold: Optional[Callable[[], None]] = None
+
+        self._dirty: Dict[str, Record] = {}
+        self._dirty_lock = threading.Lock()
+        self._io_lock = threading.Lock()
+        self._lines = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def load(self) -> Dict[str, Record]:
+        if not self.path.exists():
+            records = self._load_legacy()
+            self._write_compacted(records.items())
+            return records
+
+        records: Dict[str, Record] = {}
+        with open(self.path, "rb+") as f:
+            data = f.read()
+            end = data.rfind(b"\n") + 1
+            if end != len(data):
+                f.truncate(end)
+        for line in data[:end].splitlines():
+            if not line:
+                continue
+            record = json.loads(line)
+            records[record.pop("id")] = record
+            self._lines += 1
+        return records
+
+    def bind(
+        self,
+        profiles: Mapping[str, Any],
+        to_record: Callable[[Any], Record],
+        fold: Optional[Callable[[], None]] = None,
+    ):
+        self._profiles = profiles
+        self._to_record = to_record
+        self._fold = fold
+
+    def _snapshot(self) -> Iterable[Tuple[str, Record]]:
+        return [
+            (hashed_id, self._to_record(profile))
+            for hashed_id, profile in list(self._profiles.items())
+        ]
+
+    def _load_legacy(self) -> Dict[str, Record]:
+        if self.legacy_path is None or not self.legacy_path.exists():
+            return {}
+        with open(self.legacy_path, "r") as f:
+            return json.load(f)
+
+    def put(self, hashed_id: str, record: Record):
+        with self._dirty_lock:
+            self._dirty[hashed_id] = record
+
+    def flush(self):
+        with self._dirty_lock:
+            dirty, self._dirty = self._dirty, {}
+        if not dirty:
+            return
+
+        started = time.perf_counter()
+        with self._io_lock:
+            lines = b"".join(
+                json.dumps({"id": hashed_id, **record}).encode() + b"\n"
+                for hashed_id, record in dirty.items()
+            )
+            with open(self.path, "ab") as f:
+                f.write(lines)
+                f.flush()
+                os.fsync(f.fileno())
+            self._lines += len(dirty)
+            if self.needs_compaction():
+                self._compact()
+        if self.on_flush is not None:
+            self.on_flush(time.perf_counter() - started)
+
+    def needs_compaction(self) -> bool:
+        if self._profiles is None or self._lines < self.compact_min_lines:
+            return False
+        if self._fold is not None:
+            return self._lines > self.fold_ratio * len(self._profiles)
+        return self._lines > self.compact_ratio * len(self._profiles)
+
+    def compact(self):
+        if self._profiles is None:
+            return
+        with self._io_lock:
+            self._compact()
+
+    def _compact(self):
+        if self._fold is not None:
+            self._fold()
+            self._write_compacted(())
+        else:
+            self._write_compacted(self._snapshot())
+
+    def _write_compacted(self, records: Iterable[Tuple[str, Record]]):
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        count = 0
+        with open(tmp_path, "wb") as f:
+            for hashed_id, record in records:
+                f.write(json.dumps({"id": hashed_id, **record}).encode() + b"\n")
+                count += 1
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self._lines = count
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="settings-store", daemon=True
+        )
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except OSError as e:
+                print(f"Error while saving settings: {e}")
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
@@ -0,0 +1,275 @@
+import json
+import random
+import time
+from typing import Callable, Dict, Generic, Iterable, Iterator, MutableMapping, Optional, Tuple, TypeVar
+from src.models.states import SetupState, UserState
+from src.models.user import UserSettings
+from src.services.match_queue import MatchQueue
+
+
+V = TypeVar("V")
+
+
+class StateStore:
+    """Live session state shared by the handlers; ``profiles`` is None when the bot keeps its own."""
+
+    user_states: MutableMapping[int, UserState]
+    setup_states: MutableMapping[int, SetupState]
+    active_chats: MutableMapping[int, int]
+    waiting_users: MatchQueue
+    profiles: Optional[MutableMapping[str, UserSettings]] = None
+
+
+class InMemoryStateStore(StateStore):
+    def __init__(
+        self,
+        rng: Optional[random.Random] = None,
+        columnar: bool = False,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.rng = rng
+        self.columnar = columnar
+        self.clock = clock
+        self.clear()
+
+    def set_clock(self, clock: Callable[[], float]):
+        """Times waits in the pool with ``clock``, e.g. the bot's own timer clock."""
+        self.clock = clock
+        self.waiting_users._clock = clock
+
+    def clear(self):
+        """Empties every map and the waiting pool, keeping the pool type and rng."""
+        self.user_states: Dict[int, UserState] = {}
+        self.setup_states: Dict[int, SetupState] = {}
+        self.active_chats: Dict[int, int] = {}
+        if self.columnar:
+            from src.services.columnar_pool import ColumnarMatchQueue
+
+            self.waiting_users = ColumnarMatchQueue(self.rng, self.clock)
+        else:
+            self.waiting_users = MatchQueue(self.rng, self.clock)
+
+
+class RedisHash(MutableMapping[int, V], Generic[V]):
+    def __init__(
+        self,
+        client,
+        key: str,
+        encode: Callable[[V], str],
+        decode: Callable[[bytes], V],
+    ):
+        self.client = client
+        self.key = key
+        self.encode = encode
+        self.decode = decode
+
+    def __getitem__(self, user_id: int) -> V:
+        value = self.client.hget(self.key, user_id)
+        if value is None:
+            raise KeyError(user_id)
+        return self.decode(value)
+
+    def __setitem__(self, user_id: int, value: V):
+        self.client.hset(self.key, user_id, self.encode(value))
+
+    def __delitem__(self, user_id: int):
+        if not self.client.hdel(self.key, user_id):
+            raise KeyError(user_id)
+
+    def pop(self, user_id: int, *default):
+        value = self.client.hget(self.key, user_id)
+        if value is None:
+            if default:
+                return default[0]
+            raise KeyError(user_id)
+        self.client.hdel(self.key, user_id)
+        return self.decode(value)
+
+    def __iter__(self) -> Iterator[int]:
+        for user_id, _ in self.client.hscan_iter(self.key):
+            yield int(user_id)
+
+    def __len__(self) -> int:
+        return self.client.hlen(self.key)
+
+
+class RedisProfiles(RedisHash[UserSettings]):
+    """Profiles by user hash in one Redis hash, so every worker sees the same ones."""
+
+    def __init__(self, client, key: str):
+        super().__init__(
+            client,
+            key,
+            lambda settings: json.dumps(settings.to_dict()),
+            lambda raw: UserSettings(**json.loads(raw)),
+        )
+
+    def __contains__(self, hashed_id) -> bool:
+        return bool(self.client.hexists(self.key, hashed_id))
+
+    def __iter__(self) -> Iterator[str]:
+        for hashed_id, _ in self.client.hscan_iter(self.key):
+            yield hashed_id.decode()
+
+    def add_missing(self, profiles: Iterable[Tuple[str, UserSettings]], chunk: int = 10_000) -> int:
+        """Stores the profiles that aren't there yet; returns how many were added."""
+        added = 0
+        pipe = self.client.pipeline(transaction=False)
+        for i, (hashed_id, settings) in enumerate(profiles, 1):
+            pipe.hsetnx(self.key, hashed_id, self.encode(settings))
+            if i % chunk == 0:
+                added += sum(pipe.execute())
+        return added + sum(pipe.execute())
+
+    def resident(self) -> int:
+        return 0
+
+    def evict(self, idle: float) -> int:
+        return 0
+
+
+_MATCH_SCRIPT = """
+local prefix, uid, room, gender = ARGV[1], ARGV[2], ARGV[3], ARGV[4]
+local age, window, chance = tonumber(ARGV[5]), tonumber(ARGV[6]), tonumber(ARGV[7])
+
+local function remove(user)
+  local key = redis.call('HGET', prefix .. 'wait:index', user)
+  if not key then return end
+  redis.call('ZREM', key, user)
+  redis.call('HDEL', prefix .. 'wait:index', user)
+  redis.call('HINCRBY', prefix .. 'wait:rooms', redis.call('HGET', prefix .. 'wait:room', user), -1)
+  redis.call('HDEL', prefix .. 'wait:room', user)
+end
+
+local function key(g, a)
+  return prefix .. 'wait:' .. room .. ':' .. g .. ':' .. a
+end
+
+local opposite = nil
+for _, g in ipairs(redis.call('SMEMBERS', prefix .. 'wait:genders')) do
+  if g ~= gender then
+    for a = age - window, age + window do
+      local head = redis.call('ZRANGE', key(g, a), 0, 1, 'WITHSCORES')
+      if head[1] == uid then head = {head[3], head[4]} end
+      if head[1] and (opposite == nil or tonumber(head[2]) < opposite[1]) then
+        opposite = {tonumber(head[2]), head[1]}
+      end
+    end
+  end
+end
+
+local candidates = {}
+local limit = opposite and ('(' .. opposite[1]) or '+inf'
+for a = age - window, age + window do
+  local members = redis.call('ZRANGEBYSCORE', key(gender, a), '-inf', limit, 'WITHSCORES')
+  for i = 1, #members, 2 do
+    if members[i] ~= uid then table.insert(candidates, {tonumber(members[i + 1]), members[i]}) end
+  end
+end
+if #candidates > #ARGV - 7 then return -#candidates end
+table.sort(candidates, function(x, y) return x[1] < y[1] end)
+
+remove(uid)
+
+local partner = nil
+for i, c in ipairs(candidates) do
+  if tonumber(ARGV[7 + i]) < chance then partner = c[2] break end
+end
+if partner == nil and opposite ~= nil then partner = opposite[2] end
+
+if partner == nil then
+  local bucket = key(gender, age)
+  redis.call('ZADD', bucket, redis.call('INCR', prefix .. 'wait:seq'), uid)
+  redis.call('HSET', prefix .. 'wait:index', uid, bucket)
+  redis.call('HSET', prefix .. 'wait:room', uid, room)
+  redis.call('HINCRBY', prefix .. 'wait:rooms', room, 1)
+  redis.call('SADD', prefix .. 'wait:genders', gender)
+  return false
+end
+
+remove(partner)
+redis.call('HSET', prefix .. 'active_chats', uid, partner, partner, uid)
+redis.call('HSET', prefix .. 'user_states', uid, 'chatting', partner, 'chatting')
+return partner
+"""
+
+_REMOVE_SCRIPT = """
+local prefix, uid = ARGV[1], ARGV[2]
+local key = redis.call('HGET', prefix .. 'wait:index', uid)
+if not key then return 0 end
+redis.call('ZREM', key, uid)
+redis.call('HDEL', prefix .. 'wait:index', uid)
+redis.call('HINCRBY', prefix .. 'wait:rooms', redis.call('HGET', prefix .. 'wait:room', uid), -1)
+redis.call('HDEL', prefix .. 'wait:room', uid)
+return 1
+"""
+
+
+class RedisMatchQueue:
+    """MatchQueue with the same rules, run as a Lua script inside Redis."""
+
+    AGE_WINDOW = MatchQueue.AGE_WINDOW
+    SAME_GENDER_CHANCE = MatchQueue.SAME_GENDER_CHANCE
+
+    def __init__(self, client, prefix: str, rng: Optional[random.Random] = None):
+        self.client = client
+        self.prefix = prefix
+        self._rng = rng or random.Random()
+        self._match = client.register_script(_MATCH_SCRIPT)
+        self._remove = client.register_script(_REMOVE_SCRIPT)
+
+    def __contains__(self, user_id: int) -> bool:
+        return bool(self.client.hexists(self.prefix + "wait:index", user_id))
+
+    def __len__(self) -> int:
+        return self.client.hlen(self.prefix + "wait:index")
+
+    def room_sizes(self) -> Dict[str, int]:
+        sizes = self.client.hgetall(self.prefix + "wait:rooms")
+        return {room.decode(): int(size) for room, size in sizes.items()}
+
+    def remove(self, user_id: int) -> bool:
+        return bool(self._remove(args=[self.prefix, user_id]))
+
+    def match(self, user_id: int, room: str, gender: str, age: int) -> Optional[int]:
+        rolls = [self._rng.random() for _ in range(2 * self.AGE_WINDOW + 1)]
+        while True:
+            partner_id = self._match(
+                args=[
+                    self.prefix,
+                    user_id,
+                    room,
+                    gender,
+                    age,
+                    self.AGE_WINDOW,
+                    self.SAME_GENDER_CHANCE,
+                    *rolls,
+                ]
+            )
+            if partner_id is None or int(partner_id) >= 0:
+                break
+            rolls.extend(self._rng.random() for _ in range(-int(partner_id) - len(rolls)))
+        return int(partner_id) if partner_id is not None else None
+
+
+class RedisStateStore(StateStore):
+    """State kept in Redis so several worker processes can serve one bot."""
+
+    def __init__(self, client, prefix: str = "anonbot:", rng: Optional[random.Random] = None):
+        self.client = client
+        self.prefix = prefix
+        self.user_states = RedisHash(
+            client, prefix + "user_states", lambda state: state.value, lambda raw: UserState(raw.decode())
+        )
+        self.setup_states = RedisHash(
+            client, prefix + "setup_states", lambda state: state.value, lambda raw: SetupState(raw.decode())
+        )
+        self.active_chats = RedisHash(client, prefix + "active_chats", str, int)
+        self.waiting_users = RedisMatchQueue(client, prefix, rng)
+        self.profiles = RedisProfiles(client, prefix + "profiles")
+
+    @classmethod
+    def from_url(cls, url: str, prefix: str = "anonbot:") -> "RedisStateStore":
+        import redis
+
+        return cls(redis.Redis.from_url(url), prefix)
@@ -0,0 +1,75 @@
+import threading
+import time
+from typing import Callable, Dict, Hashable, List, Optional, Set
+
+
+class TimerWheel:
+    """Hashed timing wheel of keys with deadlines; rescheduling a key only moves its deadline."""
+
+    def __init__(
+        self,
+        tick: float = 1.0,
+        slots: int = 512,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.tick = tick
+        self.clock = clock
+        self._slots: List[Set[Hashable]] = [set() for _ in range(slots)]
+        self._deadlines: Dict[Hashable, float] = {}
+        self._ticks: Dict[Hashable, int] = {}
+        self._current = int(clock() // tick)
+        self._lock = threading.Lock()
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._deadlines
+
+    def __len__(self) -> int:
+        return len(self._deadlines)
+
+    def deadline(self, key: Hashable) -> Optional[float]:
+        return self._deadlines.get(key)
+
+    def _place(self, key: Hashable, deadline: float):
+        tick = max(int(deadline // self.tick), self._current + 1)
+        self._ticks[key] = tick
+        self._slots[tick % len(self._slots)].add(key)
+
+    def schedule(self, key: Hashable, ttl: float, now: Optional[float] = None):
+        deadline = (self.clock() if now is None else now) + ttl
+        with self._lock:
+            self._deadlines[key] = deadline
+            tick = self._ticks.get(key)
+            if tick is not None:
+                if tick * self.tick <= deadline:
+                    return
+                self._slots[tick % len(self._slots)].discard(key)
+            self._place(key, deadline)
+
+    def cancel(self, key: Hashable) -> bool:
+        with self._lock:
+            if self._deadlines.pop(key, None) is None:
+                return False
+            tick = self._ticks.pop(key)
+            self._slots[tick % len(self._slots)].discard(key)
+            return True
+
+    def advance(self, now: Optional[float] = None) -> List[Hashable]:
+        """Removes and returns the keys whose deadline is at or before ``now``."""
+        now = self.clock() if now is None else now
+        target = int(now // self.tick)
+        expired = []
+        with self._lock:
+            first = max(self._current + 1, target - len(self._slots) + 1)
+            self._current = max(self._current, target)
+            for tick in range(first, target + 1):
+                slot = self._slots[tick % len(self._slots)]
+                for key in [key for key in slot if self._ticks[key] <= target]:
+                    slot.discard(key)
+                    deadline = self._deadlines[key]
+                    if deadline <= now:
+                        del self._deadlines[key]
+                        del self._ticks[key]
+                        expired.append(key)
+                    else:
+                        self._place(key, deadline)
+        return expired
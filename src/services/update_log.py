@@ -0,0 +1,125 @@
+import gzip
+import hashlib
+import hmac
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+
+PERSON_KEYS = {
+    "from",
+    "chat",
+    "user",
+    "sender_user",
+    "sender_chat",
+    "forward_from",
+    "forward_from_chat",
+    "via_bot",
+}
+REPLACED = {"first_name": "Anon", "title": "Anon", "phone_number": "+0"}
+DROPPED = {"last_name", "username", "bio"}
+RECORDED = ("message", "edited_message")
+
+
+def pseudonymizer(key: bytes) -> Callable[[int], int]:
+    """Maps ids to stable 42-bit pseudonyms; without ``key`` they cannot be reversed."""
+
+    def pseudonym(value: int) -> int:
+        digest = hmac.new(key, str(value).encode(), hashlib.sha256).digest()
+        return int.from_bytes(digest[:8], "big") % (1 << 42) + 1
+
+    return pseudonym
+
+
+def anonymize(value: Any, pseudonym: Callable[[int], int], person: bool = False) -> Any:
+    """Copy of raw update JSON with user and chat ids replaced and names removed."""
+    if isinstance(value, list):
+        return [anonymize(item, pseudonym) for item in value]
+    if not isinstance(value, dict):
+        return value
+    result = {}
+    for key, item in value.items():
+        if key in DROPPED:
+            continue
+        if key in REPLACED:
+            result[key] = REPLACED[key]
+        elif (person and key == "id") or key == "user_id":
+            result[key] = pseudonym(item)
+        else:
+            result[key] = anonymize(item, pseudonym, key in PERSON_KEYS)
+    return result
+
+
+class UpdateRecorder:
+    """Appends incoming updates to a gzip file of JSON lines."""
+
+    def __init__(
+        self,
+        path: str,
+        describe: Optional[Callable[[int], Dict[str, Any]]] = None,
+        key: Optional[bytes] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.path = path
+        self.describe = describe
+        self.pseudonym = pseudonymizer(key or os.urandom(32))
+        self.clock = clock
+        self._started = clock()
+        self._seen: set = set()
+        self._lock = threading.Lock()
+        self._file = gzip.open(path, "at", encoding="utf-8")
+
+    def _user_line(self, user_id: int, at: float) -> str:
+        entry = dict(self.describe(user_id)) if self.describe is not None else {}
+        if entry.get("partner") is not None:
+            entry["partner"] = self.pseudonym(entry["partner"])
+        return json.dumps({"at": at, "user": self.pseudonym(user_id), **entry})
+
+    def record(self, updates: List[Any]):
+        at = round(self.clock() - self._started, 6)
+        lines = []
+        for update in updates:
+            raw = {"update_id": update.update_id}
+            for field in RECORDED:
+                message = getattr(update, field, None)
+                if message is None:
+                    continue
+                raw[field] = message.json
+                user = message.from_user
+                if user is not None and user.id not in self._seen:
+                    self._seen.add(user.id)
+                    lines.append(self._user_line(user.id, at))
+            if len(raw) > 1:
+                lines.append(json.dumps({"at": at, "update": anonymize(raw, self.pseudonym)}))
+        if lines:
+            with self._lock:
+                self._file.write("\n".join(lines) + "\n")
+
+    def wrap(self, process: Callable) -> Callable:
+        """``process`` with recording in front; works for sync and async handlers alike."""
+
+        def recording(updates):
+            try:
+                self.record(updates)
+            except Exception as e:
+                print(f"Error while recording updates: {e}")
+            return process(updates)
+
+        return recording
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+def read_update_log(path: str) -> Iterator[Dict[str, Any]]:
+    """Yields the recorded lines in order; a torn last line is skipped."""
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        try:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        except (EOFError, json.JSONDecodeError):
+            return
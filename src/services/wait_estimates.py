@@ -0,0 +1,33 @@
+import threading
+from typing import Dict, Optional
+
+
+class WaitEstimates:
+    """Moving average of the time from /search to a match, per room; timeouts count as the TTL."""
+
+    def __init__(self, weight: float = 0.1):
+        self.weight = weight
+        self._estimates: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, room: str, seconds: float):
+        with self._lock:
+            estimate = self._estimates.get(room)
+            if estimate is None:
+                self._estimates[room] = seconds
+            else:
+                self._estimates[room] = estimate + self.weight * (seconds - estimate)
+
+    def estimate(self, room: str) -> Optional[float]:
+        return self._estimates.get(room)
+
+    def rooms(self) -> Dict[str, float]:
+        with self._lock:
+            return dict(self._estimates)
+
+
+def format_wait(seconds: float) -> str:
+    if seconds < 60:
+        return "under a minute"
+    minutes = round(seconds / 60)
+    return "about a minute" if minutes == 1 else f"about {minutes} minutes"
@@ -0,0 +1,197 @@
+import hmac
+import json
+import queue
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterable, List, Optional
+from urllib import request
+from urllib.error import HTTPError
+from telebot import types
+
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+def _update_key(update: types.Update) -> int:
+    message = update.message or update.edited_message
+    if message is not None and message.from_user is not None:
+        return message.from_user.id
+    return update.update_id
+
+
+class WebhookServer:
+    """Accepts Telegram webhook POSTs and hands updates to per-sender worker queues."""
+
+    def __init__(
+        self,
+        process_updates: Callable[[List[types.Update]], None],
+        host: str = "127.0.0.1",
+        port: int = 8443,
+        secret_token: str = "",
+        path: str = "/webhook",
+        queue_size: int = 1000,
+        workers: int = 4,
+        latency_window: int = 10_000,
+    ):
+        self.process_updates = process_updates
+        self.secret_token = secret_token
+        self.path = path
+        self.queues = [queue.Queue(maxsize=queue_size) for _ in range(workers)]
+        self.accepted = 0
+        self.rejected = 0
+        self.failed = 0
+        self.latencies = deque(maxlen=latency_window)
+        self._threads: List[threading.Thread] = []
+        self._stopping = threading.Event()
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+
+    @property
+    def address(self):
+        return self._server.server_address
+
+    def queue_depth(self) -> int:
+        return sum(q.qsize() for q in self.queues)
+
+    def stats(self) -> Dict[str, float]:
+        latencies = sorted(self.latencies)
+
+        def percentile(p: float) -> float:
+            if not latencies:
+                return 0.0
+            return latencies[min(len(latencies) - 1, int(p * len(latencies)))]
+
+        return {
+            "queue_depth": self.queue_depth(),
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "failed": self.failed,
+            "latency_p50_ms": percentile(0.50) * 1000,
+            "latency_p99_ms": percentile(0.99) * 1000,
+        }
+
+    def submit(self, payload: dict) -> bool:
+        update = types.Update.de_json(payload)
+        shard = self.queues[_update_key(update) % len(self.queues)]
+        try:
+            shard.put_nowait((update, time.perf_counter()))
+        except queue.Full:
+            self.rejected += 1
+            return False
+        self.accepted += 1
+        return True
+
+    def _work(self, shard: queue.Queue):
+        while True:
+            item = shard.get()
+            if item is None:
+                return
+            update, received = item
+            try:
+                self.process_updates([update])
+            except Exception as e:
+                self.failed += 1
+                print(f"Error while handling update {update.update_id}: {e}")
+            self.latencies.append(time.perf_counter() - received)
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                if self.path != server.path:
+                    self._reply(404)
+                    return
+                token = self.headers.get(SECRET_HEADER, "")
+                if server.secret_token and not hmac.compare_digest(
+                    token, server.secret_token
+                ):
+                    self._reply(403)
+                    return
+                try:
+                    length = int(self.headers.get("Content-Length", 0))
+                    payload = json.loads(self.rfile.read(length))
+                    accepted = server.submit(payload)
+                except (ValueError, KeyError, TypeError):
+                    self._reply(400)
+                    return
+                if accepted:
+                    self._reply(200)
+                else:
+                    self._reply(429, {"Retry-After": "1"})
+
+            def do_GET(self):
+                if self.path != server.path + "/stats":
+                    self._reply(404)
+                    return
+                body = json.dumps(server.stats()).encode()
+                self._reply(200, {"Content-Type": "application/json"}, body)
+
+            def _reply(self, code: int, headers: Optional[dict] = None, body: bytes = b""):
+                self.send_response(code)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        for shard in self.queues:
+            thread = threading.Thread(target=self._work, args=(shard,), daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def serve_forever(self):
+        self.start()
+        try:
+            self._stopping.wait()
+        finally:
+            self.stop()
+
+    def request_stop(self):
+        self._stopping.set()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        for shard in self.queues:
+            shard.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads.clear()
+
+
+def post_updates(url: str, payloads: Iterable[dict], secret_token: str = "") -> Dict[int, int]:
+    statuses: Dict[int, int] = {}
+    for payload in payloads:
+        req = request.Request(
+            url,
+            data=json.dumps(payload).encode(),
+            headers={"Content-Type": "application/json", SECRET_HEADER: secret_token},
+        )
+        try:
+            with request.urlopen(req) as response:
+                status = response.status
+        except HTTPError as e:
+            status = e.code
+        statuses[status] = statuses.get(status, 0) + 1
+    return statuses
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) < 3:
+        print("Usage: python -m src.services.webhook URL UPDATES.jsonl [SECRET]")
+    else:
+        with open(sys.argv[2]) as f:
+            updates = (json.loads(line) for line in f if line.strip())
+            print(post_updates(sys.argv[1], updates, sys.argv[3] if len(sys.argv) > 3 else ""))
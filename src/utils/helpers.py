@@ -1,7 +1,35 @@
 import hashlib
+import hmac
+from functools import lru_cache
+from typing import Optional
+
+HASH_CACHE_SIZE = 1 << 16
+
+_hash_key: Optional[bytes] = None
+
+
+def _digest(user_id: int) -> str:
+    data = str(user_id).encode()
+    if _hash_key:
+        return hmac.new(_hash_key, data, hashlib.sha256).hexdigest()
+    return hashlib.sha256(data).hexdigest()
+
+
+_cached_digest = lru_cache(maxsize=HASH_CACHE_SIZE)(_digest)
+
+
+def configure_hashing(key: Optional[bytes] = None, cache_size: int = HASH_CACHE_SIZE):
+    global _hash_key, _cached_digest
+    _hash_key = key or None
+    _cached_digest = lru_cache(maxsize=cache_size)(_digest)
+
 
 def hash_user_id(user_id: int) -> str:
-    return hashlib.sha256(str(user_id).encode()).hexdigest()
+    return _cached_digest(user_id)
+
+
+hash_id = hash_user_id
+
 
 def generate_chat_id(user1: int, user2: int) -> int:
-    return user1 * 1_000_000 + user2 if user1 < user2 else user2 * 1_000_000 + user1
\ No newline at end of file
+    return user1 * 1_000_000 + user2 if user1 < user2 else user2 * 1_000_000 + user1
@@ -0,0 +1,295 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+WAIT_BUCKETS = (0.5, 1.0, 5.0, 15.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0)
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Sharded:
+    """Values are kept per thread, so writers never share or lock anything."""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._local = threading.local()
+        self._shards: List[dict] = []
+        self._lock = threading.Lock()
+
+    def _shard(self) -> dict:
+        try:
+            return self._local.values
+        except AttributeError:
+            values = self._local.values = {}
+            with self._lock:
+                self._shards.append(values)
+            return values
+
+    def _snapshot(self):
+        with self._lock:
+            shards = list(self._shards)
+        for shard in shards:
+            yield from list(shard.items())
+
+
+class Counter(_Sharded):
+    kind = "counter"
+
+    def inc(self, *labels: str, amount: float = 1):
+        try:
+            shard = self._local.values
+        except AttributeError:
+            shard = self._shard()
+        shard[labels] = shard.get(labels, 0) + amount
+
+    def values(self) -> Dict[Tuple[str, ...], float]:
+        totals: Dict[Tuple[str, ...], float] = {}
+        for labels, value in self._snapshot():
+            totals[labels] = totals.get(labels, 0) + value
+        return totals
+
+    def render(self) -> List[str]:
+        return [
+            f"{self.name}{_labels(self.labels, labels)} {value}"
+            for labels, value in sorted(self.values().items())
+        ]
+
+
+class Histogram(_Sharded):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *labels: str):
+        try:
+            row = self._local.values[labels]
+        except (AttributeError, KeyError):
+            row = self._shard()[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        row[bisect_left(self.buckets, value)] += 1
+        row[-1] += value
+
+    def values(self) -> Dict[Tuple[str, ...], List[float]]:
+        totals: Dict[Tuple[str, ...], List[float]] = {}
+        for labels, row in self._snapshot():
+            row = list(row)
+            total = totals.get(labels)
+            if total is None:
+                totals[labels] = row
+            else:
+                for i, value in enumerate(row):
+                    total[i] += value
+        return totals
+
+    def render(self) -> List[str]:
+        lines = []
+        bounds = [repr(bound) for bound in self.buckets] + ["+Inf"]
+        for labels, row in sorted(self.values().items()):
+            cumulative = 0
+            for bound, hits in zip(bounds, row):
+                cumulative += hits
+                le = _labels(self.labels, labels, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, labels)} {row[-1]}")
+            lines.append(f"{self.name}_count{_labels(self.labels, labels)} {cumulative}")
+        return lines
+
+
+class Gauge:
+    """Read at scrape time, so keeping it current costs the hot path nothing."""
+
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        read: Callable[[], Union[float, Dict[str, float]]],
+        label: str = "",
+    ):
+        self.name = name
+        self.help = help
+        self.read = read
+        self.label = label
+
+    def render(self) -> List[str]:
+        value = self.read()
+        if not self.label:
+            return [f"{self.name} {value}"]
+        return [
+            f"{self.name}{_labels((self.label,), (key,))} {count}"
+            for key, count in sorted(value.items())
+        ]
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics: List[Union[Counter, Histogram, Gauge]] = []
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, help, labels)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> Histogram:
+        metric = Histogram(name, help, labels, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def gauge(
+        self,
+        name: str,
+        help: str,
+        read: Callable[[], Union[float, Dict[str, float]]],
+        label: str = "",
+    ) -> Gauge:
+        metric = Gauge(name, help, read, label)
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                print(f"Error while reading metric {metric.name}: {e}")
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path: str):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
+
+    def start_dump(self, path: str, interval: float = 15.0):
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.dump(path)
+                except OSError as e:
+                    print(f"Error while writing metrics to {path}: {e}")
+
+        threading.Thread(target=run, name="metrics-dump", daemon=True).start()
+
+    def serve(self, host: str = "127.0.0.1", port: int = 9100):
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != "/metrics":
+                    self.send_response(404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                body = registry.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self._server.server_address
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+class BotMetrics:
+    """The metrics ChatBot records; gauges over live state are added by the bot."""
+
+    def __init__(self, registry: Optional[MetricsRegistry] = None):
+        self.registry = registry or MetricsRegistry()
+        self.handler_seconds = self.registry.histogram(
+            "anonbot_handler_seconds", "Time spent in update handlers.", ("handler",)
+        )
+        self.match_wait_seconds = self.registry.histogram(
+            "anonbot_match_wait_seconds",
+            "Time from /search to being matched.",
+            buckets=WAIT_BUCKETS,
+        )
+        self.forwards = self.registry.counter(
+            "anonbot_forwards_total",
+            "Messages forwarded to a partner.",
+            ("content_type", "result"),
+        )
+        self.api_seconds = self.registry.histogram(
+            "anonbot_api_seconds", "Bot API request latency.", ("method",)
+        )
+        self.api_errors = self.registry.counter(
+            "anonbot_api_errors_total", "Failed Bot API requests.", ("method", "code")
+        )
+        self.settings_flush_seconds = self.registry.histogram(
+            "anonbot_settings_flush_seconds", "Time to append and fsync settings."
+        )
+        self.updates_rejected = self.registry.counter(
+            "anonbot_updates_rejected_total",
+            "Inbound updates dropped before the handlers.",
+            ("reason", "kind"),
+        )
+        self.messages_blocked = self.registry.counter(
+            "anonbot_messages_blocked_total",
+            "Messages not forwarded because of moderation rules.",
+            ("reason",),
+        )
+
+
+def instrument_api(metrics: BotMetrics):
+    """Times every synchronous Bot API request made through ``telebot.apihelper``."""
+    from telebot import apihelper
+
+    make_request = getattr(apihelper._make_request, "__wrapped__", apihelper._make_request)
+
+    def timed_request(token, method_name, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return make_request(token, method_name, *args, **kwargs)
+        except apihelper.ApiTelegramException as e:
+            metrics.api_errors.inc(method_name, str(e.error_code))
+            raise
+        except Exception:
+            metrics.api_errors.inc(method_name, "network")
+            raise
+        finally:
+            metrics.api_seconds.observe(time.perf_counter() - started, method_name)
+
+    timed_request.__wrapped__ = make_request
+    apihelper._make_request = timed_request
@@ -0,0 +1,205 @@
+import asyncio
+import functools
+import heapq
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+class CallTimings:
+    """Call count, total and worst time per name, plus the slowest single calls."""
+
+    def __init__(self, slowest: int = 20):
+        self.slowest = slowest
+        self._stats: Dict[str, List[float]] = {}
+        self._worst: List[Tuple[float, str, str]] = []
+        self._lock = threading.Lock()
+
+    def observe(self, name: str, seconds: float, detail: str = ""):
+        with self._lock:
+            stats = self._stats.get(name)
+            if stats is None:
+                stats = self._stats[name] = [0, 0.0, 0.0]
+            stats[0] += 1
+            stats[1] += seconds
+            if seconds > stats[2]:
+                stats[2] = seconds
+            if len(self._worst) < self.slowest:
+                heapq.heappush(self._worst, (seconds, name, detail))
+            elif seconds > self._worst[0][0]:
+                heapq.heapreplace(self._worst, (seconds, name, detail))
+
+    def timed(self, function: Callable, name: Optional[str] = None) -> Callable:
+        """``function`` reporting its duration; the first argument's content type is the detail."""
+        observe = self.observe
+        name = name or function.__name__
+
+        if asyncio.iscoroutinefunction(function):
+
+            @functools.wraps(function)
+            async def timed(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await function(*args, **kwargs)
+                finally:
+                    observe(name, time.perf_counter() - started, _detail(args))
+
+        else:
+
+            @functools.wraps(function)
+            def timed(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    observe(name, time.perf_counter() - started, _detail(args))
+
+        return timed
+
+    def report(self, top: int) -> List[str]:
+        with self._lock:
+            stats = sorted(self._stats.items(), key=lambda item: item[1][1], reverse=True)
+            worst = sorted(self._worst, reverse=True)
+        lines = [f"{'name':<32} {'calls':>8} {'total ms':>10} {'mean ms':>9} {'max ms':>9}"]
+        for name, (calls, total, longest) in stats[:top]:
+            lines.append(
+                f"{name:<32} {calls:>8} {total * 1000:>10.1f}"
+                f" {total / calls * 1000:>9.3f} {longest * 1000:>9.3f}"
+            )
+        lines.append("")
+        lines.append("Slowest calls:")
+        for seconds, name, detail in worst[:top]:
+            lines.append(f"{seconds * 1000:>10.3f} ms  {name} {detail}".rstrip())
+        return lines
+
+
+def _detail(args: tuple) -> str:
+    content_type = getattr(args[0], "content_type", None) if args else None
+    return f"({content_type})" if content_type else ""
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """Samples every other thread's Python stack at a fixed interval, kept in collapsed form."""
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self, seconds: float = 0.0, on_done: Optional[Callable[[], None]] = None):
+        self._thread = threading.Thread(
+            target=self._run, args=(seconds, on_done), name="stack-sampler", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def _run(self, seconds: float, on_done: Optional[Callable[[], None]]):
+        own = threading.get_ident()
+        deadline = time.monotonic() + seconds if seconds else None
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                labels = []
+                while frame is not None:
+                    labels.append(_frame_label(frame))
+                    frame = frame.f_back
+                labels.append(names.get(ident, str(ident)))
+                self.stacks[";".join(reversed(labels))] += 1
+            self.samples += 1
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+        if on_done is not None and not self._stop.is_set():
+            on_done()
+
+    def collapsed(self) -> List[str]:
+        return [f"{stack} {count}" for stack, count in self.stacks.most_common()]
+
+    def report(self, top: int) -> List[str]:
+        own = Counter()
+        for stack, count in self.stacks.items():
+            own[stack.rsplit(";", 1)[-1]] += count
+        total = sum(own.values()) or 1
+        lines = [f"{self.samples} samples every {self.interval * 1000:.1f} ms; top frames by own samples:"]
+        for label, count in own.most_common(top):
+            lines.append(f"{count / total * 100:>6.1f}%  {label}")
+        return lines
+
+
+class Profiler:
+    """Profiling that only wraps anything between ``start`` and ``stop``."""
+
+    def __init__(self, directory: str = "profiles", interval: float = 0.005, top: int = 20):
+        self.directory = directory
+        self.interval = interval
+        self.top = top
+        self.timings: Optional[CallTimings] = None
+        self._sampler: Optional[StackSampler] = None
+        self._restore: Optional[Callable[[], None]] = None
+        self._started = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def active(self) -> bool:
+        return self.timings is not None
+
+    def start(
+        self,
+        install: Callable[[CallTimings], Callable[[], None]],
+        sample_seconds: Optional[float] = None,
+        on_done: Optional[Callable[[], None]] = None,
+    ) -> bool:
+        """Starts timing, and sampling when ``sample_seconds`` is given (0 runs until ``stop``).
+
+        ``on_done`` is called from the sampler thread when a timed sample ends.
+        """
+        with self._lock:
+            if self.timings is not None:
+                return False
+            self.timings = CallTimings(self.top)
+            self._restore = install(self.timings)
+            self._started = time.perf_counter()
+            if sample_seconds is not None:
+                self._sampler = StackSampler(self.interval)
+                self._sampler.start(sample_seconds, on_done)
+            return True
+
+    def stop(self) -> Optional[str]:
+        """Removes the wrappers and writes the reports; returns the report path."""
+        with self._lock:
+            if self.timings is None:
+                return None
+            self._restore()
+            timings, sampler = self.timings, self._sampler
+            self.timings = self._sampler = self._restore = None
+            elapsed = time.perf_counter() - self._started
+        if sampler is not None:
+            sampler.stop()
+
+        os.makedirs(self.directory, exist_ok=True)
+        now = time.time()
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(now)) + f"{now % 1:.3f}"[1:]
+        base = os.path.join(self.directory, f"profile-{stamp}")
+        lines = [f"Profiled for {elapsed:.1f} s", ""] + timings.report(self.top)
+        if sampler is not None:
+            with open(base + ".collapsed", "w", encoding="utf-8") as f:
+                f.write("\n".join(sampler.collapsed()) + "\n")
+            lines += ["", *sampler.report(self.top)]
+        with open(base + ".txt", "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        return base + ".txt"
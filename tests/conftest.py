@@ -0,0 +1,36 @@
+import pytest
+import telebot
+from anonbot import ChatBot
+from benchmarks.fake_api import FakeTelegramApi
+from benchmarks.workloads import Workload
+from src.services.outbound import OutboundScheduler
+
+
+@pytest.fixture
+def api():
+    with FakeTelegramApi(keep_requests=True, retry_after=0) as api:
+        yield api
+
+
+@pytest.fixture
+def updates():
+    return Workload()
+
+
+@pytest.fixture
+def make_bot(tmp_path, monkeypatch, api):
+    """Builds ChatBots in a temporary directory that talk to the fake Bot API."""
+    monkeypatch.chdir(tmp_path)
+    bots = []
+
+    def make(**kwargs):
+        kwargs.setdefault("admission", False)
+        chat_bot = ChatBot("0:test", bot=telebot.TeleBot("0:test", threaded=False), **kwargs)
+        chat_bot.sender = OutboundScheduler(per_chat_rate=1e9, global_rate=1e9, workers=4)
+        bots.append(chat_bot)
+        return chat_bot
+
+    yield make
+    for chat_bot in bots:
+        chat_bot.sender.close()
+
@@ -0,0 +1,14 @@
+"""Helpers for driving a ChatBot against the fake Bot API."""
+
+
+def feed(chat_bot, *updates):
+    chat_bot.bot.process_new_updates(list(updates))
+    chat_bot.sender.close()
+
+
+def texts(api, chat_id):
+    return [
+        params.get("text")
+        for method, params in api.requests
+        if method in ("sendMessage", "sendmessage") and str(params.get("chat_id")) == str(chat_id)
+    ]
@@ -0,0 +1,46 @@
+from benchmarks.workloads import CONTENT, Workload
+from src.services.admission import AdmissionControl
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def control(load=(0, 0.0), **kwargs):
+    clock = Clock()
+    return AdmissionControl(lambda: load, clock=clock, **kwargs), clock
+
+
+def test_users_over_their_rate_are_throttled_but_start_and_end_pass():
+    admission, clock = control(user_rate=1.0, user_burst=3)
+    updates = Workload()
+    assert [admission.admit(updates.update(1, text="hi")) for _ in range(4)] == [True, True, True, False]
+    assert admission.admit(updates.update(2, text="hi"))
+    assert admission.admit(updates.command(1, "/end"))
+    assert admission.admit(updates.command(1, "/start"))
+    clock.now = 1.0
+    assert admission.admit(updates.update(1, text="hi"))
+    assert admission.stats() == {"throttled:text": 1}
+
+
+def test_low_priority_updates_are_shed_only_under_load():
+    updates = Workload()
+    calm, _ = control()
+    assert calm.admit(updates.update(1, **CONTENT["sticker"]))
+
+    busy, _ = control(load=(5000, 0.0))
+    assert not busy.admit(updates.update(1, **CONTENT["sticker"]))
+    assert busy.admit(updates.update(1, text="hi"))
+    assert busy.admit(updates.command(1, "/search"))
+    assert not busy.admit(updates.command(1, "/search"))
+    assert busy.stats() == {"shed:command": 1, "shed:sticker": 1}
+
+
+def test_exempt_users_are_never_dropped():
+    admission, _ = control(load=(0, 5.0), user_burst=1, exempt={7})
+    updates = Workload()
+    assert all(admission.admit(updates.update(7, **CONTENT["dice"])) for _ in range(10))
@@ -0,0 +1,138 @@
+import asyncio
+import time
+from types import SimpleNamespace
+import pytest
+
+pytest.importorskip("telebot")
+from src.services.async_transport import AsyncBotFacade, KeyedSerializer
+from src.services.outbound import PRIORITY_BULK, PRIORITY_HIGH, AsyncOutboundScheduler
+
+
+class FloodError(Exception):
+    error_code = 429
+
+    def __init__(self, seconds):
+        super().__init__("Too Many Requests")
+        self.result_json = {"parameters": {"retry_after": seconds}}
+
+
+def fast(**kwargs):
+    return AsyncOutboundScheduler(per_chat_rate=1000, per_chat_burst=100, global_rate=1000, global_burst=100, **kwargs)
+
+
+def test_calls_for_one_chat_run_in_order_and_resolve_first():
+    sent, resolved = [], []
+
+    async def main():
+        scheduler = fast()
+
+        async def send(i):
+            await asyncio.sleep(0.001 * (5 - i % 5))
+            assert resolved == list(range(i)), "a call started before the previous one resolved"
+            sent.append(i)
+            return i
+
+        for i in range(20):
+            future = scheduler.submit(1, lambda i=i: send(i))
+            future.add_done_callback(lambda done: resolved.append(done.result()))
+        assert scheduler.pending == 20
+        await scheduler.drain()
+        assert scheduler.pending == 0
+
+    asyncio.run(main())
+    assert sent == list(range(20))
+
+
+def test_rate_limit_spaces_one_chats_calls():
+    async def main():
+        scheduler = AsyncOutboundScheduler(per_chat_rate=50, per_chat_burst=1)
+        started = []
+
+        async def send():
+            started.append(time.monotonic())
+
+        for _ in range(5):
+            scheduler.submit(1, send)
+        await scheduler.drain()
+        return started
+
+    started = asyncio.run(main())
+    assert started[-1] - started[0] >= 4 / 50 * 0.9
+
+
+def test_retry_after_holds_every_chat():
+    async def main():
+        scheduler = fast()
+        attempts = []
+
+        async def flooded():
+            attempts.append(("a", time.monotonic()))
+            if len(attempts) == 1:
+                raise FloodError(0.1)
+            return "ok"
+
+        async def other():
+            attempts.append(("b", time.monotonic()))
+
+        first = scheduler.submit(1, flooded)
+        await asyncio.sleep(0.01)
+        scheduler.submit(2, other)
+        await scheduler.drain()
+        return first.result(), attempts
+
+    result, attempts = asyncio.run(main())
+    assert result == "ok"
+    assert attempts[1][0] in ("a", "b") and attempts[1][1] - attempts[0][1] >= 0.09
+
+
+def test_chats_are_served_by_priority():
+    async def main():
+        scheduler = AsyncOutboundScheduler(workers=1, per_chat_rate=1000, global_rate=1000, global_burst=100)
+        order = []
+
+        async def send(name):
+            order.append(name)
+
+        scheduler.submit(1, lambda: send("busy"))
+        scheduler.submit(2, lambda: send("bulk"), PRIORITY_BULK)
+        scheduler.submit(3, lambda: send("high"), PRIORITY_HIGH)
+        await scheduler.drain()
+        return order
+
+    assert asyncio.run(main()) == ["high", "busy", "bulk"]
+
+
+def test_facade_only_forwards_chat_methods():
+    async def send_message(chat_id, text):
+        return (chat_id, text)
+
+    facade = AsyncBotFacade(SimpleNamespace(send_message=send_message), fast())
+
+    async def main():
+        result = await facade.send_message(5, "hi")
+        await facade.sends.drain()
+        return result
+
+    assert asyncio.run(main()) == (5, "hi")
+    with pytest.raises(AttributeError):
+        facade.get_me
+
+
+def test_keyed_serializer_orders_per_key():
+    async def main():
+        serializer = KeyedSerializer()
+        seen = []
+
+        async def step(key, i):
+            await asyncio.sleep(0.001 * (3 - i))
+            seen.append((key, i))
+
+        for i in range(3):
+            for key in "ab":
+                serializer.submit(key, lambda key=key, i=i: step(key, i))
+        await serializer.drain()
+        return seen
+
+    seen = asyncio.run(main())
+    for key in "ab":
+        assert [i for k, i in seen if k == key] == [0, 1, 2]
@@ -0,0 +1,106 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import Future
+from support import feed
+from src.models.states import UserState
+from src.services.broadcast import Broadcaster, RecipientLog
+
+
+class Blocked(Exception):
+    error_code = 403
+
+
+def listed(log):
+    return [user_id for _, user_id in log.records()]
+
+
+def test_recipient_log_survives_reopen_and_tracks_blocks(tmp_path):
+    path = str(tmp_path / "recipients.log")
+    log = RecipientLog(path)
+    for user_id in (5, 3, 5, 9):
+        log.add(user_id)
+    assert log.extend([3, 7, 7, 11]) == 2
+    log.deactivate(9)
+    log.close()
+
+    log = RecipientLog(path)
+    assert listed(log) == [5, 3, -9, 7, 11]
+    log.add(9)
+    log.add(13)
+    assert listed(log) == [5, 3, 9, 7, 11, 13]
+    log.close()
+
+
+def test_index_is_rebuilt_when_missing(tmp_path):
+    path = str(tmp_path / "recipients.log")
+    log = RecipientLog(path)
+    log.extend(range(100, 0, -1))
+    log.close()
+    (tmp_path / "recipients.log.idx").unlink()
+
+    log = RecipientLog(path)
+    log.add(50)
+    assert len(log) == 100
+    log.close()
+
+
+def test_broadcast_sends_to_active_users_and_marks_blocked(tmp_path):
+    log = RecipientLog(str(tmp_path / "recipients.log"))
+    log.extend([1, 2, 3, 4])
+    log.deactivate(2)
+    sent = []
+
+    def send(user_id, text):
+        future = Future()
+        if user_id == 3:
+            future.set_exception(Blocked())
+        else:
+            sent.append((user_id, text))
+            future.set_result(None)
+        return future
+
+    done = threading.Event()
+    broadcaster = Broadcaster(log, send, str(tmp_path / "broadcast.json"), rate=1000, on_done=lambda state: done.set())
+    broadcaster.start("hello")
+    assert done.wait(5)
+    assert sent == [(1, "hello"), (4, "hello")]
+    assert broadcaster.state["blocked"] == 1 and broadcaster.state["done"]
+    assert listed(log) == [1, -2, -3, 4]
+
+
+def test_checkpoint_after_stop_records_settled_sends(tmp_path):
+    log = RecipientLog(str(tmp_path / "recipients.log"))
+    log.extend(range(1, 11))
+    path = tmp_path / "broadcast.json"
+    futures = []
+
+    def send(user_id, text):
+        futures.append(Future())
+        return futures[-1]
+
+    broadcaster = Broadcaster(log, send, str(path), rate=1000, window=3)
+    broadcaster.start("hello")
+    deadline = time.monotonic() + 5
+    while len(futures) < 3 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    broadcaster.stop()
+    assert json.loads(path.read_text())["offset"] == 0
+    for future in futures:
+        future.set_result(None)
+    broadcaster.checkpoint()
+    assert json.loads(path.read_text())["offset"] == 3
+
+
+def test_bot_seeds_recipients_from_restored_sessions(make_bot, updates):
+    chat_bot = make_bot()
+    for user_id in (1, 2):
+        feed(chat_bot, updates.command(user_id, "/start"))
+    chat_bot._shutdown()
+    os.remove(chat_bot.RECIPIENTS_FILE)
+    os.remove(chat_bot.RECIPIENTS_FILE + ".idx")
+
+    restarted = make_bot()
+    assert restarted.user_states[1] == UserState.SETUP
+    assert sorted(user_id for _, user_id in restarted.recipients.records()) == [1, 2]
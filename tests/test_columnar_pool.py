@@ -0,0 +1,30 @@
+import random
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from src.services.columnar_pool import ColumnarMatchQueue
+from src.services.match_queue import MatchQueue
+
+
+def test_picks_the_same_partners_as_match_queue_through_removals_and_growth():
+    arrivals = random.Random(3)
+    plain, columnar = MatchQueue(random.Random(5)), ColumnarMatchQueue(random.Random(5), capacity=4)
+    for user_id in range(2000):
+        if arrivals.random() < 0.2 and len(plain):
+            gone = arrivals.choice(list(plain))
+            assert plain.remove(gone) and columnar.remove(gone)
+            continue
+        profile = arrivals.choice(["general", "music"]), arrivals.choice("MW"), arrivals.randint(18, 40)
+        assert columnar.match(user_id, *profile) == plain.match(user_id, *profile)
+    assert columnar.entries() == plain.entries()
+    assert sorted(int(user_id) for user_id in columnar._user_col[: len(columnar._rows)]) == sorted(plain)
+
+
+def test_relaxed_search_honours_window_and_exclude():
+    queue = ColumnarMatchQueue(random.Random(0))
+    queue.add(1, "music", "W", 30)
+    queue.add(2, "music", "W", 45)
+    assert queue.find_partner("music", "M", 30, exclude=1) is None
+    assert queue.find_partner("music", "M", 30, window=15, exclude=1) == 2
+    assert queue.find_partner("books", "M", 30) is None
@@ -0,0 +1,99 @@
+import random
+import pytest
+from src.services.match_queue import MatchQueue
+
+
+def queues():
+    yield MatchQueue
+    try:
+        from src.services.columnar_pool import ColumnarMatchQueue
+    except ImportError:
+        return
+    yield ColumnarMatchQueue
+
+
+class Rolls:
+    def __init__(self, values):
+        self.values = list(values)
+
+    def random(self):
+        return self.values.pop(0)
+
+
+@pytest.mark.parametrize("queue_class", list(queues()))
+def test_match_rolls_like_the_original_scan(queue_class):
+    arrivals = random.Random(1)
+    queue = queue_class(random.Random(7))
+    expected_rng = random.Random(7)
+    waiting = []
+    for user_id in range(3000):
+        room = arrivals.choice(["general", "movies"])
+        gender = arrivals.choice("MMW")
+        age = arrivals.randint(18, 60)
+        expected = None
+        for i, (other_id, other_room, other_gender, other_age) in enumerate(waiting):
+            if other_room != room or abs(other_age - age) > MatchQueue.AGE_WINDOW:
+                continue
+            if other_gender != gender or expected_rng.random() < MatchQueue.SAME_GENDER_CHANCE:
+                expected = other_id
+                del waiting[i]
+                break
+        if expected is None:
+            waiting.append((user_id, room, gender, age))
+        assert queue.match(user_id, room, gender, age) == expected
+    assert len(queue) == len(waiting)
+
+
+@pytest.mark.parametrize("queue_class", list(queues()))
+def test_every_same_gender_candidate_gets_a_roll(queue_class):
+    queue = queue_class(Rolls([0.99] * 4 + [0.0]))
+    for user_id in range(1, 6):
+        queue.add(user_id, "general", "M", 30)
+    assert queue.match(10, "general", "M", 30) == 5
+
+
+@pytest.mark.parametrize("queue_class", list(queues()))
+def test_older_opposite_gender_waiter_wins_without_a_roll(queue_class):
+    queue = queue_class(Rolls([]))
+    queue.add(1, "general", "W", 25)
+    queue.add(2, "general", "M", 25)
+    assert queue.match(3, "general", "M", 30) == 1
+    assert 2 in queue
+
+
+@pytest.mark.parametrize("queue_class", list(queues()))
+def test_relaxed_rematch_pairs_long_waiters(queue_class):
+    now = [0.0]
+    queue = queue_class(Rolls([0.0] * 10), clock=lambda: now[0])
+    queue.add(1, "movies", "M", 20)
+    queue.add(2, "movies", "W", 37)
+    assert queue.rematch() == []
+    now[0] = queue.RELAX_AFTER + 3 * queue.RELAX_STEP
+    assert queue.rematch() == [(1, 2)]
+    assert len(queue) == 0
+
+
+@pytest.mark.parametrize("queue_class", list(queues()))
+def test_rematch_uses_the_fallback_room_only_when_allowed(queue_class):
+    now = [0.0]
+    queue = queue_class(random.Random(0), clock=lambda: now[0])
+    queue.add(1, "books", "M", 30)
+    queue.add(2, "general", "W", 30)
+    now[0] = 2 * queue.RELAX_AFTER
+    assert queue.rematch(fallback_room="general") == []
+    queue.allow_fallback(1)
+    assert queue.rematch(fallback_room="general") == [(1, 2)]
+
+
+def test_redis_queue_asks_for_more_rolls_when_needed():
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    from src.services.state_store import RedisMatchQueue
+
+    client = fakeredis.FakeRedis()
+    filler = RedisMatchQueue(client, "test:", Rolls([1.0] * 10_000))
+    for user_id in range(1, 31):
+        assert filler.match(user_id, "general", "M", 30) is None
+    queue = RedisMatchQueue(client, "test:", Rolls([0.99] * 29 + [0.0]))
+    assert queue.match(100, "general", "M", 30) == 30
+    assert 1 in queue and 30 not in queue and 100 not in queue
@@ -0,0 +1,59 @@
+import json
+import os
+from src.services.moderation import Moderator, PhraseMatcher, normalize
+
+
+def test_matcher_finds_any_phrase_in_one_pass():
+    matcher = PhraseMatcher(["she sells", "sells shells", "buy now"])
+    assert len(matcher) == 3
+    assert matcher.search("he sells shells") == "sells shells"
+    assert matcher.search("please buy now") == "buy now"
+    assert matcher.search("she sold shells") is None
+    assert PhraseMatcher([]).search("anything") is None
+
+
+def test_word_phrases_only_match_whole_words():
+    matcher = PhraseMatcher(["ass", "t.me/"])
+    assert matcher.search("first class") is None
+    assert matcher.search("you ass!") == "ass"
+    assert matcher.search("join t.me/channel") == "t.me/"
+
+
+def test_normalization_folds_width_and_case():
+    matcher = PhraseMatcher(["SPAM"])
+    assert matcher.search(normalize("ＳＰＡＭ offer")) == "spam"
+
+
+def write_rules(path, rules, mtime):
+    path.write_text(json.dumps(rules), encoding="utf-8")
+    os.utime(path, (mtime, mtime))
+
+
+def test_moderator_applies_common_and_room_rules(tmp_path):
+    path = tmp_path / "moderation.json"
+    write_rules(
+        path,
+        {"all": {"phrases": ["casino"]}, "rooms": {"politics": {"phrases": ["election"], "links": True}}},
+        1_000,
+    )
+    moderator = Moderator(str(path), ["general", "politics"])
+    assert moderator.load()
+    assert moderator.check("Best CASINO in town") == "phrase"
+    assert moderator.check("the election is close", "general") is None
+    assert moderator.check("the election is close", "politics") == "phrase"
+    assert moderator.check("see this", "politics", has_link=True) == "link"
+    assert moderator.check("see this", "general", has_link=True) is None
+
+
+def test_broken_file_keeps_previous_rules(tmp_path):
+    path = tmp_path / "moderation.json"
+    write_rules(path, {"all": {"phrases": ["casino"]}}, 1_000)
+    moderator = Moderator(str(path), ["general"])
+    moderator.load()
+    path.write_text("{not json", encoding="utf-8")
+    os.utime(path, (2_000, 2_000))
+    assert not moderator.load()
+    assert moderator.check("casino") == "phrase"
+    path.unlink()
+    assert moderator.load()
+    assert not moderator.active
@@ -0,0 +1,110 @@
+import threading
+import time
+import pytest
+from src.services.outbound import OutboundScheduler, RateLimiter
+
+
+class ApiError(Exception):
+    def __init__(self, code, retry_after=None):
+        super().__init__(f"error {code}")
+        self.error_code = code
+        self.result_json = {"parameters": {"retry_after": retry_after}} if retry_after else {}
+
+
+def fast(**kwargs):
+    options = dict(per_chat_rate=1000, per_chat_burst=100, global_rate=1000, global_burst=100)
+    options.update(kwargs)
+    return OutboundScheduler(**options)
+
+
+def test_rate_limiter_allows_a_burst_then_spaces_calls():
+    limiter = RateLimiter(rate=2.0, burst=3)
+    assert [limiter.allow("a", 0.0) for _ in range(4)] == [True, True, True, False]
+    assert limiter.delay("a", 0.0) == pytest.approx(0.5)
+    assert limiter.allow("a", 0.5)
+    assert limiter.allow("b", 0.5)
+
+
+def test_rate_limiter_hold_blocks_for_the_given_time():
+    limiter = RateLimiter(rate=10.0, burst=5)
+    limiter.hold(None, 0.0, 2.0)
+    assert limiter.delay(None, 1.9) > 0
+    assert limiter.allow(None, 2.0)
+
+
+def test_rate_limiter_forgets_idle_keys():
+    limiter = RateLimiter(rate=1.0, burst=1)
+    for second in range(10):
+        limiter.consume(second, float(second))
+    assert len(limiter) <= 3
+
+
+def test_callbacks_run_before_the_chats_next_call():
+    scheduler = fast()
+    recorded = []
+    problems = []
+
+    def send(i):
+        if recorded != list(range(i)):
+            problems.append(i)
+        return i
+
+    futures = []
+    for i in range(50):
+        future = scheduler.submit(1, lambda i=i: send(i))
+        future.add_done_callback(lambda done: (time.sleep(0.001), recorded.append(done.result())))
+        futures.append(future)
+    for future in futures:
+        future.result(timeout=5)
+    scheduler.close()
+    assert problems == []
+    assert recorded == list(range(50))
+
+
+def test_chats_run_in_parallel():
+    scheduler = fast(workers=4)
+    barrier = threading.Barrier(4, timeout=5)
+    futures = [scheduler.submit(chat_id, barrier.wait) for chat_id in range(4)]
+    assert sorted(future.result(timeout=5) for future in futures) == [0, 1, 2, 3]
+    scheduler.close()
+
+
+def test_retry_after_delays_the_chat_and_holds_everyone():
+    scheduler = fast()
+    calls = []
+
+    def flooded():
+        calls.append(("a", time.monotonic()))
+        if len(calls) == 1:
+            raise ApiError(429, retry_after=0.2)
+        return "sent"
+
+    first = scheduler.submit(1, flooded)
+    time.sleep(0.05)
+    second = scheduler.submit(2, lambda: calls.append(("b", time.monotonic())))
+    assert first.result(timeout=5) == "sent"
+    second.result(timeout=5)
+    scheduler.close()
+    started = calls[0][1]
+    assert all(at - started >= 0.19 for _, at in calls[1:])
+
+
+def test_transient_errors_are_retried_and_client_errors_are_not():
+    scheduler = fast(backoff=0.01)
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise ApiError(502)
+        return "ok"
+
+    def bad():
+        raise ApiError(400)
+
+    assert scheduler.submit(1, flaky).result(timeout=5) == "ok"
+    with pytest.raises(ApiError):
+        scheduler.submit(2, bad).result(timeout=5)
+    scheduler.close()
+    assert len(attempts) == 3
+    assert scheduler.pending == 0
@@ -0,0 +1,49 @@
+import json
+from src.models.profile_file import MappedProfileTable, ProfileFile, convert
+from src.utils.helpers import hash_user_id
+
+
+A, B = hash_user_id(1), hash_user_id(2)
+
+
+def converted(tmp_path, data: bytes) -> ProfileFile:
+    source, path = tmp_path / "source", tmp_path / "user_settings.profiles"
+    source.write_bytes(data)
+    convert(str(source), str(path))
+    return ProfileFile(str(path))
+
+
+def log_line(hashed_id, **record) -> bytes:
+    return json.dumps({"id": hashed_id, **record}).encode() + b"\n"
+
+
+def test_legacy_object(tmp_path):
+    legacy = {A: {"age": 30, "gender": "W", "room": "books"}, B: {"age": 40, "gender": "M", "room": "general"}}
+    for data in (json.dumps(legacy), json.dumps(legacy, indent=4)):
+        profiles = converted(tmp_path, data.encode())
+        assert len(profiles) == 2
+        assert profiles.find(bytes.fromhex(A)) == (30, "W", "books")
+
+
+def test_single_line_log(tmp_path):
+    profiles = converted(tmp_path, log_line(A, age=25, gender="M", room="music"))
+    assert len(profiles) == 1
+    assert profiles.find(bytes.fromhex(A)) == (25, "M", "music")
+
+
+def test_log_last_line_wins_and_torn_tail_is_skipped(tmp_path):
+    data = log_line(A, age=25, gender="M", room="music") + log_line(A, age=26, gender="M", room="music")
+    profiles = converted(tmp_path, data + log_line(B, age=50, gender="W", room="general")[:-7])
+    assert len(profiles) == 1
+    assert profiles.find(bytes.fromhex(A)) == (26, "M", "music")
+
+
+def test_torn_only_line(tmp_path):
+    assert len(converted(tmp_path, log_line(A, age=25)[:10])) == 0
+
+
+def test_mapped_table_reads_converted_profiles(tmp_path):
+    converted(tmp_path, log_line(A, age=33, gender="W", room="books"))
+    table = MappedProfileTable(str(tmp_path / "user_settings.profiles"))
+    assert table[A].to_dict() == {"age": 33, "gender": "W", "room": "books"}
+    assert B not in table
@@ -0,0 +1,57 @@
+import threading
+from types import SimpleNamespace
+from src.models.profile_table import ProfileTable
+from src.utils.helpers import hash_user_id
+
+
+def settings(age=20, gender="M", room="general"):
+    return SimpleNamespace(age=age, gender=gender, room=room)
+
+
+def test_set_get_and_update_in_place():
+    table = ProfileTable(["general", "books"])
+    key = hash_user_id(1)
+    table[key] = settings(30, "W", "books")
+    assert table[key].to_dict() == {"age": 30, "gender": "W", "room": "books"}
+    table[key].room = "poetry"
+    assert table[key].room == "poetry"
+    assert key in table and hash_user_id(2) not in table
+
+
+def test_deleted_slots_are_reused_and_iteration_sees_live_keys():
+    table = ProfileTable()
+    keys = [hash_user_id(user_id) for user_id in range(100)]
+    for age, key in enumerate(keys):
+        table[key] = settings(age % 80 + 18)
+    for key in keys[:50]:
+        del table[key]
+    for key in keys[:10]:
+        table[key] = settings(99)
+    assert len(table) == 60
+    assert set(table) == set(keys[:10]) | set(keys[50:])
+    assert len(table._ages) == 100
+    assert table[keys[0]].age == 99
+
+
+def test_lookups_while_the_index_grows():
+    table = ProfileTable()
+    known = [hash_user_id(user_id) for user_id in range(100)]
+    for key in known:
+        table[key] = settings()
+    missed = []
+    done = threading.Event()
+
+    def probe():
+        while not done.is_set():
+            missed.extend(key for key in known if key not in table)
+
+    readers = [threading.Thread(target=probe) for _ in range(4)]
+    for reader in readers:
+        reader.start()
+    for user_id in range(100, 20_000):
+        table[hash_user_id(user_id)] = settings()
+    done.set()
+    for reader in readers:
+        reader.join()
+    assert missed == []
+    assert len(table) == 20_000
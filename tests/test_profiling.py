@@ -0,0 +1,31 @@
+import asyncio
+from support import feed
+from telebot import asyncio_helper
+from anonbot import AsyncChatBot
+from src.utils.profiler import CallTimings
+
+
+def test_sync_profiling_times_handlers_and_api_calls(make_bot, updates):
+    chat_bot = make_bot()
+    timings = CallTimings()
+    uninstall = chat_bot._install_profiling(timings)
+    try:
+        feed(chat_bot, updates.command(1, "/start"), updates.update(1, text="30"))
+    finally:
+        uninstall()
+    assert "api.sendMessage" in timings._stats
+    assert "_save_settings" in timings._stats
+    assert "_save_settings" not in chat_bot.__dict__
+
+
+def test_async_profiling_times_api_calls(monkeypatch):
+    async def process_request(token, url, method="get", params=None, files=None, **kwargs):
+        return {"ok": True}
+
+    monkeypatch.setattr(asyncio_helper, "_process_request", process_request)
+    timings = CallTimings()
+    uninstall = AsyncChatBot._time_api_requests(None, timings)
+    asyncio.run(asyncio_helper.send_message("0:test", 1, "hi"))
+    uninstall()
+    assert timings._stats["api.sendMessage"][0] == 1
+    assert asyncio_helper._process_request is process_request
@@ -0,0 +1,70 @@
+import fakeredis
+import pytest
+from support import feed, texts
+from src.models.states import UserState
+from src.services.state_store import RedisStateStore
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+def chatting(chat_bot, updates, *profiles):
+    for user_id, age, gender in profiles:
+        feed(
+            chat_bot,
+            updates.command(user_id, "/start"),
+            updates.update(user_id, text=str(age)),
+            updates.update(user_id, text=gender),
+            updates.update(user_id, text="music"),
+            updates.command(user_id, "/search"),
+        )
+
+
+def test_idle_chat_is_ended(make_bot, clock, updates, api):
+    chat_bot = make_bot(clock=clock)
+    chatting(chat_bot, updates, (1, 25, "M"), (2, 26, "W"))
+    assert chat_bot.active_chats[1] == 2
+
+    clock.now = chat_bot.CHAT_IDLE_TTL + 2
+    assert chat_bot.reap() == 2
+    chat_bot.sender.close()
+    assert 1 not in chat_bot.active_chats
+    assert chat_bot.user_states[2] == UserState.IDLE
+    assert texts(api, 1)[-1].startswith("Chat ended after a period of inactivity")
+
+
+def test_idle_chat_is_kept_in_a_shared_store(make_bot, clock, updates):
+    chat_bot = make_bot(clock=clock, state_store=RedisStateStore(fakeredis.FakeRedis()))
+    chatting(chat_bot, updates, (1, 25, "M"), (2, 26, "W"))
+    assert chat_bot.chats
+
+    clock.now = chat_bot.CHAT_IDLE_TTL + 2
+    assert chat_bot.reap() == 0
+    assert chat_bot.active_chats[1] == 2
+    assert not chat_bot.chats
+
+
+def test_one_failing_key_does_not_stop_the_rest(make_bot, clock, updates, monkeypatch):
+    chat_bot = make_bot(clock=clock)
+    chatting(chat_bot, updates, (1, 25, "M"), (2, 60, "W"))
+    assert list(chat_bot.waiting_users) == [1, 2]
+    del chat_bot.user_settings[chat_bot._hash_id(1)]
+
+    def evict(idle):
+        raise OSError("disk gone")
+
+    monkeypatch.setattr(chat_bot.user_settings, "evict", evict)
+    clock.now = chat_bot.WAITING_TTL + 2
+    assert chat_bot.reap() == 2
+    assert len(chat_bot.waiting_users) == 0
+    assert ("profiles", None) in chat_bot.timeouts
@@ -0,0 +1,54 @@
+import fakeredis
+import pytest
+from support import feed, texts
+from src.services.state_store import RedisStateStore
+
+
+@pytest.fixture
+def server():
+    return fakeredis.FakeServer()
+
+
+def worker(make_bot, server):
+    return make_bot(state_store=RedisStateStore(fakeredis.FakeRedis(server=server)))
+
+
+def setup_on(chat_bot, updates, user_id, age, gender, room="music"):
+    for text in (str(age), gender, room):
+        feed(chat_bot, updates.update(user_id, text=text))
+
+
+def test_workers_share_profiles_and_match(make_bot, server, api, updates):
+    first, second = worker(make_bot, server), worker(make_bot, server)
+
+    feed(first, updates.command(1, "/start"))
+    setup_on(second, updates, 1, 25, "M")
+    feed(second, updates.command(2, "/start"))
+    setup_on(first, updates, 2, 27, "W")
+
+    assert first.user_settings[first._hash_id(1)].room == "music"
+    feed(first, updates.command(1, "/search"))
+    feed(second, updates.command(2, "/search"))
+
+    assert second.active_chats[2] == 1
+    assert first.active_chats[1] == 2
+    assert texts(api, 1)[-1].startswith("Chat partner found!")
+    assert texts(api, 2)[-1].startswith("Chat partner found!")
+
+
+def test_workers_keep_no_local_profile_log(make_bot, server, updates, tmp_path):
+    first, second = worker(make_bot, server), worker(make_bot, server)
+    feed(first, updates.command(1, "/start"))
+    setup_on(second, updates, 1, 30, "W")
+    assert first.settings_store is None and second.settings_store is None
+    assert not (tmp_path / "user_settings.log").exists()
+
+
+def test_local_profiles_are_copied_into_an_empty_shared_store(make_bot, server, updates):
+    local = make_bot()
+    feed(local, updates.command(1, "/start"))
+    setup_on(local, updates, 1, 40, "M", "books")
+    local.settings_store.close()
+
+    shared = worker(make_bot, server)
+    assert shared.user_settings[shared._hash_id(1)].to_dict() == {"age": 40, "gender": "M", "room": "books"}
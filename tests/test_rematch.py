@@ -0,0 +1,86 @@
+import threading
+import pytest
+from support import feed, texts
+from src.services.session_snapshots import _JournaledQueue
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+def searching(chat_bot, updates, user_id, age, gender, room):
+    feed(
+        chat_bot,
+        updates.command(user_id, "/start"),
+        updates.update(user_id, text=str(age)),
+        updates.update(user_id, text=gender),
+        updates.update(user_id, text=room),
+        updates.command(user_id, "/search"),
+    )
+
+
+def wait(chat_bot, clock, seconds):
+    end = clock.now + seconds
+    while clock.now < end:
+        clock.now += chat_bot.REAP_INTERVAL
+        chat_bot.reap()
+    chat_bot.sender.close()
+
+
+def test_long_waiters_are_paired_with_a_wider_age_window(make_bot, clock, updates, api):
+    chat_bot = make_bot(clock=clock)
+    searching(chat_bot, updates, 1, 25, "M", "music")
+    searching(chat_bot, updates, 2, 38, "W", "music")
+    assert 1 not in chat_bot.active_chats
+
+    wait(chat_bot, clock, 70)
+    assert chat_bot.active_chats[1] == 2
+    assert texts(api, 2)[-1].startswith("Chat partner found!")
+    assert chat_bot.wait_estimates.estimate("music") == pytest.approx(65, abs=10)
+
+
+def test_fallback_is_offered_once_and_then_used(make_bot, clock, updates, api):
+    chat_bot = make_bot(clock=clock)
+    searching(chat_bot, updates, 1, 25, "M", "music")
+    wait(chat_bot, clock, chat_bot.FALLBACK_OFFER_AFTER + 20)
+    offers = [text for text in texts(api, 1) if text.startswith("Still looking")]
+    assert len(offers) == 1
+
+    searching(chat_bot, updates, 2, 26, "W", "general")
+    assert 1 not in chat_bot.active_chats
+    feed(chat_bot, updates.command(1, "/general"))
+    assert chat_bot.active_chats[1] == 2
+
+
+def test_missing_profile_does_not_stop_a_committed_chat(make_bot, clock, updates):
+    chat_bot = make_bot(clock=clock)
+    searching(chat_bot, updates, 1, 25, "M", "music")
+    searching(chat_bot, updates, 2, 60, "W", "books")
+    del chat_bot.user_settings[chat_bot._hash_id(2)]
+
+    chat_bot._start_chat(1, 2)
+    assert chat_bot.active_chats[1] == 2
+    assert chat_bot.wait_estimates.rooms() == {"music": 0.0}
+
+
+def test_long_waiters_waits_for_the_session_lock(make_bot):
+    chat_bot = make_bot()
+    assert isinstance(chat_bot.waiting_users, _JournaledQueue)
+    lock = chat_bot.sessions.lock
+    done = threading.Event()
+    lock.acquire()
+    try:
+        threading.Thread(target=lambda: (chat_bot.waiting_users.long_waiters(0), done.set())).start()
+        assert not done.wait(0.1)
+    finally:
+        lock.release()
+    assert done.wait(1)
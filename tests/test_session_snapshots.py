@@ -0,0 +1,112 @@
+import threading
+import pytest
+from src.models.message import MessageHistory
+from src.models.states import SetupState, UserState
+from src.services.session_snapshots import SessionSnapshots
+from src.services.state_store import InMemoryStateStore
+
+
+def chat_id(a, b):
+    return min(a, b) * 1_000_000 + max(a, b)
+
+
+@pytest.fixture
+def paths(tmp_path):
+    return str(tmp_path / "sessions.snapshot"), str(tmp_path / "sessions.journal")
+
+
+def attached(paths):
+    sessions = SessionSnapshots(*paths, chat_id, history_capacity=4)
+    store, chats = InMemoryStateStore(), {}
+    sessions.restore(store, chats)
+    sessions.attach(store, chats)
+    return sessions, store, chats
+
+
+def restored(paths):
+    store, chats = InMemoryStateStore(), {}
+    SessionSnapshots(*paths, chat_id, history_capacity=4).restore(store, chats)
+    return store, chats
+
+
+def start_chat(sessions, store, chats, a, b):
+    store.active_chats[a] = b
+    store.active_chats[b] = a
+    store.user_states[a] = store.user_states[b] = UserState.CHATTING
+    chats[chat_id(a, b)] = {a: MessageHistory(4), b: MessageHistory(4)}
+
+
+def populate(sessions, store, chats):
+    store.setup_states[1] = SetupState.COMPLETE
+    store.user_states[3] = UserState.WAITING
+    store.waiting_users.add(3, "music", "W", 30)
+    store.waiting_users.add(4, "books", "M", 41)
+    start_chat(sessions, store, chats, 1, 2)
+    for i in range(6):
+        sessions.append_message(chats[chat_id(1, 2)][1], 1, 2, 10 + i, 20 + i)
+
+
+def check(store, chats):
+    assert store.setup_states == {1: SetupState.COMPLETE}
+    assert store.user_states == {1: UserState.CHATTING, 2: UserState.CHATTING, 3: UserState.WAITING}
+    assert store.active_chats == {1: 2, 2: 1}
+    assert store.waiting_users.entries() == [(3, "music", "W", 30), (4, "books", "M", 41)]
+    message_ids, partner_ids, _ = chats[chat_id(1, 2)][1].columns()
+    assert list(message_ids) == [12, 13, 14, 15]
+    assert list(partner_ids) == [22, 23, 24, 25]
+
+
+def test_snapshot_round_trip(paths):
+    sessions, store, chats = attached(paths)
+    populate(sessions, store, chats)
+    sessions.snapshot()
+    check(*restored(paths))
+
+
+def test_journal_replays_on_top_of_the_snapshot(paths):
+    sessions, store, chats = attached(paths)
+    sessions.snapshot()
+    populate(sessions, store, chats)
+    assert store.waiting_users.match(5, "music", "M", 31) == 3
+    sessions.flush()
+
+    store, chats = restored(paths)
+    assert [entry[0] for entry in store.waiting_users.entries()] == [4]
+    assert store.active_chats == {1: 2, 2: 1}
+
+
+def test_torn_journal_tail_is_ignored(paths):
+    sessions, store, chats = attached(paths)
+    sessions.snapshot()
+    store.user_states[7] = UserState.IDLE
+    store.waiting_users.add(8, "music", "M", 30)
+    sessions.flush()
+    journal = sessions._journal_file(sessions.generation)
+    journal.write_bytes(journal.read_bytes()[:-3])
+
+    store, _ = restored(paths)
+    assert store.user_states == {7: UserState.IDLE}
+    assert len(store.waiting_users) == 0
+
+
+def test_snapshot_encodes_outside_the_lock(paths):
+    sessions, store, chats = attached(paths)
+    populate(sessions, store, chats)
+    encode = sessions._encode
+    acquired = []
+
+    def try_lock():
+        acquired.append(sessions.lock.acquire(timeout=1))
+        if acquired[-1]:
+            sessions.lock.release()
+
+    def probe(state):
+        thread = threading.Thread(target=try_lock)
+        thread.start()
+        thread.join()
+        return encode(state)
+
+    sessions._encode = probe
+    sessions.snapshot()
+    assert acquired == [True]
+    check(*restored(paths))
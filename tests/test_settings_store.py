@@ -0,0 +1,49 @@
+import json
+from src.services.settings_store import SettingsStore
+
+
+def test_last_line_wins_and_torn_tail_is_dropped(tmp_path):
+    path = tmp_path / "user_settings.log"
+    path.write_bytes(
+        b'{"id": "a", "age": 20, "gender": "M", "room": "general"}\n'
+        b'{"id": "a", "age": 21, "gender": "M", "room": "books"}\n'
+        b'{"id": "b", "age": 3'
+    )
+    records = SettingsStore(str(path)).load()
+    assert records == {"a": {"age": 21, "gender": "M", "room": "books"}}
+    assert path.read_bytes().endswith(b"}\n")
+
+
+def test_flush_appends_dirty_records_once(tmp_path):
+    path = tmp_path / "user_settings.log"
+    store = SettingsStore(str(path))
+    store.load()
+    store.put("a", {"age": 20})
+    store.put("a", {"age": 22})
+    store.flush()
+    store.flush()
+    lines = path.read_text().splitlines()
+    assert [json.loads(line) for line in lines] == [{"id": "a", "age": 22}]
+
+
+def test_compaction_rewrites_live_profiles(tmp_path):
+    path = tmp_path / "user_settings.log"
+    store = SettingsStore(str(path), compact_ratio=2.0, compact_min_lines=4)
+    store.load()
+    profiles = {"a": {"age": 30}}
+    store.bind(profiles, dict)
+    for age in range(4):
+        store.put("a", {"age": age})
+        store.flush()
+    assert len(path.read_text().splitlines()) == 1
+    assert SettingsStore(str(path)).load() == {"a": {"age": 30}}
+
+
+def test_legacy_json_is_converted_on_first_load(tmp_path):
+    legacy = tmp_path / "user_settings.json"
+    legacy.write_text(json.dumps({"a": {"age": 40, "gender": "W", "room": "music"}}))
+    path = tmp_path / "user_settings.log"
+    assert SettingsStore(str(path), str(legacy)).load() == {
+        "a": {"age": 40, "gender": "W", "room": "music"}
+    }
+    assert SettingsStore(str(path)).load() == {"a": {"age": 40, "gender": "W", "room": "music"}}
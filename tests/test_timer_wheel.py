@@ -0,0 +1,36 @@
+from src.services.timer_wheel import TimerWheel
+
+
+def test_keys_expire_at_their_deadline():
+    wheel = TimerWheel(tick=1.0, slots=8, clock=lambda: 0.0)
+    wheel.schedule("a", 2.0, now=0.0)
+    wheel.schedule("b", 5.0, now=0.0)
+    assert wheel.advance(1.9) == []
+    assert wheel.advance(2.0) == ["a"]
+    assert wheel.advance(5.5) == ["b"]
+    assert len(wheel) == 0
+
+
+def test_rescheduling_pushes_the_deadline_back():
+    wheel = TimerWheel(tick=1.0, slots=8, clock=lambda: 0.0)
+    wheel.schedule("a", 2.0, now=0.0)
+    wheel.schedule("a", 2.0, now=1.5)
+    assert wheel.advance(2.5) == []
+    assert "a" in wheel
+    assert wheel.advance(3.5) == ["a"]
+
+
+def test_deadlines_beyond_one_turn_of_the_wheel():
+    wheel = TimerWheel(tick=1.0, slots=4, clock=lambda: 0.0)
+    wheel.schedule("far", 10.0, now=0.0)
+    for second in range(1, 10):
+        assert wheel.advance(float(second)) == []
+    assert wheel.advance(10.0) == ["far"]
+
+
+def test_cancel_removes_the_key():
+    wheel = TimerWheel(tick=1.0, slots=8, clock=lambda: 0.0)
+    wheel.schedule("a", 1.0, now=0.0)
+    assert wheel.cancel("a")
+    assert not wheel.cancel("a")
+    assert wheel.advance(5.0) == []